@@ -1,16 +1,30 @@
 # backend/app/crud.py
-from sqlalchemy.orm import Session
-from sqlalchemy import func as sql_func, desc, text, and_
-from sqlalchemy import or_, func
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func as sql_func, desc, text, and_, literal_column, literal, tuple_, Float, DateTime
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import or_, func, insert, select, bindparam
 from .utils import auth
+from .utils.boundaries import state_index
+from .utils import basket
+from .utils.geodesy import spheroid_distance
+from .utils.search_cache import search_cache, normalize_query
 from . import schemas
-from datetime import datetime
+from .config import settings
+from datetime import datetime, timezone, timedelta
+from collections import Counter
+import base64
+import csv
+import io
+import json
 from .models import models
 from geoalchemy2 import Geography 
-from geoalchemy2.shape import to_shape 
-from thefuzz import process
-from typing import Optional
+from typing import Optional, List
 from sqlalchemy.dialects import postgresql 
+import logging
+import math
+import numpy as np
+
+logger = logging.getLogger(__name__)
 
 # A simple dictionary to store the approximate max internal radius for each state in KM
 STATE_MAX_RADII = {
@@ -25,8 +39,10 @@ STATE_MAX_RADII = {
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = auth.get_password_hash(user.password)
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: Optional[str] = None):
+    # Callers on the event loop hash the password off-loop and pass the hash in
+    if hashed_password is None:
+        hashed_password = auth.get_password_hash(user.password)
     db_user = models.User(
         email=user.email,
         name = user.name,
@@ -38,44 +54,57 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.refresh(db_user)
     return db_user    
 
-def authenticate_user(db: Session, username: str, password: str):
-    # Allow user to log in with either email or name
-    user = db.query(models.User).filter(
-        or_(models.User.email == username, models.User.name == username)
-    ).first()
-    if not user or not auth.verify_password(password, user.hashed_password):
-        return None
-    return user
+def get_user_for_login(db: Session, username: str):
+    """
+    Resolves a login name to exactly one user with a single indexed lookup.
+    Users can log in with either email or name: anything containing "@" is
+    looked up by email (unique), anything else by name. Names aren't unique,
+    so a name shared by several users resolves to nobody and they have to
+    use their email.
+    """
+    if "@" in username:
+        return db.query(models.User).filter(models.User.email == username).first()
+    users = db.query(models.User).filter(models.User.name == username).limit(2).all()
+    return users[0] if len(users) == 1 else None
+
+def update_password_hash(db: Session, user: models.User, hashed_password: str):
+    user.hashed_password = hashed_password
+    db.commit()
 
 def get_markets_near_location(db: Session, lat: float, lon: float, radius_km: int):
     """
-    Finds market areas within a certain radius (in kilometers) of a given lat/lon.
+    Finds market areas within a certain radius (in kilometers) of a given lat/lon,
+    with their city and state loaded in the same query.
     """
     radius_meters = radius_km * 1000
     user_location_geography = f'POINT({lon} {lat})'
 
-    # Build the query object without executing it yet
-    query_obj = db.query(models.MarketArea).filter(
+    return db.query(models.MarketArea).options(
+        joinedload(models.MarketArea.city).joinedload(models.City.state)
+    ).filter(
         func.ST_DWithin(
-            models.MarketArea.location.cast(Geography),
+            models.MarketArea.geog,
             func.ST_GeographyFromText(user_location_geography),
             radius_meters
         )
-    )
-
-    # --- ADD THIS DEBUGGING BLOCK ---
-    # Compile the query to a string with the actual values
-    compiled_query = query_obj.statement.compile(
-        dialect=postgresql.dialect(),
-        compile_kwargs={"literal_binds": True}
-    )
-    print("--- DEBUG: GENERATED SQL QUERY ---")
-    print(compiled_query)
-    print("---------------------------------")
-    # --- END OF DEBUGGING BLOCK ---
-
-    # Now execute the query
-    return query_obj.all()
+    ).all()
+    
+def get_nearest_markets(db: Session, lat: float, lon: float, limit: int):
+    """
+    The `limit` market areas closest to lat/lon, nearest first, with their
+    distance in meters. Ordering by the `<->` KNN operator lets the GiST index
+    on market_areas.geog walk outwards from the point, so there's no radius to
+    guess and no sort over every market.
+    """
+    user_point = func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326).cast(Geography)
+    return db.query(
+        models.MarketArea,
+        func.ST_Distance(models.MarketArea.geog, user_point).label("distance_meters")
+    ).options(
+        joinedload(models.MarketArea.city).joinedload(models.City.state)
+    ).order_by(
+        models.MarketArea.geog.op("<->")(user_point)
+    ).limit(limit).all()
     
 def get_states(db: Session):
     return db.query(models.State).order_by(models.State.name).all()
@@ -86,125 +115,449 @@ def get_cities_by_state(db:Session, state_id: int):
 def get_markets_by_city(db: Session, city_id: int):
     return db.query(models.MarketArea).filter(models.MarketArea.city_id == city_id).order_by(models.MarketArea.name).all()
 
+def get_market_min_prices(db: Session, product_id: int, west: float, south: float, east: float, north: float):
+    """
+    For each market inside the bounding box that has `product_id` in stock:
+    (market_area_id, min_price, store_count). The `&&` box test is served by
+    the spatial index on market_areas.location.
+    """
+    return db.query(
+        models.Store.market_area_id,
+        sql_func.min(models.Price.price).label("min_price"),
+        sql_func.count(models.Store.id.distinct()).label("store_count"),
+    ).join(
+        models.Store, models.Price.store_id == models.Store.id
+    ).join(
+        models.MarketArea, models.Store.market_area_id == models.MarketArea.id
+    ).filter(
+        models.Price.product_id == product_id,
+        models.Price.stock_level > 0,
+        models.MarketArea.location.op("&&")(sql_func.ST_MakeEnvelope(west, south, east, north, 4326))
+    ).group_by(models.Store.market_area_id).all()
+
 def get_product_by_barcode(db: Session, barcode: str):
     return db.query(models.Product).filter(models.Product.barcode == barcode).first()
 
-def unified_search(
+def _product_name_matches(db: Session, query: str):
+    """
+    Products whose name matches `query`, with a relevance score in [0, 1].
+
+    A name matches if it contains the query as a substring, or if some word in
+    it is trigram-similar to the query (pg_trgm's `<%` operator), which is
+    what lets misspellings like "indomi" still find "Indomie Super Pack".
+    Both conditions are served by the GIN trigram index on products.name, so
+    the cost follows the number of candidate products rather than the catalogue.
+    """
+    return db.query(
+        models.Product.id.label("product_id"),
+        # float8 so the score round-trips exactly through a page cursor
+        sql_func.word_similarity(query, models.Product.name).cast(Float).label("relevance")
+    ).filter(
+        or_(
+            models.Product.name.ilike(f"%{query}%"),
+            literal(query).op("<%")(models.Product.name)
+        )
+    ).subquery()
+
+def _price_result_columns():
+    """
+    The flat column list behind a PriceSearchResult row. Selecting these
+    directly (instead of whole Price objects) means building a result never
+    walks price -> store -> market_area -> city -> state through lazy loads,
+    and the coordinates come back as plain floats from ST_X/ST_Y.
+    """
+    return (
+        models.Product.id.label("product_id"),
+        models.Product.name.label("product_name"),
+        models.Product.image_url.label("image_url"),
+        models.Price.price.label("price"),
+        models.Price.timestamp.label("timestamp"),
+        models.Price.stock_level.label("stock_level"),
+        models.Store.id.label("store_id"),
+        models.Store.name.label("store_name"),
+        models.MarketArea.name.label("market_area"),
+        models.City.name.label("city"),
+        models.State.name.label("state"),
+        sql_func.ST_Y(models.MarketArea.location).label("lat"),
+        sql_func.ST_X(models.MarketArea.location).label("lon"),
+    )
+
+def _join_price_hierarchy(q):
+    # Price -> Product, and Price -> Store -> MarketArea -> City -> State, all inner joins
+    return (
+        q.join(models.Product, models.Price.product_id == models.Product.id)
+        .join(models.Store, models.Price.store_id == models.Store.id)
+        .join(models.MarketArea, models.Store.market_area_id == models.MarketArea.id)
+        .join(models.City, models.MarketArea.city_id == models.City.id)
+        .join(models.State, models.City.state_id == models.State.id)
+    )
+
+def _outerjoin_ratings(q):
+    return q.outerjoin(
+        models.ProductStoreRating,
+        and_(
+            models.ProductStoreRating.product_id == models.Price.product_id,
+            models.ProductStoreRating.store_id == models.Price.store_id
+        )
+    )
+
+def _format_price_row(row) -> dict:
+    # A result row, or a plain mapping of the same columns
+    res = dict(getattr(row, "_mapping", row))
+    distance_meters = res.pop("distance_meters", None)
+    res["distance_km"] = round(distance_meters / 1000, 2) if distance_meters is not None else None
+    return res
+
+SEARCH_SORT_MODES = ("price_asc", "price_desc", "rating_desc", "distance_asc", "relevance")
+
+class InvalidCursor(ValueError):
+    pass
+
+def _search_sort_key(sort_by: str, m):
+    # The value a search row is ordered on (before the price id tie-breaker), as the query computes it
+    if sort_by in ("price_asc", "price_desc"):
+        return m["price"]
+    if sort_by == "relevance":
+        return m["relevance"]
+    if sort_by == "rating_desc":
+        return m["avg_rating"] if m["avg_rating"] is not None else -1.0
+    return m["distance_meters"]
+
+def _encode_cursor(sort_by: str, row) -> str:
+    """
+    Builds the opaque cursor for the page that starts after `row`. It holds the
+    sort mode, the row's sort key and its price id (the tie-breaker).
+    """
+    m = getattr(row, "_mapping", row)
+    key = _search_sort_key(sort_by, m)
+    payload = json.dumps({"s": sort_by, "k": key, "i": m["price_id"]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str, sort_by: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        key, price_id = float(payload["k"]), int(payload["i"])
+        cursor_sort = payload["s"]
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor("Malformed cursor")
+    if cursor_sort != sort_by:
+        raise InvalidCursor("Cursor was issued for a different sort order")
+    return key, price_id
+
+def _search_sort_mode(sort_by: str, lat: Optional[float], lon: Optional[float]) -> str:
+    # distance_asc without GPS has nothing to sort on, so it behaves like price_asc
+    if sort_by not in SEARCH_SORT_MODES or (sort_by == "distance_asc" and (lat is None or lon is None)):
+        return "price_asc"
+    return sort_by
+
+def validate_search_cursor(cursor: str, sort_by: str, lat: Optional[float], lon: Optional[float]):
+    # Raises InvalidCursor up front, for callers that can't report it once results are flowing
+    _decode_cursor(cursor, _search_sort_mode(sort_by, lat, lon))
+
+def _build_search_query(
     db: Session,
     query: str,
     sort_by: str,
     lat: Optional[float],
     lon: Optional[float],
     radius_km: Optional[int],
-    city_id: Optional[int]
+    city_id: Optional[int],
+    cursor: Optional[str]
 ):
     """
-    The definitive, unified search function.
-    Correctly calculates per-product, per-store ratings and distance.
+    The ordered search query behind unified_search and iter_search_results,
+    and the user's state (for is_out_of_state). Raises InvalidCursor.
     """
+    after = _decode_cursor(cursor, sort_by) if cursor else None
     
     # Determine user's state if GPS coordinates are provided
+    # (answered in process from the boundary index, no database round trip)
     user_state = None
     if lat is not None and lon is not None:
-        user_point = sql_func.ST_SetSRID(sql_func.ST_MakePoint(lon, lat), 4326)
-        state_boundary_query = db.query(models.StateBoundary.state_name).filter(
-            sql_func.ST_Contains(models.StateBoundary.geom, user_point)
-        ).first()
-        if state_boundary_query:
-            user_state = state_boundary_query[0]
-
-    # Step 1: Create a subquery to calculate avg_rating PER STORE for each product
-    # This provides more granular ratings than just per-product averages
-    review_subquery = db.query(
-        models.Review.product_id,
-        models.Review.store_id,
-        sql_func.avg(models.Review.rating).label("avg_rating")
-    ).group_by(models.Review.product_id, models.Review.store_id).subquery()
-    
-    # Step 2: Build the main query, starting explicitly from the Price table
+        user_state = state_index.state_for_point(db, lat, lon)
+
+    # Step 1: Build the main query as a flat projection, starting explicitly from the Price table
     q = db.query(
-        models.Price,
-        review_subquery.c.avg_rating
+        *_price_result_columns(),
+        models.ProductStoreRating.avg_rating.label("avg_rating"),
+        models.Price.id.label("price_id")
     ).select_from(models.Price)
     
-    # Step 3: Join all the necessary tables
-    q = q.join(models.Product)
-    q = q.join(models.Store)
-    q = q.join(models.MarketArea)
+    # Step 2: Join all the necessary tables, down to the state name
+    q = _join_price_hierarchy(q)
     
-    # Step 4: Use an outerjoin to the subquery on BOTH product_id and store_id
-    # This ensures we get store-specific ratings while still including products with no reviews
-    q = q.outerjoin(
-        review_subquery, 
-        and_(
-            models.Price.product_id == review_subquery.c.product_id,
-            models.Price.store_id == review_subquery.c.store_id
-        )
-    )
+    # Step 3: Pick up the per-store rating with a primary key lookup on the
+    # maintained aggregate; the outer join keeps products with no reviews
+    q = _outerjoin_ratings(q)
     
-    # Step 5: Add filters for product name and location
-    q = q.filter(models.Product.name.ilike(f"%{query}%"))
+    # Step 4: Add filters for product name and location. The name match runs
+    # against the trigram index and carries a relevance score for ranking.
+    query = query.strip()
+    if query:
+        matches = _product_name_matches(db, query)
+        q = q.join(matches, matches.c.product_id == models.Price.product_id)
+        relevance_col = matches.c.relevance
+    else:
+        relevance_col = literal_column("0.0", Float)
+    q = q.add_columns(relevance_col.label("relevance"))
     
     if city_id:
         q = q.filter(models.MarketArea.city_id == city_id)
     
-    # Step 6: Add distance calculation and filtering if GPS is used
+    # Step 5: Add distance calculation and filtering if GPS is used
+    distance_col = None
     if lat is not None and lon is not None:
         user_point = sql_func.ST_SetSRID(sql_func.ST_MakePoint(lon, lat), 4326)
-        q = q.add_columns(
-            sql_func.ST_Distance(
-                models.MarketArea.location.cast(Geography),
-                user_point.cast(Geography)
-            ).label("distance_meters")
+        distance_col = sql_func.ST_Distance(
+            models.MarketArea.geog,
+            user_point.cast(Geography)
         )
+        q = q.add_columns(distance_col.label("distance_meters"))
         if radius_km:
             q = q.filter(sql_func.ST_DWithin(
-                models.MarketArea.location.cast(Geography),
+                models.MarketArea.geog,
                 user_point.cast(Geography),
                 radius_km * 1000
             ))
     else:
         # Add a null distance column if no GPS for consistent result shape
-        q = q.add_columns(text("NULL AS distance_meters"))
+        q = q.add_columns(literal_column("NULL").label("distance_meters"))
     
-    # Step 7: Apply sorting
+    # Step 6: Apply keyset sorting. Every mode breaks ties on the price id, so the
+    # order is total and a page can resume strictly after the last row it returned
+    # instead of counting through an OFFSET.
     if sort_by == "price_desc":
-        q = q.order_by(desc(models.Price.price))
+        sort_key, descending = models.Price.price, True
+    elif sort_by == "relevance":
+        sort_key, descending = relevance_col, True
     elif sort_by == "rating_desc":
-        q = q.order_by(desc("avg_rating").nullslast())
-    elif sort_by == "distance_asc" and lat is not None:
-        q = q.order_by("distance_meters")
+        # Unrated rows sort after every real rating (ratings are 1-5)
+        sort_key, descending = sql_func.coalesce(models.ProductStoreRating.avg_rating, -1.0), True
+    elif sort_by == "distance_asc":
+        sort_key, descending = distance_col, False
     else:
-        q = q.order_by(models.Price.price.asc())
-    
-    # Step 8: Execute the query and format the results
-    results = q.all()
-    
-    formatted_results = []
-    for price_obj, avg_rating, distance_meters in results:
-        market_state = price_obj.store.market_area.city.state.name
-        location_shape = to_shape(price_obj.store.market_area.location)
-        res = {
-            "product_id": price_obj.product.id,
-            "product_name": price_obj.product.name,
-            "image_url": price_obj.product.image_url,
-            "price": price_obj.price,
-            "store_id": price_obj.store.id,
-            "store_name": price_obj.store.name,
-            "market_area": price_obj.store.market_area.name,
-            "city": price_obj.store.market_area.city.name,
-            "state": price_obj.store.market_area.city.state.name,
-            "timestamp": price_obj.timestamp,
-            "stock_level": price_obj.stock_level,
-            "avg_rating": avg_rating,
-            "distance_km": round(distance_meters / 1000, 2) if distance_meters is not None else None,
-            "is_out_of_state": user_state is not None and market_state != user_state,
-            "lat": location_shape.y,
-            "lon": location_shape.x,
-        }
-        formatted_results.append(res)
+        sort_key, descending = models.Price.price, False
+
+    if after is not None:
+        after_key, after_id = after
+        if descending:
+            q = q.filter(tuple_(sort_key, models.Price.id) < tuple_(after_key, after_id))
+        else:
+            q = q.filter(tuple_(sort_key, models.Price.id) > tuple_(after_key, after_id))
+
+    if descending:
+        q = q.order_by(sort_key.desc(), models.Price.id.desc())
+    else:
+        q = q.order_by(sort_key.asc(), models.Price.id.asc())
     
-    return formatted_results
+    return q, user_state
+
+def _format_search_row(row, user_state: Optional[str]) -> dict:
+    res = _format_price_row(row)
+    res.pop("price_id")
+    res.pop("relevance")
+    res["is_out_of_state"] = user_state is not None and res["state"] != user_state
+    return res
+
+def unified_search(
+    db: Session,
+    query: str,
+    sort_by: str,
+    lat: Optional[float],
+    lon: Optional[float],
+    radius_km: Optional[int],
+    city_id: Optional[int],
+    limit: int = 50,
+    cursor: Optional[str] = None
+):
+    """
+    The definitive, unified search function.
+    Correctly calculates per-product, per-store ratings and distance.
+
+    Every field of the result is projected by a single SELECT, so the number
+    of queries per search stays the same however many rows come back.
+
+    Results are keyset-paginated: returns (results, next_cursor), where
+    next_cursor is None on the last page. Raises InvalidCursor if the cursor
+    is malformed or was issued for a different sort mode.
+    """
+    sort_by = _search_sort_mode(sort_by, lat, lon)
+    q, user_state = _build_search_query(db, query, sort_by, lat, lon, radius_km, city_id, cursor)
+
+    # Fetch one extra row to know whether another page exists, then build
+    # the results straight from the row tuples
+    rows = q.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(sort_by, rows[-1])
+
+    return [_format_search_row(row, user_state) for row in rows], next_cursor
+
+def iter_search_results(
+    db: Session,
+    query: str,
+    sort_by: str,
+    lat: Optional[float],
+    lon: Optional[float],
+    radius_km: Optional[int],
+    city_id: Optional[int],
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    batch_size: int = 1000
+):
+    """
+    Every search result in order (or the first `limit`), yielded one row at a
+    time from a server-side cursor, for streaming responses.
+    """
+    sort_by = _search_sort_mode(sort_by, lat, lon)
+    q, user_state = _build_search_query(db, query, sort_by, lat, lon, radius_km, city_id, cursor)
+    if limit is not None:
+        q = q.limit(limit)
+    for row in q.yield_per(batch_size):
+        yield _format_search_row(row, user_state)
+
+def cached_unified_search(
+    db: Session,
+    query: str,
+    sort_by: str,
+    lat: Optional[float],
+    lon: Optional[float],
+    radius_km: Optional[int],
+    city_id: Optional[int],
+    limit: int = 50,
+    cursor: Optional[str] = None
+):
+    """
+    unified_search through the shared search result cache, with the query
+    text normalised (case and whitespace) so equivalent searches share an
+    entry.
+
+    A radius search caches the candidate rows of its grid cell instead of a
+    page: every row within the radius of any point of the cell. Each search
+    from that cell then measures, filters and orders the candidates for its
+    own exact point, so results are the same as unified_search's. Searches
+    around a point with no radius, or with more candidates than
+    search_cache_max_candidates, aren't cached.
+    """
+    query = normalize_query(query)
+    sort_by = _search_sort_mode(sort_by, lat, lon)
+    if lat is not None and lon is not None:
+        if not radius_km:
+            return unified_search(db, query, sort_by, lat, lon, radius_km, city_id, limit=limit, cursor=cursor)
+        return _cached_radius_search(db, query, sort_by, lat, lon, radius_km, city_id, limit, cursor)
+
+    key = (query, sort_by, city_id, limit, cursor)
+    cached = search_cache.get(key)
+    if cached is not None:
+        return cached
+
+    generation = search_cache.generation
+    page = unified_search(db, query, sort_by, None, None, None, city_id, limit=limit, cursor=cursor)
+    rows = page[0]
+    search_cache.put(
+        key, page, query,
+        products={row["product_id"] for row in rows},
+        stores={row["store_id"] for row in rows},
+        generation=generation
+    )
+    return page
+
+# Upper bound on a degree of latitude or longitude, in km; sizes the candidate margin around a cell
+_KM_PER_DEGREE = 111.7
+# Cached for a cell whose candidates are over the limit, so its searches go straight to the database
+_TOO_MANY_CANDIDATES = "too many candidates"
+
+def _cached_radius_search(
+    db: Session,
+    query: str,
+    sort_by: str,
+    lat: float,
+    lon: float,
+    radius_km: int,
+    city_id: Optional[int],
+    limit: int,
+    cursor: Optional[str]
+):
+    after = _decode_cursor(cursor, sort_by) if cursor else None
+    cell_degrees = settings.search_cache_cell_degrees
+    cell = (math.floor(lat / cell_degrees), math.floor(lon / cell_degrees))
+    key = ("radius", query, cell, radius_km, city_id)
+    candidates = search_cache.get(key)
+    if candidates is None:
+        # Anything within radius_km of a point in the cell is within radius_km
+        # plus half the cell's diagonal of its centre
+        generation = search_cache.generation
+        centre_lat, centre_lon = (cell[0] + 0.5) * cell_degrees, (cell[1] + 0.5) * cell_degrees
+        margin_km = cell_degrees / 2 * math.sqrt(2) * _KM_PER_DEGREE
+        q, _ = _build_search_query(db, query, "price_asc", centre_lat, centre_lon, radius_km + margin_km, city_id, None)
+        rows = q.limit(settings.search_cache_max_candidates + 1).all()
+        if len(rows) > settings.search_cache_max_candidates:
+            candidates = _TOO_MANY_CANDIDATES
+        else:
+            candidates = []
+            for row in rows:
+                res = dict(row._mapping)
+                res.pop("distance_meters")
+                candidates.append(res)
+        search_cache.put(
+            key, candidates, query,
+            products={row.product_id for row in rows},
+            stores={row.store_id for row in rows},
+            generation=generation
+        )
+    if candidates == _TOO_MANY_CANDIDATES:
+        return unified_search(db, query, sort_by, lat, lon, radius_km, city_id, limit=limit, cursor=cursor)
+
+    # The same filter, order and keyset as the query, for this exact point
+    distances = spheroid_distance(lat, lon, [c["lat"] for c in candidates], [c["lon"] for c in candidates])
+    rows = [
+        dict(c, distance_meters=float(distance))
+        for c, distance in zip(candidates, distances) if distance <= radius_km * 1000
+    ]
+    descending = sort_by in ("price_desc", "relevance", "rating_desc")
+    rows.sort(key=lambda m: (_search_sort_key(sort_by, m), m["price_id"]), reverse=descending)
+    if after is not None:
+        if descending:
+            rows = [m for m in rows if (_search_sort_key(sort_by, m), m["price_id"]) < after]
+        else:
+            rows = [m for m in rows if (_search_sort_key(sort_by, m), m["price_id"]) > after]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(sort_by, rows[-1])
+    user_state = state_index.state_for_point(db, lat, lon)
+    return [_format_search_row(row, user_state) for row in rows], next_cursor
+
+# Past this many written products, matching them against every cached query
+# costs more than rebuilding the cache, so it's cleared instead
+SEARCH_CACHE_MATCH_LIMIT = 500
+
+def _invalidate_search_cache(db: Session, product_ids, store_ids):
+    """
+    After a committed write to these products' prices or ratings at these
+    stores: drops the cached searches holding them, and the ones whose query
+    matches one of the products (the same test as _product_name_matches),
+    since the write can add or reorder rows there.
+    """
+    product_ids = sorted(set(product_ids))
+    if len(product_ids) > SEARCH_CACHE_MATCH_LIMIT:
+        search_cache.clear()
+        return
+    queries = search_cache.begin_invalidation()
+    matched = []
+    if queries and product_ids:
+        matched = db.execute(text("""
+            SELECT q FROM unnest(CAST(:queries AS text[])) AS q
+            WHERE EXISTS (
+                SELECT 1 FROM products p
+                WHERE p.id = ANY(:product_ids)
+                  AND (p.name ILIKE '%' || q || '%' OR q <% p.name)
+            )
+        """), {"queries": queries, "product_ids": product_ids}).scalars().all()
+    search_cache.invalidate(products=product_ids, stores=store_ids, queries=matched)
 
 def get_prices_for_product(
     db: Session, 
@@ -219,13 +572,13 @@ def get_prices_for_product(
     GPS radius OR a specific city_id.
     """
     
-    # Base query
-    q = db.query(
-        models.Price,
-        sql_func.avg(models.Review.rating).label("avg_rating")
-    ).select_from(models.Price).join(models.Product).join(models.Store).join(models.MarketArea).outerjoin(models.Review).filter(
+    # Base query, projected flat like unified_search so no row triggers a lazy load
+    q = _outerjoin_ratings(_join_price_hierarchy(db.query(
+        *_price_result_columns(),
+        models.ProductStoreRating.avg_rating.label("avg_rating")
+    ).select_from(models.Price))).filter(
         models.Price.product_id == product_id
-    ).group_by(models.Price.id, models.Product.id, models.Store.id, models.MarketArea.id)
+    )
 
     # This is the key change. We now correctly handle both GPS and manual cases
     # while ensuring the data shape is always consistent.
@@ -234,51 +587,32 @@ def get_prices_for_product(
         # Add the distance column to the query
         q = q.add_columns(
             sql_func.ST_Distance(
-                models.MarketArea.location.cast(Geography),
+                models.MarketArea.geog,
                 user_point.cast(Geography)
             ).label("distance_meters")
         )
         # CRUCIAL: Add the filter to only include stores within the radius
         q = q.filter(
             func.ST_DWithin(
-                models.MarketArea.location.cast(Geography),
+                models.MarketArea.geog,
                 user_point.cast(Geography),
                 radius_km * 1000
             )
         )
     else:
         # If not using GPS, add a NULL distance column to keep the data shape the same
-        q = q.add_columns(text("NULL AS distance_meters"))
+        q = q.add_columns(literal_column("NULL").label("distance_meters"))
         if city_id:
             # Filter by the manually selected city
             q = q.filter(models.MarketArea.city_id == city_id)
 
     results = q.order_by(models.Price.price.asc()).all()
     
-    # Format the results (this part is now safe because 'results' always has 3 items per row)
-    formatted_results = []
-    for price, avg_rating, distance_meters in results:
-        location_shape = to_shape(price.store.market_area.location) if price.store.market_area.location else None 
-        res = {
-            "product_id": price.product.id,
-            "product_name": price.product.name,
-            "price": price.price,
-            "store_id": price.store.id,
-            "store_name": price.store.name,
-            "market_area": price.store.market_area.name,
-            "city": price.store.market_area.city.name,
-            "state": price.store.market_area.city.state.name,
-            "timestamp": price.timestamp,
-            "lat": location_shape.y if location_shape else None,
-            "lon": location_shape.x if location_shape else None,
-            "image_url": price.product.image_url,
-            "stock_level": price.stock_level,
-            "avg_rating": avg_rating,
-            "distance_km": round(distance_meters / 1000, 2) if distance_meters is not None else None,
-        }
-        formatted_results.append(res)
-        
-    return formatted_results
+    prices = [_format_price_row(row) for row in results]
+    for res in prices:
+        res["is_out_of_state"] = None
+    return prices
+
 def get_favorite_stores(db: Session, user_id: int):
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if user:
@@ -315,10 +649,52 @@ def create_review(db: Session, review:schemas.ReviewCreate, user_id: int):
         user_id=user_id,
     )
     db.add(db_review)
+    _add_to_rating_aggregate(db, review.product_id, review.store_id, review.rating)
     db.commit()
+    _invalidate_search_cache(db, [review.product_id], [review.store_id])
     db.refresh(db_review)
     return db_review
 
+def _add_to_rating_aggregate(db: Session, product_id: int, store_id: int, rating: int):
+    # Upsert into the running totals in the same transaction as the review itself.
+    # ON CONFLICT takes a row lock, so concurrent reviews can't lose an increment.
+    ratings = models.ProductStoreRating.__table__
+    stmt = postgresql.insert(ratings).values(
+        product_id=product_id, store_id=store_id,
+        rating_sum=rating, rating_count=1, avg_rating=float(rating)
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ratings.c.product_id, ratings.c.store_id],
+        set_={
+            "rating_sum": ratings.c.rating_sum + stmt.excluded.rating_sum,
+            "rating_count": ratings.c.rating_count + 1,
+            "avg_rating": (ratings.c.rating_sum + stmt.excluded.rating_sum).cast(Float) / (ratings.c.rating_count + 1).cast(Float),
+        }
+    )
+    db.execute(stmt)
+
+def rebuild_product_store_ratings(db: Session) -> int:
+    """
+    Recomputes product_store_ratings from scratch out of the reviews table, in
+    one transaction. Returns the number of (product, store) pairs written.
+    """
+    ratings = models.ProductStoreRating.__table__
+    db.execute(ratings.delete())
+    result = db.execute(ratings.insert().from_select(
+        ["product_id", "store_id", "rating_sum", "rating_count", "avg_rating"],
+        db.query(
+            models.Review.product_id,
+            models.Review.store_id,
+            sql_func.sum(models.Review.rating),
+            sql_func.count(models.Review.id),
+            sql_func.avg(models.Review.rating).cast(Float)
+        ).filter(models.Review.store_id.isnot(None))
+        .group_by(models.Review.product_id, models.Review.store_id)
+        .statement
+    ))
+    db.commit()
+    return result.rowcount
+
 def get_reviews_for_product(db: Session, product_id: int, store_id: int):
     return db.query(models.Review).filter(
         models.Review.product_id == product_id,
@@ -338,6 +714,55 @@ def get_or_create_shopping_list(db: Session, user_id: int):
         db.refresh(shopping_list)
     return shopping_list
 
+def _list_item_query(db: Session):
+    # Shopping list items projected flat with their product and store fields,
+    # exactly the fields of schemas.ListItem
+    item = models.ShoppingListItem
+    return db.query(
+        item.id.label("id"),
+        item.product_id.label("product_id"),
+        item.quantity.label("quantity"),
+        models.Product.name.label("product_name"),
+        models.Product.image_url.label("image_url"),
+        models.Store.name.label("store_name"),
+        item.price_at_addition.label("price_at_addition"),
+    ).select_from(item).join(
+        models.Product, models.Product.id == item.product_id
+    ).join(
+        models.Store, models.Store.id == item.store_id
+    )
+
+def get_shopping_list_view(db: Session, user_id: int) -> Optional[dict]:
+    """
+    The user's shopping list with every item and the list total, read in one
+    query (the total is a window sum over the same rows). None if the user
+    has no list yet.
+    """
+    item = models.ShoppingListItem
+    rows = _list_item_query(db).add_columns(
+        models.ShoppingList.id.label("list_id"),
+        sql_func.sum(item.price_at_addition * item.quantity).over().label("total_price"),
+    ).join(
+        models.ShoppingList, models.ShoppingList.id == item.shopping_list_id
+    ).filter(
+        models.ShoppingList.user_id == user_id
+    ).order_by(item.id).all()
+
+    if not rows:
+        shopping_list = db.query(models.ShoppingList.id).filter(models.ShoppingList.user_id == user_id).first()
+        return {"id": shopping_list.id, "items": [], "total_price": 0.0} if shopping_list else None
+
+    items = []
+    for row in rows:
+        res = dict(row._mapping)
+        list_id, total_price = res.pop("list_id"), res.pop("total_price")
+        items.append(res)
+    return {"id": list_id, "items": items, "total_price": total_price}
+
+def get_list_item_view(db: Session, item_id: int) -> Optional[dict]:
+    row = _list_item_query(db).filter(models.ShoppingListItem.id == item_id).first()
+    return dict(row._mapping) if row else None
+
 def add_item_to_list(db: Session, list_id: int, item_data: schemas.ListItemCreate):
     # Check if this exact item from this exact store is already in the list
     db_item = db.query(models.ShoppingListItem).filter(
@@ -357,9 +782,177 @@ def add_item_to_list(db: Session, list_id: int, item_data: schemas.ListItemCreat
         )
         db.add(db_item)
 
+    db.flush()
+    item_id = db_item.id
+    db.commit()
+    return item_id
+
+def get_basket_price_matrix(db: Session, product_ids: List[int], lat: float, lon: float, radius_km: float):
+    """
+    Every in-stock price for `product_ids` at stores within `radius_km` of
+    lat/lon, as (product_id, store_id, store_name, market_area, price,
+    distance_meters) rows from one query. This is the product x store matrix
+    the basket optimizer works on.
+    """
+    user_point = sql_func.ST_SetSRID(sql_func.ST_MakePoint(lon, lat), 4326).cast(Geography)
+    return db.query(
+        models.Price.product_id.label("product_id"),
+        models.Store.id.label("store_id"),
+        models.Store.name.label("store_name"),
+        models.MarketArea.name.label("market_area"),
+        sql_func.min(models.Price.price).label("price"),
+        sql_func.ST_Distance(models.MarketArea.geog, user_point).label("distance_meters"),
+    ).join(
+        models.Store, models.Price.store_id == models.Store.id
+    ).join(
+        models.MarketArea, models.Store.market_area_id == models.MarketArea.id
+    ).filter(
+        models.Price.product_id.in_(product_ids),
+        models.Price.stock_level > 0,
+        sql_func.ST_DWithin(models.MarketArea.geog, user_point, radius_km * 1000)
+    ).group_by(
+        models.Price.product_id, models.Store.id, models.MarketArea.id
+    ).all()
+
+def optimize_shopping_basket(
+    db: Session,
+    user_id: int,
+    lat: float,
+    lon: float,
+    radius_km: float,
+    max_stores: int,
+    penalty_per_km: float
+) -> dict:
+    """
+    The cheapest way to buy everything on the user's shopping list from at
+    most `max_stores` stores near lat/lon, where each store visited also
+    costs `penalty_per_km` per km of distance. Where an item was added from
+    doesn't matter; quantities of the same product are added together.
+    Products no nearby store has in stock are listed as unavailable.
+    """
+    item = models.ShoppingListItem
+    wanted = db.query(
+        item.product_id, models.Product.name, sql_func.sum(item.quantity).label("quantity")
+    ).join(
+        models.ShoppingList, models.ShoppingList.id == item.shopping_list_id
+    ).join(
+        models.Product, models.Product.id == item.product_id
+    ).filter(
+        models.ShoppingList.user_id == user_id, item.quantity > 0
+    ).group_by(item.product_id, models.Product.name).all()
+
+    rows = get_basket_price_matrix(db, [w.product_id for w in wanted], lat, lon, radius_km) if wanted else []
+
+    stocked = {r.product_id for r in rows}
+    products = [w for w in wanted if w.product_id in stocked]
+    product_index = {w.product_id: i for i, w in enumerate(products)}
+    stores = {}
+    for r in rows:
+        stores.setdefault(r.store_id, r)
+    store_ids = list(stores)
+    store_index = {store_id: j for j, store_id in enumerate(store_ids)}
+
+    prices = np.full((len(products), len(store_ids)), np.nan)
+    for r in rows:
+        prices[product_index[r.product_id], store_index[r.store_id]] = r.price
+    quantities = np.array([w.quantity for w in products], dtype=float)
+    distances_km = np.array([stores[s].distance_meters / 1000 for s in store_ids])
+
+    chosen = basket.cheapest_basket(prices, quantities, distances_km, max_stores, penalty_per_km)
+
+    stops = {}
+    if chosen:
+        sub = prices[:, chosen]
+        best = np.nanargmin(np.where(np.isnan(sub), np.inf, sub), axis=1)
+        for i, w in enumerate(products):
+            j = chosen[best[i]]
+            if np.isnan(prices[i, j]):
+                continue # nothing chosen stocks it; only happens when max_stores is too small
+            store = stores[store_ids[j]]
+            stop = stops.setdefault(store.store_id, {
+                "store_id": store.store_id,
+                "store_name": store.store_name,
+                "market_area": store.market_area,
+                "distance_km": round(store.distance_meters / 1000, 2),
+                "subtotal": 0.0,
+                "items": [],
+            })
+            line_total = float(prices[i, j]) * w.quantity
+            stop["items"].append({
+                "product_id": w.product_id,
+                "product_name": w.name,
+                "quantity": w.quantity,
+                "price": float(prices[i, j]),
+                "line_total": line_total,
+            })
+            stop["subtotal"] += line_total
+
+    bought = {line["product_id"] for stop in stops.values() for line in stop["items"]}
+    total_price = sum(stop["subtotal"] for stop in stops.values())
+    distance_penalty = penalty_per_km * sum(stores[s].distance_meters / 1000 for s in stops)
+    return {
+        "stores": sorted(stops.values(), key=lambda stop: stop["distance_km"]),
+        "total_price": round(total_price, 2),
+        "distance_penalty": round(distance_penalty, 2),
+        "total_cost": round(total_price + distance_penalty, 2),
+        "unavailable_product_ids": [w.product_id for w in wanted if w.product_id not in bought],
+    }
+
+def apply_list_operations(db: Session, list_id: int, operations: list):
+    """
+    Applies a batch of shopping list edits in one transaction, set-based.
+    Operations are folded per target before anything is written: a remove
+    beats any update of the same item, the last update of an item wins
+    (quantity <= 0 removes it), and adds of the same product from the same
+    store accumulate, merging into an existing line like add_item_to_list.
+    Item ids that aren't on this list are ignored.
+    """
+    items = models.ShoppingListItem.__table__
+    removes, updates, adds = set(), {}, {}
+    for op in operations:
+        if op.op == "remove":
+            removes.add(op.item_id)
+        elif op.op == "update":
+            updates[op.item_id] = op.quantity
+        else:
+            key = (op.product_id, op.store_id)
+            quantity, _ = adds.get(key, (0, None))
+            adds[key] = (quantity + op.quantity, op.price)
+
+    removes |= {item_id for item_id, quantity in updates.items() if quantity <= 0}
+    updates = {item_id: quantity for item_id, quantity in updates.items() if item_id not in removes}
+
+    if removes:
+        db.execute(items.delete().where(items.c.shopping_list_id == list_id, items.c.id.in_(removes)))
+    if updates:
+        db.execute(
+            items.update().where(
+                items.c.id == bindparam("b_id"), items.c.shopping_list_id == list_id
+            ).values(quantity=bindparam("b_quantity")),
+            [{"b_id": item_id, "b_quantity": quantity} for item_id, quantity in updates.items()]
+        )
+    if adds:
+        existing = db.execute(
+            select(items.c.id, items.c.product_id, items.c.store_id).where(
+                items.c.shopping_list_id == list_id,
+                tuple_(items.c.product_id, items.c.store_id).in_(list(adds))
+            )
+        ).all()
+        if existing:
+            db.execute(
+                items.update().where(items.c.id == bindparam("b_id")).values(
+                    quantity=items.c.quantity + bindparam("b_quantity")
+                ),
+                [{"b_id": row.id, "b_quantity": adds.pop((row.product_id, row.store_id))[0]} for row in existing]
+            )
+        if adds:
+            db.execute(items.insert(), [
+                {
+                    "shopping_list_id": list_id, "product_id": product_id, "store_id": store_id,
+                    "quantity": quantity, "price_at_addition": price
+                } for (product_id, store_id), (quantity, price) in adds.items()
+            ])
     db.commit()
-    db.refresh(db_item)
-    return db_item
 
 def update_item_quantity(db: Session, item_id: int, quantity: int):
     db_item = db.query(models.ShoppingListItem).filter(models.ShoppingListItem.id == item_id).first()
@@ -388,6 +981,8 @@ def create_store_for_user(db: Session, store_data: schemas.StoreCreate, user_id:
     db.add(db_store)
     db.commit()
     db.refresh(db_store)
+    # The owner's cached principal still says they have no store
+    auth.invalidate_cached_user(db_store.owner.email)
     return db_store
 
 def get_prices_for_store(db: Session, store_id: int):
@@ -399,19 +994,267 @@ def get_prices_for_store(db: Session, store_id: int):
 def get_all_products(db: Session):
     return db.query(models.Product).order_by(models.Product.name).all()
 
+def iter_prices_for_store(db: Session, store_id: int, batch_size: int = 1000):
+    """
+    The rows of get_prices_for_store, shaped like schemas.Price, yielded one at
+    a time from a server-side cursor for streaming responses.
+    """
+    q = db.query(
+        models.Price.id, models.Price.price, models.Price.stock_level,
+        models.Product.id.label("product_id"), models.Product.name,
+        models.Product.category, models.Product.barcode, models.Product.image_url
+    ).join(models.Product, models.Product.id == models.Price.product_id).filter(
+        models.Price.store_id == store_id
+    ).order_by(models.Price.id)
+    for row in q.yield_per(batch_size):
+        yield {
+            "price": row.price,
+            "stock_level": row.stock_level,
+            "id": row.id,
+            "product": {
+                "id": row.product_id,
+                "name": row.name,
+                "category": row.category,
+                "barcode": row.barcode,
+                "image_url": row.image_url,
+            },
+        }
+
+def iter_all_products(db: Session, batch_size: int = 1000):
+    """get_all_products as plain dicts, streamed from a server-side cursor."""
+    q = db.query(
+        models.Product.id, models.Product.name, models.Product.category,
+        models.Product.barcode, models.Product.image_url
+    ).order_by(models.Product.name)
+    for row in q.yield_per(batch_size):
+        yield row._asdict()
+
 def create_price_for_store(db: Session, store_id: int, price_data: schemas.PriceCreate):
     # This function creates a new Price entry linked to a store and product
-    db_price = models.Price(
-        price=price_data.price,
-        stock_level=price_data.stock_level,
-        product_id=price_data.product_id,
-        store_id=store_id,
-        timestamp=datetime.utcnow()
+    # (a product the store already prices gets its existing entry updated)
+    values = {
+        "price": price_data.price,
+        "stock_level": price_data.stock_level,
+        "product_id": price_data.product_id,
+        "store_id": store_id,
+        "timestamp": datetime.utcnow()
+    }
+    stmt = postgresql.insert(models.Price).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.Price.product_id, models.Price.store_id],
+        set_={
+            "price": stmt.excluded.price,
+            "stock_level": stmt.excluded.stock_level,
+            "timestamp": stmt.excluded.timestamp
+        }
+    ).returning(models.Price.id)
+    price_id = db.execute(stmt).scalar_one()
+    _record_price_observations(db, "p.id = :price_id", {"price_id": price_id})
+    db.commit()
+    _invalidate_search_cache(db, [price_data.product_id], [store_id])
+    return db.get(models.Price, price_id, populate_existing=True)
+
+_PRICE_IMPORT_STAGING_DDL = """
+    CREATE TEMP TABLE IF NOT EXISTS price_import_staging (
+        line integer NOT NULL,
+        product_id integer,
+        barcode text,
+        price double precision NOT NULL,
+        stock_level integer NOT NULL
+    ) ON COMMIT DELETE ROWS
+"""
+
+def _copy_into_staging(db: Session, rows: List[tuple]):
+    # COPY the chunk into the session's temp staging table, with whichever
+    # psycopg generation the engine is running on
+    cursor = db.connection().connection.driver_connection.cursor()
+    columns = "price_import_staging (line, product_id, barcode, price, stock_level)"
+    try:
+        if hasattr(cursor, "copy"):
+            with cursor.copy(f"COPY {columns} FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
+        else:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {columns} FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+def import_price_chunk(db: Session, store_id: int, rows: List[tuple]):
+    """
+    Upserts one chunk of a bulk inventory upload into `prices` for a store,
+    set-based: COPY into a temp staging table, resolve barcodes to product ids,
+    then one INSERT ... ON CONFLICT on the (product, store) unique index, so
+    concurrent uploads for the same store can't both insert a product. If a
+    product appears more than once in the chunk, the last line wins.
+
+    Each row is (line, product_id, barcode, price, stock_level). Returns
+    {"inserted", "updated", "errors"} where errors lists (line, message) for
+    rows whose product couldn't be found. Commits once per chunk.
+    """
+    db.execute(text(_PRICE_IMPORT_STAGING_DDL))
+    _copy_into_staging(db, rows)
+
+    db.execute(text("""
+        UPDATE price_import_staging s SET product_id = p.id
+        FROM products p
+        WHERE s.product_id IS NULL AND s.barcode = p.barcode
+    """))
+    unknown = db.execute(text("""
+        SELECT s.line, s.product_id, s.barcode FROM price_import_staging s
+        WHERE NOT EXISTS (SELECT 1 FROM products p WHERE p.id = s.product_id)
+        ORDER BY s.line
+    """)).all()
+
+    latest = """
+        SELECT DISTINCT ON (s.product_id) s.product_id, s.price, s.stock_level
+        FROM price_import_staging s
+        JOIN products p ON p.id = s.product_id
+        ORDER BY s.product_id, s.line DESC
+    """
+    params = {"store_id": store_id, "now": datetime.utcnow()}
+    inserted, updated = db.execute(text(f"""
+        WITH upserted AS (
+            INSERT INTO prices (product_id, store_id, price, stock_level, timestamp)
+            SELECT s.product_id, :store_id, s.price, s.stock_level, :now
+            FROM ({latest}) s
+            ON CONFLICT (product_id, store_id) DO UPDATE SET
+                price = excluded.price, stock_level = excluded.stock_level, timestamp = excluded.timestamp
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM upserted
+    """), params).one()
+    _record_price_observations(
+        db,
+        "p.store_id = :store_id AND p.timestamp = :now"
+        " AND p.product_id IN (SELECT product_id FROM price_import_staging)",
+        params
     )
-    db.add(db_price)
+    touched = db.execute(text("SELECT DISTINCT product_id FROM price_import_staging WHERE product_id IS NOT NULL")).scalars().all()
     db.commit()
-    db.refresh(db_price)
-    return db_price
+    _invalidate_search_cache(db, touched, [store_id])
+
+    errors = [
+        (line, f"Unknown product_id {product_id}" if product_id is not None else f"Unknown barcode {barcode!r}")
+        for line, product_id, barcode in unknown
+    ]
+    return {"inserted": inserted, "updated": updated, "errors": errors}
+
+# Buckets kept for price history, and the date_trunc unit for each
+PRICE_HISTORY_ROLLUPS = {
+    "day": models.PriceHistoryDaily,
+    "week": models.PriceHistoryWeekly,
+}
+
+_known_observation_partitions = set()
+
+def _ensure_observation_partition(db: Session, when: datetime):
+    """
+    Makes sure price_observations has a monthly partition for `when`, so rows
+    land in their own month instead of the default partition. Runs in its own
+    short transaction, at most once per month per process.
+    """
+    month = when.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if month in _known_observation_partitions:
+        return
+    next_month = (month + timedelta(days=32)).replace(day=1)
+    name = f"price_observations_{month:%Y_%m}"
+    try:
+        with db.get_bind().engine.connect() as conn:
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF price_observations "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}')"
+            ))
+            conn.commit()
+    except SQLAlchemyError:
+        # e.g. the default partition already holds rows for this month; they still get stored there
+        logger.warning("Could not create price_observations partition %s", name, exc_info=True)
+    _known_observation_partitions.add(month)
+
+def _record_price_observations(db: Session, where: str, params: dict):
+    """
+    Appends the current state of the prices matching `where` (a condition on
+    the prices table aliased as p) to price_observations, and folds the same
+    rows into the daily and weekly per-(product, city) rollups, all in one
+    statement on the caller's transaction.
+    """
+    _ensure_observation_partition(db, datetime.utcnow())
+    rollups = []
+    for granularity, rollup in PRICE_HISTORY_ROLLUPS.items():
+        table = rollup.__tablename__
+        rollups.append(f"""
+            INSERT INTO {table} (product_id, city_id, bucket, min_price, max_price, sum_price, sample_count)
+            SELECT product_id, city_id, date_trunc('{granularity}', observed_at),
+                   min(price), max(price), sum(price), count(*)
+            FROM observed
+            GROUP BY product_id, city_id, date_trunc('{granularity}', observed_at)
+            ON CONFLICT (product_id, city_id, bucket) DO UPDATE SET
+                min_price = least({table}.min_price, excluded.min_price),
+                max_price = greatest({table}.max_price, excluded.max_price),
+                sum_price = {table}.sum_price + excluded.sum_price,
+                sample_count = {table}.sample_count + excluded.sample_count
+        """)
+    db.execute(text(f"""
+        WITH observed AS (
+            INSERT INTO price_observations (product_id, store_id, city_id, price, stock_level, observed_at)
+            SELECT p.product_id, p.store_id, m.city_id, p.price, p.stock_level, p.timestamp
+            FROM prices p
+            JOIN stores s ON s.id = p.store_id
+            JOIN market_areas m ON m.id = s.market_area_id
+            WHERE {where}
+            RETURNING product_id, city_id, price, observed_at
+        ),
+        daily AS ({rollups[0]} RETURNING 1)
+        {rollups[1]}
+    """), params)
+
+def snapshot_current_prices(db: Session):
+    # Records every current price as an observation; gives a fresh database a starting point for history
+    _record_price_observations(db, "TRUE", {})
+    db.commit()
+
+def _naive_utc(ts: datetime) -> datetime:
+    # The rollup buckets are naive UTC; an aware bound compared against them makes asyncpg refuse the query
+    if ts.tzinfo is None:
+        return ts
+    return ts.astimezone(timezone.utc).replace(tzinfo=None)
+
+def get_price_history(
+    db: Session,
+    product_id: int,
+    granularity: str = "day",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    city_id: Optional[int] = None
+):
+    """
+    Downsampled price history for a product: min/avg/max per day or week,
+    for one city or across all of them. Reads only the rollup rows, so the
+    cost follows the number of points returned, not the raw observations.
+    """
+    rollup = PRICE_HISTORY_ROLLUPS[granularity]
+    q = db.query(
+        rollup.bucket,
+        sql_func.min(rollup.min_price).label("min_price"),
+        sql_func.max(rollup.max_price).label("max_price"),
+        (sql_func.sum(rollup.sum_price) / sql_func.sum(rollup.sample_count).cast(Float)).label("avg_price"),
+        sql_func.sum(rollup.sample_count).label("samples")
+    ).filter(rollup.product_id == product_id)
+    if city_id is not None:
+        q = q.filter(rollup.city_id == city_id)
+    if start is not None:
+        q = q.filter(rollup.bucket >= sql_func.date_trunc(literal_column(f"'{granularity}'"), literal(_naive_utc(start), DateTime)))
+    if end is not None:
+        q = q.filter(rollup.bucket < _naive_utc(end))
+    results = q.group_by(rollup.bucket).order_by(rollup.bucket).all()
+    return [
+        {
+            "bucket": bucket, "min_price": min_price, "max_price": max_price,
+            "avg_price": round(avg_price, 2), "samples": samples
+        } for bucket, min_price, max_price, avg_price, samples in results
+    ]
 
 def get_price_by_id(db: Session, price_id: int):
     # A helper function to find a specific price entry
@@ -423,50 +1266,154 @@ def update_price(db: Session, price_id: int, price_data: schemas.PriceUpdate):
         db_price.price = price_data.price
         db_price.stock_level = price_data.stock_level
         db_price.timestamp = datetime.utcnow()
+        db.flush()
+        _record_price_observations(db, "p.id = :price_id", {"price_id": price_id})
         db.commit()
+        _invalidate_search_cache(db, [db_price.product_id], [db_price.store_id])
         db.refresh(db_price)
     return db_price
 
 def delete_price(db: Session, price_id: int):
     db_price = get_price_by_id(db, price_id=price_id)
     if db_price:
+        product_id, store_id = db_price.product_id, db_price.store_id
         db.delete(db_price)
         db.commit()
+        _invalidate_search_cache(db, [product_id], [store_id])
     return db_price 
 
-def log_product_view(db: Session, view_data: schemas.ProductViewLog):
-    db_view = models.ProductView(
-        product_id=view_data.product_id,
-        store_id=view_data.store_id
-    )
-    db.add(db_view)
+# Rollup table per analytics granularity; bucket keys are (store, bucket start, product)
+VIEW_ROLLUPS = {
+    "hour": models.ProductViewHourly,
+    "day": models.ProductViewDaily,
+}
+
+def _bucket_start(ts: datetime, granularity: str) -> datetime:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    ts = ts.astimezone(timezone.utc)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def log_product_views(db: Session, views: List[dict]) -> int:
+    """
+    Writes a batch of views (dicts of product_id, store_id and timestamp)
+    with one multi-row INSERT and one commit. Views naming a product or store
+    that doesn't exist are left out, since one of them would fail the foreign
+    key and take the whole batch down with it. Returns how many were left out.
+    """
+    if not views:
+        return 0
+    product_ids = set(db.execute(
+        select(models.Product.id).where(models.Product.id.in_({v["product_id"] for v in views}))
+    ).scalars())
+    store_ids = set(db.execute(
+        select(models.Store.id).where(models.Store.id.in_({v["store_id"] for v in views}))
+    ).scalars())
+    valid = [v for v in views if v["product_id"] in product_ids and v["store_id"] in store_ids]
+    dropped = len(views) - len(valid)
+    views = valid
+    if not views:
+        return dropped
+    db.execute(insert(models.ProductView).values(views))
+
+    # Fold the batch into the hourly/daily rollups in the same transaction
+    for granularity, rollup in VIEW_ROLLUPS.items():
+        counts = Counter(
+            (v["store_id"], _bucket_start(v["timestamp"], granularity), v["product_id"]) for v in views
+        )
+        table = rollup.__table__
+        stmt = postgresql.insert(table).values([
+            {"store_id": store_id, "bucket": bucket, "product_id": product_id, "view_count": count}
+            # Sorted so concurrent writers lock rows in the same order
+            for (store_id, bucket, product_id), count in sorted(counts.items())
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.store_id, table.c.bucket, table.c.product_id],
+            set_={"view_count": table.c.view_count + stmt.excluded.view_count}
+        )
+        db.execute(stmt)
     db.commit()
-    return
+    return dropped
 
-def get_view_counts_for_store(db: Session, store_id: int):
-    # This query counts views and groups them by product for the specified store
-    results = db.query(
+def rebuild_view_rollups(db: Session):
+    """
+    Recomputes the hourly and daily view rollups from the raw product_views
+    table, in one transaction.
+    """
+    for granularity, rollup in VIEW_ROLLUPS.items():
+        table = rollup.__table__
+        # Literal arguments, so the SELECT and GROUP BY render the same expression
+        bucket = sql_func.date_trunc(
+            literal_column(f"'{granularity}'"), models.ProductView.timestamp, literal_column("'UTC'")
+        )
+        db.execute(table.delete())
+        db.execute(table.insert().from_select(
+            ["store_id", "bucket", "product_id", "view_count"],
+            db.query(
+                models.ProductView.store_id,
+                bucket,
+                models.ProductView.product_id,
+                sql_func.count(models.ProductView.id)
+            ).group_by(models.ProductView.store_id, bucket, models.ProductView.product_id)
+            .statement
+        ))
+    db.commit()
+
+def _views_in_range(q, rollup, store_id: int, start: Optional[datetime], end: Optional[datetime], granularity: str):
+    # The range is widened to whole buckets at the start: a bucket counts if it begins before `end`
+    q = q.filter(rollup.store_id == store_id)
+    if start is not None:
+        q = q.filter(rollup.bucket >= _bucket_start(start, granularity))
+    if end is not None:
+        q = q.filter(rollup.bucket < end)
+    return q
+
+def get_view_counts_for_store(
+    db: Session,
+    store_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: str = "day"
+):
+    # Sums the pre-aggregated buckets per product, so the cost follows the number
+    # of buckets in the range rather than the number of raw view events
+    rollup = VIEW_ROLLUPS[granularity]
+    q = db.query(
         models.Product.name,
-        sql_func.count(models.ProductView.id).label("view_count")
-    ).join(models.ProductView).filter(
-        models.ProductView.store_id == store_id
-    ).group_by(models.Product.name).order_by(desc("view_count")).all()
+        sql_func.sum(rollup.view_count).label("view_count")
+    ).join(models.Product, models.Product.id == rollup.product_id)
+    q = _views_in_range(q, rollup, store_id, start, end, granularity)
+    results = q.group_by(models.Product.name).order_by(desc("view_count")).all()
     
     # Format the results
     return [{"product_name": name, "view_count": count} for name, count in results]
 
+def get_view_timeseries_for_store(
+    db: Session,
+    store_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: str = "day",
+    product_id: Optional[int] = None
+):
+    # Total views per bucket, oldest first, optionally for a single product
+    rollup = VIEW_ROLLUPS[granularity]
+    q = db.query(rollup.bucket, sql_func.sum(rollup.view_count).label("view_count"))
+    q = _views_in_range(q, rollup, store_id, start, end, granularity)
+    if product_id is not None:
+        q = q.filter(rollup.product_id == product_id)
+    results = q.group_by(rollup.bucket).order_by(rollup.bucket).all()
+    return [{"bucket": bucket, "view_count": count} for bucket, count in results]
+
 def get_state_info_for_location(db: Session, lat: float, lon: float):
-    user_point = func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326)
-    
-    # Query to find which state polygon contains the user's point
-    state_boundary = db.query(models.StateBoundary).filter(
-        func.ST_Contains(models.StateBoundary.geom, user_point)
-    ).first()
+    # Find which state polygon contains the user's point, using the in-memory boundary index
+    state_name = state_index.state_for_point(db, lat, lon)
 
-    if not state_boundary:
+    if not state_name:
         return None
 
-    state_name = str(state_boundary.state_name)
     max_radius = STATE_MAX_RADII.get(state_name, 100) # Default to 100km if not in our dict
 
     return {"state_name": state_name, "max_safe_radius_km": max_radius}
\ No newline at end of file
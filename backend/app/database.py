@@ -1,14 +1,64 @@
+from contextlib import contextmanager
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config import settings
+from .utils.pool_metrics import TimedQueuePool, TimedAsyncAdaptedQueuePool
+from .utils.sql_metrics import sql_metrics
 
 SQLALCHEMY_DATABASE_URL = settings.database_url
+# Same database through asyncpg, unless a separate async URL is configured
+ASYNC_DATABASE_URL = settings.async_database_url or make_url(SQLALCHEMY_DATABASE_URL).set(drivername="postgresql+asyncpg")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# Pool sizing and health settings shared by both engines. A server-side
+# statement_timeout makes a hung PostGIS query give its connection back
+# instead of draining the pool while every endpoint queues behind it.
+_pool_options = dict(
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout_seconds,
+    pool_recycle=settings.db_pool_recycle_seconds,
+    pool_pre_ping=settings.db_pool_pre_ping,
+)
+_statement_timeout = str(settings.db_statement_timeout_ms)
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    poolclass=TimedQueuePool,
+    connect_args={"options": f"-c statement_timeout={_statement_timeout}"},
+    **_pool_options
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=TimedAsyncAdaptedQueuePool,
+    connect_args={"server_settings": {"statement_timeout": _statement_timeout}},
+    **_pool_options
+)
+if settings.sql_metrics_enabled:
+    sql_metrics.instrument(engine)
+    sql_metrics.instrument(async_engine.sync_engine)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+@contextmanager
+def script_session():
+    """
+    A session for offline scripts (seeding, imports, rollup rebuilds), pinned
+    to one connection with statement_timeout lifted: their full-table
+    statements legitimately run far longer than the API's limit. Pinning
+    keeps the setting across the session's commits.
+    """
+    with engine.connect() as connection:
+        connection.exec_driver_sql("SET statement_timeout = 0")
+        connection.commit()
+        with SessionLocal(bind=connection) as db:
+            yield db
+
 def get_db():
     db = SessionLocal()
     try:
@@ -16,3 +66,12 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """
+    Async counterpart of get_db for `async def` endpoints. The crud functions
+    are written against the sync Session API; call them with
+    `await db.run_sync(crud.some_function, ...)`, which runs them on the async
+    driver without blocking the event loop (lazy loads included).
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
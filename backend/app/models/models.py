@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime,TIMESTAMP, Boolean, Text, func, Table
+from sqlalchemy import Column, Integer, BigInteger, String, Float, ForeignKey, DateTime,TIMESTAMP, Boolean, Text, func, Table, Index, DDL, event, Computed
 from sqlalchemy.orm import relationship
-from geoalchemy2 import Geometry
+from geoalchemy2 import Geometry, Geography
 from ..database import Base
 
 
@@ -44,10 +44,21 @@ class MarketArea(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     location = Column(Geometry(geometry_type='POINT', srid=4326), index=True)
+    # Stored geography copy of `location`, maintained by Postgres. Distance and
+    # radius queries must use this column: casting `location` to geography
+    # inside ST_DWithin/ST_Distance hides it from any index.
+    geog = Column(
+        Geography(geometry_type='POINT', srid=4326, spatial_index=False),
+        Computed("location::geography", persisted=True)
+    )
     city_id = Column(Integer, ForeignKey("cities.id"))
     
     city = relationship("City", back_populates="market_areas")
     stores = relationship("Store", back_populates="market_area")
+
+    __table_args__ = (
+        Index("ix_market_areas_geog", "geog", postgresql_using="gist"),
+    )
     
 class City(Base):
     __tablename__ = "cities"
@@ -77,6 +88,12 @@ class Product(Base):
     prices = relationship("Price", back_populates="product")
     reviews = relationship("Review", back_populates="product")
 
+    # Trigram index for fuzzy / substring name search (see crud._product_name_matches).
+    # A btree on name can't serve ILIKE '%q%'.
+    __table_args__ = (
+        Index("ix_products_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+    )
+
 class Price(Base):
     __tablename__ ="prices"
     id = Column(Integer, primary_key=True, index=True)
@@ -88,6 +105,11 @@ class Price(Base):
     
     product = relationship("Product", back_populates="prices")
     store = relationship("Store", back_populates="prices")
+
+    # One current price per product per store; writers upsert on it
+    __table_args__ = (
+        Index("ix_prices_product_store", "product_id", "store_id", unique=True),
+    )
     
 class Review(Base):
     __tablename__ = "reviews"
@@ -103,6 +125,19 @@ class Review(Base):
     product = relationship("Product", back_populates="reviews")
     store = relationship("Store")
     
+class ProductStoreRating(Base):
+    """
+    Running rating totals per (product, store), kept in step with `reviews` by
+    crud.create_review so reads never have to aggregate the reviews table.
+    Rebuild with `python rebuild_ratings.py` if reviews are written any other way.
+    """
+    __tablename__ = "product_store_ratings"
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    store_id = Column(Integer, ForeignKey("stores.id"), primary_key=True)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    rating_count = Column(Integer, nullable=False, default=0)
+    avg_rating = Column(Float, nullable=False)
+    
 class ShoppingList(Base):
     __tablename__ = "shopping_lists"
     id = Column(Integer, primary_key=True, index=True)
@@ -131,8 +166,125 @@ class ProductView(Base):
     store_id = Column(Integer, ForeignKey("stores.id"))
     timestamp = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
     
+class PriceObservation(Base):
+    """
+    Append-only log of every price a store has published; one row per create,
+    update or bulk-import write. Range-partitioned by month on observed_at
+    (crud creates partitions on demand, with a default partition as a catch-all).
+    """
+    __tablename__ = "price_observations"
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    observed_at = Column(DateTime, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    store_id = Column(Integer, ForeignKey("stores.id"), nullable=False)
+    city_id = Column(Integer, ForeignKey("cities.id"), nullable=False)
+    price = Column(Float, nullable=False)
+    stock_level = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_price_observations_product_observed", "product_id", "observed_at"),
+        {"postgresql_partition_by": "RANGE (observed_at)"},
+    )
+
+class PriceHistoryDaily(Base):
+    # Per-day price spread per (product, city), folded in from price_observations
+    __tablename__ = "price_history_daily"
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    city_id = Column(Integer, ForeignKey("cities.id"), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    min_price = Column(Float, nullable=False)
+    max_price = Column(Float, nullable=False)
+    sum_price = Column(Float, nullable=False)
+    sample_count = Column(Integer, nullable=False)
+
+class PriceHistoryWeekly(Base):
+    # Per-week (starting Monday) price spread per (product, city), folded in from price_observations
+    __tablename__ = "price_history_weekly"
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    city_id = Column(Integer, ForeignKey("cities.id"), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    min_price = Column(Float, nullable=False)
+    max_price = Column(Float, nullable=False)
+    sum_price = Column(Float, nullable=False)
+    sample_count = Column(Integer, nullable=False)
+
+class ProductViewHourly(Base):
+    # Per-hour view counts, maintained alongside product_views by crud.log_product_views
+    __tablename__ = "product_views_hourly"
+    store_id = Column(Integer, ForeignKey("stores.id"), primary_key=True)
+    bucket = Column(TIMESTAMP(timezone=True), primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    view_count = Column(Integer, nullable=False, default=0)
+
+class ProductViewDaily(Base):
+    # Per-day (UTC) view counts, maintained alongside product_views by crud.log_product_views
+    __tablename__ = "product_views_daily"
+    store_id = Column(Integer, ForeignKey("stores.id"), primary_key=True)
+    bucket = Column(TIMESTAMP(timezone=True), primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    view_count = Column(Integer, nullable=False, default=0)
+    
 class StateBoundary(Base):
     __tablename__ = "state_boundaries"
     id = Column(Integer, primary_key=True, index=True)
     state_name = Column(String, unique=True, index=True)
-    geom = Column(Geometry(geometry_type='GEOMETRY', srid=4326), index=True)
\ No newline at end of file
+    # Full resolution, for containment tests. The simplified copies are for
+    # drawing only: a point near a border can land on the wrong side of them.
+    geom = Column(Geometry(geometry_type='GEOMETRY', srid=4326), index=True)
+    geom_medium = Column(Geometry(geometry_type='GEOMETRY', srid=4326, spatial_index=False))
+    geom_low = Column(Geometry(geometry_type='GEOMETRY', srid=4326, spatial_index=False))
+
+class LgaBoundary(Base):
+    # Local government areas (ADM2), with the same levels of detail as StateBoundary
+    __tablename__ = "lga_boundaries"
+    id = Column(Integer, primary_key=True, index=True)
+    # The source dataset's feature id; LGA names repeat across states
+    source_id = Column(String, unique=True, nullable=False)
+    lga_name = Column(String, index=True)
+    state_name = Column(String, index=True) # the state containing the LGA, resolved on import
+    geom = Column(Geometry(geometry_type='GEOMETRY', srid=4326), index=True)
+    geom_medium = Column(Geometry(geometry_type='GEOMETRY', srid=4326, spatial_index=False))
+    geom_low = Column(Geometry(geometry_type='GEOMETRY', srid=4326, spatial_index=False))
+
+# create_all() only creates missing tables, so anything added to an existing
+# table (indexes, columns) is also applied here idempotently on every run.
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+event.listen(
+    Base.metadata, "after_create",
+    DDL("CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (name gin_trgm_ops)")
+)
+event.listen(
+    Base.metadata, "after_create",
+    DDL(
+        "ALTER TABLE market_areas ADD COLUMN IF NOT EXISTS geog geography(POINT,4326) "
+        "GENERATED ALWAYS AS (location::geography) STORED"
+    )
+)
+event.listen(
+    Base.metadata, "after_create",
+    DDL("CREATE INDEX IF NOT EXISTS ix_market_areas_geog ON market_areas USING gist (geog)")
+)
+# Older databases may already hold duplicate (product, store) prices; the newest
+# one is kept, once, before the unique index goes on
+event.listen(
+    Base.metadata, "after_create",
+    DDL(
+        "DO $$ BEGIN "
+        "IF to_regclass('ix_prices_product_store') IS NULL THEN "
+        "DELETE FROM prices a USING prices b "
+        "WHERE a.product_id = b.product_id AND a.store_id = b.store_id AND a.id < b.id; "
+        "CREATE UNIQUE INDEX ix_prices_product_store ON prices (product_id, store_id); "
+        "END IF; END $$"
+    )
+)
+event.listen(
+    Base.metadata, "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS price_observations_default PARTITION OF price_observations DEFAULT")
+)
+event.listen(
+    Base.metadata, "after_create",
+    DDL(
+        "ALTER TABLE state_boundaries ADD COLUMN IF NOT EXISTS geom_medium geometry(GEOMETRY,4326), "
+        "ADD COLUMN IF NOT EXISTS geom_low geometry(GEOMETRY,4326)"
+    )
+)
@@ -1,20 +1,61 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Literal
+from datetime import datetime
 from .. import crud, schemas
 from ..models import models
 from ..database import get_db
 from ..utils.auth import get_current_store_owner
+from ..utils.view_ingest import view_buffer
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
+def _enqueue_views(views: List[schemas.ProductViewLog]):
+    # Views are written in batches by the ingest buffer; if it's full, tell the client to back off
+    if not view_buffer.submit(views):
+        raise HTTPException(
+            status_code=503,
+            detail="View logging is busy, try again shortly.",
+            headers={"Retry-After": "1"},
+        )
+
 @router.post("/log-view", status_code=204)
-def log_a_product_view(view_data: schemas.ProductViewLog, db: Session = Depends(get_db)):
+def log_a_product_view(view_data: schemas.ProductViewLog):
     # This is a public endpoint that the mobile app will call
-    crud.log_product_view(db, view_data=view_data)
+    _enqueue_views([view_data])
+    return
+
+@router.post("/log-views", status_code=204)
+def log_product_views(batch: schemas.ProductViewBatch):
+    # Same as /log-view, for clients that collect impressions and send them together
+    _enqueue_views(batch.views)
     return
 
 @router.get("/views", response_model=List[schemas.AnalyticsResult])
-def get_store_view_analytics(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_store_owner)):
-    # This is a protected endpoint for the store owner's dashboard
-    return crud.get_view_counts_for_store(db, store_id=current_user.store.id)
\ No newline at end of file
+def get_store_view_analytics(
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_store_owner),
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    granularity: Literal["hour", "day"] = "day"
+):
+    # This is a protected endpoint for the store owner's dashboard.
+    # Totals per product over [from, to), read from the hourly or daily rollups.
+    return crud.get_view_counts_for_store(
+        db, store_id=current_user.store.id, start=start, end=end, granularity=granularity
+    )
+
+@router.get("/views/timeseries", response_model=List[schemas.ViewBucket])
+def get_store_view_timeseries(
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_store_owner),
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    granularity: Literal["hour", "day"] = "day",
+    product_id: Optional[int] = None
+):
+    # Views per hour/day bucket, for charting
+    return crud.get_view_timeseries_for_store(
+        db, store_id=current_user.store.id, start=start, end=end,
+        granularity=granularity, product_id=product_id
+    )
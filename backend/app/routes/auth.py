@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from datetime import timedelta
 
@@ -10,18 +11,23 @@ from ..config import settings
 
 router = APIRouter(tags=["authentication"])
 
+def _create_user(db: Session, user: schemas.UserCreate, hashed_password: str) -> schemas.User:
+    # Serialised here on the threadpool: reading the ORM user's store on the loop would lazy-load it there
+    return schemas.User.model_validate(crud.create_user(db, user=user, hashed_password=hashed_password))
+
 @router.post("/register", response_model=schemas.User)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
+async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    db_user = await run_in_threadpool(crud.get_user_by_email, db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    # Make sure your create_user function is correctly handling the 'name' field
-    return crud.create_user(db=db, user=user)
+    # Hash on the dedicated password pool, not the event loop
+    hashed_password = await auth.get_password_hash_async(user.password)
+    return await run_in_threadpool(_create_user, db, user, hashed_password)
 
 @router.post("/token", response_model=schemas.Token)
-def login_for_access_token(db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()):
+async def login_for_access_token(db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()):
     # Use the robust authenticate_user function
-    user = crud.authenticate_user(db, username=form_data.username, password=form_data.password)
+    user = await auth.authenticate_user(db, username=form_data.username, password=form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
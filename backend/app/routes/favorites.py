@@ -1,10 +1,11 @@
 # backend/app/routes/favorites.py
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from .. import crud, schemas
 from ..models import models 
-from ..database import SessionLocal, get_db
+from ..database import SessionLocal, get_db, get_async_db
 from ..utils.auth import get_current_user
 
 
@@ -15,19 +16,19 @@ router = APIRouter(
 
 
 @router.get("/stores", response_model=List[schemas.StoreSimple])
-def read_favorite_stores(
-    db: Session = Depends(get_db), 
-    current_user: models.User = Depends(get_current_user)
+async def read_favorite_stores(
+    db: AsyncSession = Depends(get_async_db), 
+    current_user: schemas.User = Depends(get_current_user)
 ):
     # This now works because the CRUD function returns SQLAlchemy objects
     # that match what the response_model expects.
-    return crud.get_favorite_stores(db=db, user_id=current_user.id)
+    return await db.run_sync(crud.get_favorite_stores, user_id=current_user.id)
 
 @router.post("/stores/{store_id}", response_model=schemas.StoreSimple)
 def favorite_a_store(
     store_id: int, 
     db: Session = Depends(get_db), 
-    current_user: models.User = Depends(get_current_user)
+    current_user: schemas.User = Depends(get_current_user)
 ):
     # The CRUD function now returns the added store or None
     added_store = crud.add_favorite_store(db=db, user_id=current_user.id, store_id=store_id)
@@ -39,7 +40,7 @@ def favorite_a_store(
 def unfavorite_a_store(
     store_id: int, 
     db: Session = Depends(get_db), 
-    current_user: models.User = Depends(get_current_user)
+    current_user: schemas.User = Depends(get_current_user)
 ):
     success = crud.remove_favorite_store(db=db, user_id=current_user.id, store_id=store_id)
     if not success:
@@ -0,0 +1,79 @@
+# backend/app/routes/internal.py
+import secrets
+from fastapi import APIRouter, Depends, Header, HTTPException
+from sqlalchemy.orm import Session
+from typing import Optional
+from ..config import settings
+from ..database import engine, async_engine, get_db
+from ..utils.boundaries import state_index
+from ..utils.pool_metrics import pool_status
+from ..utils.sql_metrics import sql_metrics
+from ..utils.search_cache import search_cache
+from ..utils.reference_cache import location_cache
+
+
+def require_internal_token(x_internal_token: Optional[str] = Header(None)):
+    # Internal endpoints don't exist unless a token is configured, and need it on every call
+    if not settings.internal_api_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_internal_token or not secrets.compare_digest(x_internal_token, settings.internal_api_token):
+        raise HTTPException(status_code=403, detail="Invalid internal token")
+
+
+router = APIRouter(
+    prefix="/internal",
+    tags=["internal"],
+    dependencies=[Depends(require_internal_token)],
+    include_in_schema=False
+)
+
+@router.get("/db-pool")
+def read_db_pool_metrics():
+    """
+    Live connection pool numbers for the sync and async engines: pool size,
+    connections checked out, overflow in use, and a histogram of how long
+    callers waited for a connection.
+    """
+    return {
+        "sync": pool_status(engine.pool),
+        "async": pool_status(async_engine.sync_engine.pool),
+    }
+
+@router.get("/search-cache")
+def read_search_cache_metrics():
+    """Search result cache size, hit ratio, evictions and write-driven invalidations."""
+    return search_cache.stats()
+
+@router.delete("/reference-cache", status_code=204)
+def invalidate_reference_cache():
+    """
+    Drops the cached states, cities and markets responses after the location
+    data changes. Only this worker's cache; others expire within
+    location_cache_ttl_seconds.
+    """
+    location_cache.invalidate()
+
+@router.post("/state-boundaries/reload")
+def reload_state_boundaries(db: Session = Depends(get_db)):
+    """
+    Reloads the in-memory state boundary index after import_boundaries.py.
+    Only this worker; others reload within state_boundaries_ttl_seconds.
+    """
+    return {"boundaries": state_index.reload(db)}
+
+@router.get("/sql-metrics")
+def read_sql_metrics():
+    """
+    Queries and database time per endpoint (mean and worst request), and the
+    most recent statements slower than slow_query_threshold_ms with their
+    EXPLAIN plans. Only collected when sql_metrics_enabled is set.
+    """
+    if not settings.sql_metrics_enabled:
+        raise HTTPException(status_code=404, detail="SQL metrics are disabled")
+    return sql_metrics.snapshot()
+
+@router.delete("/sql-metrics", status_code=204)
+def reset_sql_metrics():
+    if not settings.sql_metrics_enabled:
+        raise HTTPException(status_code=404, detail="SQL metrics are disabled")
+    sql_metrics.reset()
@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List
 from .. import crud, schemas
 from ..models import models
 from ..database import get_db
 from..utils.auth import get_current_store_owner
+from ..utils.inventory_import import iter_upload_rows, ImportFormatError
+from ..utils.ndjson import wants_ndjson, stream_ndjson
+from ..config import settings
 
 router = APIRouter(
     prefix="/inventory",
@@ -13,28 +17,95 @@ router = APIRouter(
 
 @router.get("/", response_model=List[schemas.Price])
 def get_store_inventory(
+    request: Request,
     db: Session = Depends(get_db), 
-    current_user: models.User = Depends(get_current_store_owner)
+    current_user: schemas.User = Depends(get_current_store_owner)
 ):
     # The dependency ensures only a store owner can access this.
-    # It then fetches all prices associated with that owner's store.
-    return crud.get_prices_for_store(db, store_id=current_user.store.id)
+    # It then fetches all prices associated with that owner's store
+    # (streamed one per line for Accept: application/x-ndjson).
+    store_id = current_user.store.id
+    if wants_ndjson(request):
+        return stream_ndjson(lambda stream_db: crud.iter_prices_for_store(stream_db, store_id=store_id))
+    return crud.get_prices_for_store(db, store_id=store_id)
 
 @router.post("/", response_model=schemas.Price, status_code=201)
 def add_price_to_inventory(
     price_data: schemas.PriceCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_store_owner)
+    current_user: schemas.User = Depends(get_current_store_owner)
 ):
     return crud.create_price_for_store(db, store_id=current_user.store.id, price_data=price_data)
 
+IMPORT_FORMATS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+@router.post("/bulk", response_model=schemas.BulkImportResult)
+async def bulk_import_inventory(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_store_owner)
+):
+    """
+    Add or update many prices in one upload. The body is streamed as CSV (with a
+    header of product_id,barcode,price,stock_level) or NDJSON (one object with
+    those keys per line); each row names its product by product_id or barcode.
+    Rows are written in chunks, so memory stays flat however large the upload,
+    and the response reports every row that couldn't be imported by line number.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    fmt = IMPORT_FORMATS.get(content_type)
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Upload text/csv or application/x-ndjson")
+
+    result = schemas.BulkImportResult()
+
+    def record_error(line: int, message: str):
+        result.failed += 1
+        if len(result.errors) < settings.inventory_import_max_errors:
+            result.errors.append(schemas.BulkImportError(line=line, error=message))
+        else:
+            result.errors_truncated = True
+
+    async def flush(chunk):
+        outcome = await run_in_threadpool(crud.import_price_chunk, db, current_user.store.id, chunk)
+        result.inserted += outcome["inserted"]
+        result.updated += outcome["updated"]
+        for line, message in outcome["errors"]:
+            record_error(line, message)
+
+    chunk = []
+    try:
+        async for line, row, error in iter_upload_rows(request.stream(), fmt):
+            result.received += 1
+            if error:
+                record_error(line, error)
+                continue
+            chunk.append((line, row["product_id"], row["barcode"], row["price"], row["stock_level"]))
+            if len(chunk) >= settings.inventory_import_chunk_size:
+                await flush(chunk)
+                chunk = []
+        if chunk:
+            await flush(chunk)
+    except ImportFormatError as e:
+        # Chunks already written stay written; the report says how far we got
+        raise HTTPException(status_code=400, detail={"message": str(e), "progress": result.model_dump()})
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail={"message": "Upload must be UTF-8", "progress": result.model_dump()})
+
+    result.errors.sort(key=lambda e: e.line)
+    return result
+
 # --- ADD THIS NEW ENDPOINT ---
 @router.put("/{price_id}", response_model=schemas.Price)
 def update_price_in_inventory(
     price_id: int,
     price_data: schemas.PriceUpdate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_store_owner)
+    current_user: schemas.User = Depends(get_current_store_owner)
 ):
     db_price = crud.get_price_by_id(db, price_id=price_id)
     if not db_price or db_price.store_id != current_user.store.id:
@@ -47,7 +118,7 @@ def update_price_in_inventory(
 def remove_price_from_inventory(
     price_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_store_owner)
+    current_user: schemas.User = Depends(get_current_store_owner)
 ):
     db_price = crud.get_price_by_id(db, price_id=price_id)
     if not db_price or db_price.store_id != current_user.store.id:
@@ -1,50 +1,158 @@
 # backend/app/routes/locations.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from .. import crud, schemas
-from ..database import SessionLocal, get_db
-from typing import List
+from ..database import SessionLocal, get_db, get_async_db
+from typing import List, Optional
+import hashlib
+from ..config import settings
+from ..utils.reference_cache import location_cache, etag_matches
+from ..utils.map_clusters import market_map_index, tiles_for_bbox, tile_bounds, TooManyTiles
+from ..utils.fast_json import FastJSONResponse, dumps
 
 router = APIRouter(
     prefix="/locations",
     tags=["locations"]
 )
 
+def _format_markets(markets_with_distance) -> List[dict]:
+    # Built in the exact shape of schemas.MarketArea, so it's sent without re-validation
+    return [
+        {
+            "id": market.id,
+            "name": market.name,
+            "city_name": market.city.name,
+            "state_name": market.city.state.name,
+            "distance_km": round(distance_meters / 1000, 2) if distance_meters is not None else None
+        } for market, distance_meters in markets_with_distance
+    ]
+
 @router.get("/markets/nearby", response_model=List[schemas.MarketArea])
-def read_nearby_markets(lat: float, lon: float, radius_km: int = 5, db: Session = Depends(get_db)):
+async def read_nearby_markets(lat: float, lon: float, radius_km: int = 5, db: AsyncSession = Depends(get_async_db)):
     """
     Get a list of market areas near a specific latitude and longitude.
     Example: /locations/markets/nearby?lat=4.83&lon=7.05
     """
-    db_markets = crud.get_markets_near_location(db=db, lat=lat, lon=lon, radius_km=radius_km)
-    
-    # Customizing the response to match our Pydantic schema
-    response_markets = []
-    for market in db_markets:
-        response_markets.append({
-            "id": market.id,
-            "name": market.name,
-            "city_name": market.city.name,
-            "state_name": market.city.state.name
-        })
+    def nearby(sync_db: Session):
+        db_markets = crud.get_markets_near_location(db=sync_db, lat=lat, lon=lon, radius_km=radius_km)
+        return _format_markets((market, None) for market in db_markets)
+
+    return FastJSONResponse(await db.run_sync(nearby))
+
+@router.get("/markets/nearest", response_model=List[schemas.MarketArea])
+async def read_nearest_markets(lat: float, lon: float, limit: int = Query(5, ge=1, le=50), db: AsyncSession = Depends(get_async_db)):
+    """
+    Get the closest market areas to a latitude and longitude, nearest first.
+    Example: /locations/markets/nearest?lat=4.83&lon=7.05&limit=3
+    """
+    nearest = await db.run_sync(crud.get_nearest_markets, lat=lat, lon=lon, limit=limit)
+    return FastJSONResponse(_format_markets(nearest))
 
-    return response_markets
+async def _reference_response(request: Request, key, load, schema) -> Response:
+    """
+    Serves reference data from the in-process cache with a strong ETag. A
+    matching If-None-Match gets a 304 straight from the cache; the database
+    is only queried (through `load`) when the entry is missing or expired.
+    """
+    entry = location_cache.get(key)
+    if entry is None:
+        version = location_cache.version
+        adapter = TypeAdapter(List[schema])
+        rows = adapter.validate_python(await load(), from_attributes=True)
+        entry = location_cache.put(key, adapter.dump_json(rows), version)
+    etag, body = entry
+
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={settings.location_cache_max_age_seconds}"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @router.get("/states", response_model=List[schemas.State])
-def read_states(db: Session = Depends(get_db)):
-    return crud.get_states(db=db)
+async def read_states(request: Request, db: AsyncSession = Depends(get_async_db)):
+    return await _reference_response(
+        request, ("states",), lambda: db.run_sync(crud.get_states), schemas.State
+    )
 
 @router.get("/cities/{state_id}", response_model=List[schemas.City])
-def read_cities_for_state(state_id: int, db: Session = Depends(get_db)):
-    return crud.get_cities_by_state(db=db, state_id=state_id)
+async def read_cities_for_state(state_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    return await _reference_response(
+        request, ("cities", state_id),
+        lambda: db.run_sync(crud.get_cities_by_state, state_id=state_id), schemas.City
+    )
 
 @router.get("/markets/{city_id}", response_model=List[schemas.MarketAreaSimple])
-def read_markets_for_city(city_id: int, db: Session = Depends(get_db)):
-    return crud.get_markets_by_city(db=db, city_id=city_id)
+async def read_markets_for_city(city_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    return await _reference_response(
+        request, ("markets", city_id),
+        lambda: db.run_sync(crud.get_markets_by_city, city_id=city_id), schemas.MarketAreaSimple
+    )
+
+@router.get("/map", response_model=schemas.MapClusters)
+async def read_map_clusters(
+    request: Request,
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    zoom: int = Query(..., ge=0, le=settings.map_max_zoom),
+    product_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Market clusters for the map tiles covering a bounding box at a zoom level:
+    each has a centroid, market and store counts, and (with product_id) the
+    cheapest in-stock price of that product. Tiles are clustered from an
+    in-memory index and cached, so panning mostly costs cache hits.
+    Example: /locations/map?min_lat=6.4&min_lon=3.2&max_lat=6.7&max_lon=3.6&zoom=11
+    """
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="min_lat/min_lon must not exceed max_lat/max_lon.")
+    try:
+        tiles = tiles_for_bbox(min_lat, min_lon, max_lat, max_lon, zoom, settings.map_max_tiles)
+    except TooManyTiles:
+        raise HTTPException(status_code=400, detail="Bounding box covers too many tiles at this zoom; zoom in.")
+
+    def cluster(sync_db: Session) -> List[dict]:
+        market_map_index.ensure_loaded(sync_db)
+        clusters, missing = [], []
+        for x, y in tiles:
+            cached = market_map_index.tiles.get(market_map_index.cache_key(zoom, x, y, product_id))
+            if cached is None:
+                missing.append((x, y))
+            else:
+                clusters += cached
+        if not missing:
+            return clusters
+
+        product_prices = None
+        if product_id is not None:
+            # One price query for all the uncached tiles together
+            bounds = [tile_bounds(zoom, x, y) for x, y in missing]
+            rows = crud.get_market_min_prices(
+                sync_db, product_id,
+                min(b[0] for b in bounds), min(b[1] for b in bounds),
+                max(b[2] for b in bounds), max(b[3] for b in bounds)
+            )
+            product_prices = {row.market_area_id: (row.min_price, row.store_count) for row in rows}
+        for x, y in missing:
+            tile_clusters = market_map_index.cluster_tile(zoom, x, y, product_prices)
+            market_map_index.tiles.set(market_map_index.cache_key(zoom, x, y, product_id), tile_clusters)
+            clusters += tile_clusters
+        return clusters
+
+    clusters = await db.run_sync(cluster)
+    body = dumps({"zoom": zoom, "tiles": len(tiles), "clusters": clusters})
+    etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={settings.map_max_age_seconds}"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @router.get("/state-info")
-def get_state_info(lat: float, lon: float, db: Session = Depends(get_db)):
-    info = crud.get_state_info_for_location(db=db, lat=lat, lon=lon)
+async def get_state_info(lat: float, lon: float, db: AsyncSession = Depends(get_async_db)):
+    info = await db.run_sync(crud.get_state_info_for_location, lat=lat, lon=lon)
     if not info:
         raise HTTPException(status_code=404, detail="Could not determine state for the given coordinates.")
     return info
\ No newline at end of file
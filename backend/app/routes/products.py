@@ -1,11 +1,16 @@
 # backend/app/routes/products.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Literal
+from datetime import datetime
 from .. import crud, schemas
 from ..models import models
-from ..database import SessionLocal, get_db
+from ..database import SessionLocal, get_db, get_async_db
+from ..config import settings
 from..utils.auth import get_current_user
+from ..utils.ndjson import wants_ndjson, stream_ndjson
+from ..utils.fast_json import FastJSONResponse
 
 router = APIRouter(
     prefix="/products",
@@ -13,25 +18,52 @@ router = APIRouter(
 )
 
 @router.get("/search", response_model=List[schemas.PriceSearchResult])
-def search_all_products(
-    db: Session = Depends(get_db),
+async def search_all_products(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
     q: str = "",
     sort_by: Optional[str] = "price_asc",
     lat: Optional[float] = None,
     lon: Optional[float] = None,
     radius_km: Optional[int] = None,
-    city_id: Optional[int] = None
+    city_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None
 ):
-    # This now correctly passes all optional params to the CRUD function
-    return crud.unified_search(
-        db=db, 
-        query=q, 
-        sort_by=sort_by, 
-        lat=lat, 
-        lon=lon, 
-        radius_km=radius_km, 
-        city_id=city_id
-    )
+    # Results come back one page at a time. The page size is capped server-side,
+    # and the cursor for the next page (if any) is sent in the X-Next-Cursor header.
+    # With Accept: application/x-ndjson every result (or the first `limit`,
+    # uncapped) is streamed instead, one JSON object per line, with no cursor.
+    if wants_ndjson(request):
+        try:
+            if cursor:
+                crud.validate_search_cursor(cursor, sort_by, lat, lon)
+        except crud.InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return stream_ndjson(lambda stream_db: crud.iter_search_results(
+            stream_db, query=q, sort_by=sort_by, lat=lat, lon=lon, radius_km=radius_km,
+            city_id=city_id, limit=limit, cursor=cursor
+        ))
+
+    if limit is None:
+        limit = settings.search_page_size
+    try:
+        results, next_cursor = await db.run_sync(
+            crud.cached_unified_search,
+            query=q, 
+            sort_by=sort_by, 
+            lat=lat, 
+            lon=lon, 
+            radius_km=radius_km, 
+            city_id=city_id,
+            limit=min(limit, settings.search_max_page_size),
+            cursor=cursor
+        )
+    except crud.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # The rows are built in PriceSearchResult's shape, so they're encoded as-is
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return FastJSONResponse(results, headers=headers)
 
 @router.get("/barcode/{barcode}", response_model=schemas.Product)
 def get_product_by_barcode(barcode: str, db: Session = Depends(get_db)):
@@ -45,22 +77,40 @@ def get_product_by_barcode(barcode: str, db: Session = Depends(get_db)):
     return db_product
 
 @router.get("/{product_id}/prices", response_model=List[schemas.PriceSearchResult])
-def read_product_prices(
+async def read_product_prices(
     product_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     lat: Optional[float] = None,
     lon: Optional[float] = None,
     radius_km: Optional[int] = None,
     city_id: Optional[int] = None
 ):
-    prices = crud.get_prices_for_product(
-        db=db, product_id=product_id, lat=lat, lon=lon, city_id=city_id
+    prices = await db.run_sync(
+        crud.get_prices_for_product,
+        product_id=product_id, lat=lat, lon=lon, radius_km=radius_km, city_id=city_id
     )
     if not prices:
         raise HTTPException(status_code=404, detail="No prices found for this product in the specified location.")
-    return prices
+    return FastJSONResponse(prices)
+
+@router.get("/{product_id}/price-history", response_model=List[schemas.PriceHistoryPoint])
+async def read_product_price_history(
+    product_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    granularity: Literal["day", "week"] = "day",
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    city_id: Optional[int] = None
+):
+    # Min/avg/max price per day or week, for one city or across all of them
+    return await db.run_sync(
+        crud.get_price_history,
+        product_id=product_id, granularity=granularity, start=start, end=end, city_id=city_id
+    )
 
 @router.get("/all", response_model=List[schemas.Product])
-def read_all_products(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def read_all_products(request: Request, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
     # This is a protected route so only logged-in users can see the product catalog
+    if wants_ndjson(request):
+        return stream_ndjson(crud.iter_all_products)
     return crud.get_all_products(db=db)
\ No newline at end of file
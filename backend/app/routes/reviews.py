@@ -12,14 +12,8 @@ router = APIRouter(prefix="/reviews", tags=["reviews"])
 def submit_review(
     review: schemas.ReviewCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: schemas.User = Depends(get_current_user)
 ):
-    print("--- SUBMIT REVIEW ROUTE HIT ---")
-    print(f"--- BODY RECEIVED: {review.model_dump_json()} ---")
-    
-    # We will hardcode the user_id to 1 for this test
-    user_id_for_test = 1
-    
     return crud.create_review(db=db, review=review, user_id=current_user.id)
     
 
@@ -1,59 +1,81 @@
 
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from .. import crud, schemas
 from ..models import models
-from ..database import get_db
+from ..database import get_db, get_async_db
 from pydantic import BaseModel 
 from ..utils.auth import get_current_user
+from ..utils.fast_json import FastJSONResponse
+from ..config import settings
 
 router = APIRouter(prefix="/list", tags=["shopping-list"])
 
 class ListItemUpdate(BaseModel):
     quantity: int
 
-@router.get("/", response_model=schemas.ShoppingList)
-def get_user_shopping_list(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    shopping_list = crud.get_or_create_shopping_list(db, user_id=current_user.id)
-
-    for item in shopping_list.items:
-        print(f"Product {item.product.name} image_url: {item.product.image_url}")
-        
-    total_price = sum(item.price_at_addition * item.quantity for item in shopping_list.items)
+def _read_shopping_list(db: Session, user_id: int) -> dict:
+    shopping_list = crud.get_shopping_list_view(db, user_id=user_id)
+    if shopping_list is None:
+        crud.get_or_create_shopping_list(db, user_id=user_id)
+        shopping_list = crud.get_shopping_list_view(db, user_id=user_id)
+    return shopping_list
 
-    formatted_items = [
-        {
-            "id": item.id, "product_id": item.product.id, "quantity": item.quantity,
-            "product_name": item.product.name, "store_id": item.store.id,
-            "store_name": item.store.name, "price_at_addition": item.price_at_addition,
-            "image_url": item.product.image_url
-        } for item in shopping_list.items
-    ]
-    return {"id": shopping_list.id,"items": formatted_items, "total_price": total_price}
+@router.get("/", response_model=schemas.ShoppingList)
+async def get_user_shopping_list(db: AsyncSession = Depends(get_async_db), current_user: schemas.User = Depends(get_current_user)):
+    return FastJSONResponse(await db.run_sync(_read_shopping_list, current_user.id))
 
 @router.post("/items", response_model=schemas.ListItem)
 def add_product_to_list(
     item_data: schemas.ListItemCreate,
     db: Session = Depends(get_db), 
-    current_user: models.User = Depends(get_current_user)
+    current_user: schemas.User = Depends(get_current_user)
+):
+    shopping_list = crud.get_or_create_shopping_list(db, user_id=current_user.id)
+    item_id = crud.add_item_to_list(db, list_id=shopping_list.id, item_data=item_data)
+
+    # Return the added item, read back as one projected row
+    return crud.get_list_item_view(db, item_id=item_id)
+
+@router.post("/batch", response_model=schemas.ShoppingList)
+def apply_shopping_list_batch(
+    batch: schemas.ListBatch,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user)
 ):
+    # Many add/update/remove taps in one request and one transaction; returns the resulting list
     shopping_list = crud.get_or_create_shopping_list(db, user_id=current_user.id)
-    item = crud.add_item_to_list(db, list_id=shopping_list.id, item_data=item_data)
+    crud.apply_list_operations(db, list_id=shopping_list.id, operations=batch.operations)
+    return FastJSONResponse(_read_shopping_list(db, current_user.id))
 
-    # Format and return the added item
-    return {
-        "id": item.id, "product_id": item.product.id, "quantity": item.quantity,
-        "product_name": item.product.name, "store_id": item.store.id,
-        "store_name": item.store.name, "price_at_addition": item.price_at_addition
-    }
+@router.post("/optimize", response_model=schemas.BasketPlan)
+async def optimize_shopping_list(
+    request: schemas.BasketOptimizeRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_user)
+):
+    max_stores = min(request.max_stores or settings.basket_max_stores, settings.basket_max_stores_limit)
+    penalty = request.distance_penalty_per_km
+    if penalty is None:
+        penalty = settings.basket_distance_penalty_per_km
+    return await db.run_sync(
+        crud.optimize_shopping_basket,
+        current_user.id,
+        request.lat,
+        request.lon,
+        min(request.radius_km, settings.basket_max_radius_km),
+        max_stores,
+        penalty
+    )
 
 @router.put("/items/{item_id}")
 def update_shopping_list_item_quantity(
     item_id: int,
     item_data: ListItemUpdate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: schemas.User = Depends(get_current_user)
 ):
     # We can add logic here to ensure the user owns this shopping list item
     crud.update_item_quantity(db=db, item_id=item_id, quantity=item_data.quantity)
@@ -63,7 +85,7 @@ def update_shopping_list_item_quantity(
 def remove_shopping_list_item(
     item_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: schemas.User = Depends(get_current_user)
 ):
     crud.remove_list_item(db=db, item_id=item_id)
     return {"status": "success"}
\ No newline at end of file
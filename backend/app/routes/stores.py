@@ -11,7 +11,7 @@ router = APIRouter(
     tags=["stores"]
 )
 
-def get_current_user_with_store_owner_role(current_user: models.User = Depends(get_current_user)):
+def get_current_user_with_store_owner_role(current_user: schemas.User = Depends(get_current_user)):
     if current_user.role != "store_owner":
         raise HTTPException(status_code=403, detail="Only users with role 'store_owner' can create a store.")
     return current_user
@@ -22,7 +22,7 @@ def create_store(
     store: schemas.StoreCreate,
     db: Session = Depends(get_db),
     # Use the new, simpler dependency that ONLY checks the role
-    current_user: models.User = Depends(get_current_user_with_store_owner_role)
+    current_user: schemas.User = Depends(get_current_user_with_store_owner_role)
 ):
     if current_user.store:
         raise HTTPException(status_code=400, detail="User already owns a store")
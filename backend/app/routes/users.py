@@ -6,7 +6,7 @@ from ..utils.auth import get_current_user
 router = APIRouter(prefix="/users", tags=["users"])
 
 @router.get("/me", response_model=schemas.User)
-def read_users_me(current_user: models.User = Depends(get_current_user)):
+def read_users_me(current_user: schemas.User = Depends(get_current_user)):
     """
     An endpoint to test authentication. Returns the current user.
     """
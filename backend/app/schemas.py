@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr, constr
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, Field, constr, conlist
+from typing import Optional, List, Literal, Union, Annotated
 from datetime import datetime
 
 
@@ -13,6 +13,7 @@ class MarketArea(MarketAreaBase):
     id: int
     city_name: str 
     state_name: str
+    distance_km: Optional[float] = None
     
     class Config:
         from_attributes = True
@@ -147,6 +148,59 @@ class ListItem(BaseModel):
     class Config:
         from_attributes = True
 
+class ListAddOperation(BaseModel):
+    op: Literal["add"]
+    product_id: int
+    store_id: int
+    price: float
+    quantity: int = Field(1, ge=1)
+
+class ListUpdateOperation(BaseModel):
+    op: Literal["update"]
+    item_id: int
+    quantity: int
+
+class ListRemoveOperation(BaseModel):
+    op: Literal["remove"]
+    item_id: int
+
+ListOperation = Annotated[
+    Union[ListAddOperation, ListUpdateOperation, ListRemoveOperation],
+    Field(discriminator="op")
+]
+
+class ListBatch(BaseModel):
+    operations: conlist(ListOperation, min_length=1, max_length=200)
+
+class BasketOptimizeRequest(BaseModel):
+    lat: float = Field(..., ge=-90, le=90)
+    lon: float = Field(..., ge=-180, le=180)
+    radius_km: float = Field(10, gt=0)
+    max_stores: Optional[int] = Field(None, ge=1) # defaults to the configured basket_max_stores
+    distance_penalty_per_km: Optional[float] = Field(None, ge=0)
+
+class BasketLine(BaseModel):
+    product_id: int
+    product_name: str
+    quantity: int
+    price: float
+    line_total: float
+
+class BasketStop(BaseModel):
+    store_id: int
+    store_name: str
+    market_area: str
+    distance_km: float
+    subtotal: float
+    items: List[BasketLine]
+
+class BasketPlan(BaseModel):
+    stores: List[BasketStop]
+    total_price: float
+    distance_penalty: float
+    total_cost: float
+    unavailable_product_ids: List[int] = []
+
 class ShoppingList(BaseModel):
     id: int
     items: List[ListItem] = []
@@ -167,10 +221,49 @@ class PriceCreate(PriceBase):
 class PriceUpdate(PriceBase):
     pass
 
+class BulkImportError(BaseModel):
+    line: int
+    error: str
+
+class BulkImportResult(BaseModel):
+    received: int = 0
+    inserted: int = 0
+    updated: int = 0
+    failed: int = 0
+    errors: List[BulkImportError] = []
+    errors_truncated: bool = False # more rows failed than are listed in errors
+
 class ProductViewLog(BaseModel):
     product_id: int
     store_id: int
 
+class ProductViewBatch(BaseModel):
+    views: conlist(ProductViewLog, min_length=1, max_length=500)
+
 class AnalyticsResult(BaseModel):
     product_name: str
-    view_count: int
\ No newline at end of file
+    view_count: int
+
+class ViewBucket(BaseModel):
+    bucket: datetime
+    view_count: int
+
+class PriceHistoryPoint(BaseModel):
+    bucket: datetime
+    min_price: float
+    avg_price: float
+    max_price: float
+    samples: int
+
+class MapCluster(BaseModel):
+    lat: float
+    lon: float
+    market_count: int
+    store_count: int
+    min_price: Optional[float] = None # cheapest in-stock price of the requested product
+    market_id: Optional[int] = None # set when the cluster is a single market
+
+class MapClusters(BaseModel):
+    zoom: int
+    tiles: int
+    clusters: List[MapCluster]
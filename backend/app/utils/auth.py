@@ -1,9 +1,12 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 # Import the new central 'get_db' and other modules correctly
@@ -11,12 +14,19 @@ from ..database import get_db
 from .. import crud, schemas
 from ..models import models
 from ..config import settings
+from .cache import TTLCache
 
 # This dependency tells FastAPI how to find the token
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-# Password Hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password Hashing. Hashes below the configured cost count as outdated
+# (needs_rehash) and are upgraded the next time that user logs in.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.password_hash_rounds,
+    bcrypt__min_rounds=settings.password_hash_rounds,
+)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -24,6 +34,63 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+def needs_rehash(hashed_password) -> bool:
+    return pwd_context.needs_update(hashed_password)
+
+# bcrypt is deliberately slow. Running it on the event loop (or on Starlette's
+# shared threadpool) lets a burst of logins stall every other endpoint, so it
+# gets its own small pool. At most `password_hash_max_pending` hashes are queued
+# or running at once; past that, callers are turned away with a 503 instead of
+# piling up behind the pool.
+hash_executor = ThreadPoolExecutor(max_workers=settings.password_hash_workers, thread_name_prefix="password-hash")
+# Only touched from the event loop, so a plain counter is enough
+_pending_hashes = 0
+
+class HashPoolBusy(HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many logins in progress, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+
+async def _run_hash_job(fn, *args):
+    global _pending_hashes
+    if _pending_hashes >= settings.password_hash_max_pending:
+        raise HashPoolBusy()
+    _pending_hashes += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(hash_executor, fn, *args)
+    finally:
+        _pending_hashes -= 1
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    return await _run_hash_job(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password) -> str:
+    return await _run_hash_job(get_password_hash, password)
+
+async def authenticate_user(db: Session, username: str, password: str):
+    """
+    Returns the user for these credentials as a schemas.User snapshot, or
+    None. Database work runs on the threadpool and bcrypt on the hashing pool,
+    so this never blocks the loop; the snapshot is built on the threadpool
+    too, since the ORM user is expired by the rehash commit and reading it on
+    the loop would reload it there.
+    """
+    user = await run_in_threadpool(crud.get_user_for_login, db, username)
+    if not user or not await verify_password_async(password, user.hashed_password):
+        return None
+    if needs_rehash(user.hashed_password):
+        try:
+            new_hash = await get_password_hash_async(password)
+        except HashPoolBusy:
+            # The login itself succeeded; upgrade the hash next time
+            new_hash = None
+        if new_hash is not None:
+            await run_in_threadpool(crud.update_password_hash, db, user, new_hash)
+    return await run_in_threadpool(schemas.User.model_validate, user)
+
 # Token Creation
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -35,8 +102,17 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.jwt_secret_key, algorithm="HS256")
     return encoded_jwt
 
+# Authenticated principals by token subject (email). Most requests resolve their
+# user from here instead of querying users (and then stores) every time. Entries
+# are dropped explicitly when the user or their store changes; the TTL bounds how
+# stale another worker process can be.
+principal_cache = TTLCache(maxsize=settings.auth_cache_size, ttl=settings.auth_cache_ttl_seconds)
+
+def invalidate_cached_user(email: str):
+    principal_cache.pop(email)
+
 # Dependency to get the current user from the token
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> schemas.User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -51,12 +127,19 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     except JWTError:
         raise credentials_exception
     
+    cached = principal_cache.get(token_data.email)
+    if cached is not None:
+        return cached
+
     user = crud.get_user_by_email(db, email=token_data.email)
     if user is None:
         raise credentials_exception
-    return user
+    # Snapshot id, role and owned store now, so later checks don't lazy-load anything
+    principal = schemas.User.model_validate(user)
+    principal_cache.set(token_data.email, principal)
+    return principal
 
-def get_current_store_owner(current_user: models.User = Depends(get_current_user)):
+def get_current_store_owner(current_user: schemas.User = Depends(get_current_user)):
     """
     A dependency that checks if the current user is a store owner.
     Raises a 403 Forbidden error if they are not.
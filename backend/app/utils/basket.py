@@ -0,0 +1,125 @@
+from itertools import combinations
+from math import comb
+from typing import List, Sequence
+
+import numpy as np
+
+# Above this many store combinations we stop enumerating and search instead
+MAX_EXACT_COMBINATIONS = 20000
+
+
+def _assignment_costs(line_prices: np.ndarray, subsets: np.ndarray) -> np.ndarray:
+    # line_prices is (items, stores); subsets is (n, k) store indexes. Cost of
+    # buying every item at the cheapest store of each subset, for all n at once.
+    return line_prices[:, subsets].min(axis=2).sum(axis=0)
+
+
+def cheapest_basket(
+    prices: np.ndarray,
+    quantities: np.ndarray,
+    distances_km: np.ndarray,
+    max_stores: int,
+    penalty_per_km: float,
+) -> List[int]:
+    """
+    Picks up to `max_stores` stores (column indexes of `prices`) minimising
+    the basket total plus `penalty_per_km` for each km to each store visited.
+
+    `prices` is an (items, stores) matrix with NaN where a store doesn't stock
+    an item. Items nobody stocks should be dropped beforehand; a choice that
+    leaves any item unbought always loses to one that buys more of them.
+
+    Small problems are solved exactly by scoring every combination in one
+    vectorised pass. Larger ones start from a greedy pick (add whichever
+    store lowers the cost most) and then swap stores in and out while that
+    still helps, each step scoring every candidate store at once.
+    """
+    n_items, n_stores = prices.shape
+    if n_items == 0 or n_stores == 0:
+        return []
+
+    line_prices = prices * quantities[:, None]
+    # Anything unbought costs more than the most expensive complete basket,
+    # so covering more items always wins over being cheaper
+    worst_line = np.nanmax(line_prices, axis=1)
+    unbought = worst_line.sum() + penalty_per_km * np.sort(distances_km)[-max_stores:].sum() + 1.0
+    line_prices = np.where(np.isnan(line_prices), unbought, line_prices)
+    store_penalty = penalty_per_km * distances_km
+
+    # A store that is no cheaper than another for any item, and no closer,
+    # can never be worth a visit; dropping them early keeps the search small
+    candidates = _undominated(line_prices, store_penalty)
+    line_prices, store_penalty = line_prices[:, candidates], store_penalty[candidates]
+    k = min(max_stores, len(candidates))
+
+    if sum(comb(len(candidates), size) for size in range(1, k + 1)) <= MAX_EXACT_COMBINATIONS:
+        best, best_cost = None, np.inf
+        for size in range(1, k + 1):
+            subsets = np.array(list(combinations(range(len(candidates)), size)))
+            costs = _assignment_costs(line_prices, subsets) + store_penalty[subsets].sum(axis=1)
+            i = int(costs.argmin())
+            if costs[i] < best_cost:
+                best, best_cost = subsets[i].tolist(), costs[i]
+        return [int(candidates[i]) for i in best]
+
+    chosen = _greedy(line_prices, store_penalty, k)
+    chosen = _improve_by_swaps(line_prices, store_penalty, chosen)
+    return [int(candidates[i]) for i in chosen]
+
+
+def _undominated(line_prices: np.ndarray, store_penalty: np.ndarray) -> np.ndarray:
+    order = np.argsort(line_prices.sum(axis=0) + store_penalty)
+    kept: List[int] = []
+    for s in order:
+        if kept:
+            k = np.array(kept)
+            dominated = (line_prices[:, k] <= line_prices[:, [s]]).all(axis=0) & (store_penalty[k] <= store_penalty[s])
+            if dominated.any():
+                continue
+        kept.append(int(s))
+    return np.array(kept)
+
+
+def _greedy(line_prices: np.ndarray, store_penalty: np.ndarray, k: int) -> List[int]:
+    best_line = np.full(line_prices.shape[0], np.inf)
+    chosen: List[int] = []
+    cost = np.inf
+    for _ in range(k):
+        gains = np.minimum(best_line[:, None], line_prices).sum(axis=0) + store_penalty
+        gains[chosen] = np.inf
+        s = int(gains.argmin())
+        # Once a store is chosen, another only helps if it beats its own penalty
+        new_cost = gains[s] + store_penalty[chosen].sum()
+        if chosen and new_cost >= cost:
+            break
+        chosen.append(s)
+        best_line = np.minimum(best_line, line_prices[:, s])
+        cost = new_cost
+    return chosen
+
+
+def _subset_cost(line_prices: np.ndarray, store_penalty: np.ndarray, chosen: Sequence[int]) -> float:
+    return float(line_prices[:, chosen].min(axis=1).sum() + store_penalty[list(chosen)].sum())
+
+
+def _improve_by_swaps(line_prices: np.ndarray, store_penalty: np.ndarray, chosen: List[int], max_rounds: int = 20) -> List[int]:
+    cost = _subset_cost(line_prices, store_penalty, chosen)
+    for _ in range(max_rounds):
+        improved = False
+        for position in range(len(chosen)):
+            rest = chosen[:position] + chosen[position + 1:]
+            rest_line = line_prices[:, rest].min(axis=1) if rest else np.full(line_prices.shape[0], np.inf)
+            rest_penalty = store_penalty[rest].sum()
+            # Replacing the store at `position` with each candidate, or dropping it
+            costs = np.minimum(rest_line[:, None], line_prices).sum(axis=0) + store_penalty + rest_penalty
+            costs[rest] = np.inf
+            s = int(costs.argmin())
+            drop_cost = rest_line.sum() + rest_penalty if rest else np.inf
+            if drop_cost <= costs[s] and drop_cost < cost - 1e-9:
+                chosen, cost, improved = rest, drop_cost, True
+                break
+            if costs[s] < cost - 1e-9:
+                chosen, cost, improved = rest + [s], float(costs[s]), True
+        if not improved:
+            break
+    return chosen
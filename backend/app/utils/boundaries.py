@@ -0,0 +1,133 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from geoalchemy2.shape import to_shape
+from shapely.geometry import Point, box
+from shapely.prepared import prep
+from shapely.strtree import STRtree
+from sqlalchemy.orm import Session
+
+from ..models import models
+from ..config import settings
+
+
+# Cache lookups return None for "outside every state", so misses need their own marker
+_MISSING = object()
+
+
+class StateBoundaryIndex:
+    """
+    An in-memory copy of `state_boundaries` for point-in-state lookups.
+
+    The polygons are written once by import_boundaries.py and almost never
+    change, so instead of an ST_Contains round trip per request they are loaded
+    into an STRtree of prepared geometries. Lookups are memoised in an LRU keyed
+    on a lat/lon grid cell (`cell_degrees` wide). A cell wholly inside one state,
+    or touching none, caches its answer; a cell a border runs through caches
+    only the states it touches, and each point in it is tested exactly.
+
+    The app lifespan loads the index at startup, and lookups before that
+    raise instead of loading it themselves: the lookup runs inside
+    AsyncSession.run_sync, where waiting on another caller's load would block
+    the event loop that load needs. Once older than `ttl_seconds` the index
+    reloads itself; one caller reloads while the others keep answering from
+    the old index. After a re-import, reload() (POST /internal/state-boundaries/reload)
+    swaps the new boundaries in straight away.
+    """
+
+    def __init__(self, cell_degrees: float, cache_size: int, ttl_seconds: int):
+        self.cell_degrees = cell_degrees
+        self.cache_size = cache_size
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._tree = None
+        self._names = []
+        self._prepared = []
+        self._cache = OrderedDict()
+        self._loaded_at = None
+
+    def reload(self, db: Session) -> int:
+        """Reads every boundary from the database and swaps in a fresh index. Returns the polygon count."""
+        with self._reload_lock:
+            return self._reload(db)
+
+    def _reload(self, db: Session) -> int:
+        rows = db.query(models.StateBoundary.state_name, models.StateBoundary.geom).all()
+        names, shapes = [], []
+        for state_name, geom in rows:
+            if geom is None:
+                continue
+            names.append(state_name)
+            shapes.append(to_shape(geom))
+        tree = STRtree(shapes) if shapes else None
+        prepared = [prep(shape) for shape in shapes]
+
+        with self._lock:
+            self._tree, self._names, self._prepared = tree, names, prepared
+            self._cache.clear()
+            self._loaded_at = time.monotonic()
+        return len(names)
+
+    def _is_stale(self) -> bool:
+        return time.monotonic() - self._loaded_at > self.ttl_seconds
+
+    def _ensure_fresh(self, db: Session):
+        if self._loaded_at is None:
+            raise RuntimeError("State boundaries are not loaded; reload() must run at startup")
+        if self._is_stale() and self._reload_lock.acquire(blocking=False):
+            # Expired: one caller reloads, the rest keep using the current index
+            try:
+                if self._is_stale():
+                    self._reload(db)
+            finally:
+                self._reload_lock.release()
+
+    def _classify_cell(self, tree, prepared, names, cell):
+        # The state covering the whole cell, None if no state touches it, or
+        # the indexes of the states whose borders run through it
+        d = self.cell_degrees
+        cell_box = box(cell[1] * d, cell[0] * d, (cell[1] + 1) * d, (cell[0] + 1) * d)
+        touching = [int(i) for i in tree.query(cell_box, predicate="intersects")] if tree is not None else []
+        for i in touching:
+            if prepared[i].contains(cell_box):
+                return names[i]
+        return tuple(touching) if touching else None
+
+    def state_for_point(self, db: Session, lat: float, lon: float) -> Optional[str]:
+        """The name of the state containing lat/lon, or None if it falls outside every boundary."""
+        self._ensure_fresh(db)
+
+        cell = (math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees))
+        with self._lock:
+            tree, names, prepared = self._tree, self._names, self._prepared
+            entry = self._cache.get(cell, _MISSING)
+            if entry is not _MISSING:
+                self._cache.move_to_end(cell)
+
+        if entry is _MISSING:
+            entry = self._classify_cell(tree, prepared, names, cell)
+            with self._lock:
+                # Don't cache an answer computed against an index that was swapped out meanwhile
+                if tree is self._tree:
+                    self._cache[cell] = entry
+                    if len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+
+        if not isinstance(entry, tuple):
+            return entry
+        point = Point(lon, lat)
+        for i in entry:
+            if prepared[i].contains(point):
+                return names[i]
+        return None
+
+
+state_index = StateBoundaryIndex(
+    cell_degrees=settings.state_lookup_cell_degrees,
+    cache_size=settings.state_lookup_cache_size,
+    ttl_seconds=settings.state_boundaries_ttl_seconds,
+)
@@ -0,0 +1,49 @@
+import numpy as np
+
+# WGS 84, the spheroid PostGIS measures geography distances on
+_A = 6378137.0
+_F = 1 / 298.257223563
+_B = (1 - _F) * _A
+
+
+def spheroid_distance(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray, max_iterations: int = 50) -> np.ndarray:
+    """
+    Metres from (lat, lon) to each of (lats, lons) along the WGS 84 spheroid
+    (Vincenty's inverse formula), which agrees with ST_Distance on geography
+    to well under a millimetre for anything but near-antipodal points.
+    """
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    u1 = np.arctan((1 - _F) * np.tan(np.radians(lat)))
+    u2 = np.arctan((1 - _F) * np.tan(np.radians(lats)))
+    sin_u1, cos_u1 = np.sin(u1), np.cos(u1)
+    sin_u2, cos_u2 = np.sin(u2), np.cos(u2)
+    big_l = np.radians(lons - lon)
+
+    lam = big_l
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for _ in range(max_iterations):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            # Lines along the equator have cos2_alpha == 0
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+            c = _F / 16 * cos2_alpha * (4 + _F * (4 - 3 * cos2_alpha))
+            previous = lam
+            lam = big_l + (1 - c) * _F * sin_alpha * (
+                sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2))
+            )
+            if np.all(np.abs(lam - previous) < 1e-12):
+                break
+
+    u_sq = cos2_alpha * (_A ** 2 - _B ** 2) / _B ** 2
+    big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    delta_sigma = big_b * sin_sigma * (cos_2sigma_m + big_b / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+        - big_b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)
+    ))
+    return _B * big_a * (sigma - delta_sigma)
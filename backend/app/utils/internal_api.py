@@ -0,0 +1,23 @@
+import urllib.error
+import urllib.request
+from typing import Optional
+
+from ..config import settings
+
+
+def call_internal_api(base_url: str, method: str, path: str) -> Optional[str]:
+    """
+    Calls an /internal endpoint of a running API with the configured token,
+    for scripts that change data the API keeps in memory. Returns None on
+    success, or what went wrong.
+    """
+    request = urllib.request.Request(
+        base_url.rstrip("/") + path,
+        method=method,
+        headers={"X-Internal-Token": settings.internal_api_token or ""},
+    )
+    try:
+        urllib.request.urlopen(request, timeout=30)
+    except (urllib.error.URLError, OSError) as e:
+        return str(e)
+    return None
@@ -0,0 +1,103 @@
+import csv
+import json
+from typing import AsyncIterator, Optional, Tuple
+
+# Longest line we'll buffer while looking for a newline; anything longer is a bad upload
+MAX_LINE_BYTES = 64 * 1024
+
+CSV_COLUMNS = ("product_id", "barcode", "price", "stock_level")
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Splits a streamed request body into (line_number, text) pairs, holding at
+    most one partial line in memory. Blank lines are skipped but counted.
+    """
+    pending = b""
+    line_number = 0
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for raw in lines:
+            line_number += 1
+            text = raw.decode("utf-8-sig" if line_number == 1 else "utf-8").strip()
+            if text:
+                yield line_number, text
+        if len(pending) > MAX_LINE_BYTES:
+            raise ImportFormatError(f"Line {line_number + 1} is longer than {MAX_LINE_BYTES} bytes")
+    if pending.strip():
+        yield line_number + 1, pending.decode("utf-8").strip()
+
+
+def parse_row(fields: dict) -> dict:
+    """
+    Validates one upload row into {product_id, barcode, price, stock_level}.
+    A row needs a product_id or a barcode, and a positive price; stock_level
+    defaults to 2 like a price added through the form.
+    """
+    def present(name) -> Optional[str]:
+        value = fields.get(name)
+        if value is None:
+            return None
+        value = str(value).strip()
+        return value or None
+
+    product_id, barcode = present("product_id"), present("barcode")
+    if product_id is None and barcode is None:
+        raise ValueError("Row needs a product_id or a barcode")
+    try:
+        product_id = int(product_id) if product_id is not None else None
+    except ValueError:
+        raise ValueError(f"Invalid product_id {product_id!r}")
+
+    price = present("price")
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid price {price!r}")
+    if not price > 0:
+        raise ValueError("Price must be greater than zero")
+
+    stock_level = present("stock_level")
+    try:
+        stock_level = int(stock_level) if stock_level is not None else 2
+    except ValueError:
+        raise ValueError(f"Invalid stock_level {stock_level!r}")
+
+    return {"product_id": product_id, "barcode": barcode, "price": price, "stock_level": stock_level}
+
+
+async def iter_upload_rows(chunks: AsyncIterator[bytes], fmt: str):
+    """
+    Yields (line_number, row_dict_or_None, error_or_None) for every data row
+    of a CSV (with a header line) or NDJSON upload.
+    """
+    header = None
+    async for line_number, text in iter_lines(chunks):
+        if fmt == "csv":
+            values = next(csv.reader([text]))
+            if header is None:
+                header = [h.strip().lower() for h in values]
+                if "price" not in header or not ({"product_id", "barcode"} & set(header)):
+                    raise ImportFormatError(
+                        "CSV header must include price and product_id or barcode, e.g. " + ",".join(CSV_COLUMNS)
+                    )
+                continue
+            fields = dict(zip(header, values))
+        else:
+            try:
+                fields = json.loads(text)
+            except ValueError:
+                yield line_number, None, "Invalid JSON"
+                continue
+            if not isinstance(fields, dict):
+                yield line_number, None, "Each line must be a JSON object"
+                continue
+        try:
+            yield line_number, parse_row(fields), None
+        except ValueError as e:
+            yield line_number, None, str(e)
@@ -0,0 +1,165 @@
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .cache import TTLCache
+from ..models import models
+from ..config import settings
+
+
+def lon_to_x(lon: float) -> float:
+    return (lon + 180.0) / 360.0
+
+
+def lat_to_y(lat: float) -> float:
+    # Web Mercator, 0 at the top; clamped to the projection's latitude limit
+    lat = max(min(lat, 85.0511), -85.0511)
+    rad = math.radians(lat)
+    return (1.0 - math.log(math.tan(rad) + 1.0 / math.cos(rad)) / math.pi) / 2.0
+
+
+def tile_bounds(zoom: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """(west, south, east, north) of a slippy-map tile, in degrees."""
+    n = 2 ** zoom
+
+    def lat(tile_y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+class TooManyTiles(ValueError):
+    pass
+
+
+def tiles_for_bbox(
+    min_lat: float, min_lon: float, max_lat: float, max_lon: float, zoom: int, max_tiles: int
+) -> List[Tuple[int, int]]:
+    """
+    The (x, y) tiles covering a bounding box. Raises TooManyTiles, before any
+    tile is listed, if there would be more than `max_tiles` of them: a world
+    box at a high zoom would otherwise be billions of tuples.
+    """
+    n = 2 ** zoom
+    clamp = lambda v: max(0, min(n - 1, v))
+    x0, x1 = clamp(int(lon_to_x(min_lon) * n)), clamp(int(lon_to_x(max_lon) * n))
+    y0, y1 = clamp(int(lat_to_y(max_lat) * n)), clamp(int(lat_to_y(min_lat) * n))
+    if (x1 - x0 + 1) * (y1 - y0 + 1) > max_tiles:
+        raise TooManyTiles(f"Bounding box covers more than {max_tiles} tiles at this zoom")
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+class MarketMapIndex:
+    """
+    Market locations held in memory as projected (Web Mercator) coordinates,
+    for clustering map tiles without touching the database.
+
+    Each tile is split into a `cells_per_tile` x `cells_per_tile` grid and the
+    markets in each cell become one cluster (count, stores, centroid, and the
+    cheapest in-stock price when a product is given). Clusters are cached per
+    tile; the cache key includes the index version, so a reload (every
+    `ttl_seconds`, like the state boundary index) retires every cached tile.
+    """
+
+    def __init__(self, cells_per_tile: int, ttl_seconds: int, cache_size: int, cache_ttl_seconds: int):
+        self.cells_per_tile = cells_per_tile
+        self.ttl_seconds = ttl_seconds
+        self.tiles = TTLCache(maxsize=cache_size, ttl=cache_ttl_seconds)
+        self.version = 0
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._points = None
+
+    def reload(self, db: Session) -> int:
+        """Reads every market's location and store count and swaps in a fresh index. Returns the market count."""
+        store_counts = db.query(
+            models.Store.market_area_id, func.count(models.Store.id).label("store_count")
+        ).group_by(models.Store.market_area_id).subquery()
+        rows = db.query(
+            models.MarketArea.id,
+            func.ST_X(models.MarketArea.location).label("lon"),
+            func.ST_Y(models.MarketArea.location).label("lat"),
+            func.coalesce(store_counts.c.store_count, 0).label("store_count"),
+        ).outerjoin(
+            store_counts, store_counts.c.market_area_id == models.MarketArea.id
+        ).filter(models.MarketArea.location.isnot(None)).all()
+        ids = np.array([r.id for r in rows], dtype=np.int64)
+        lon = np.array([r.lon for r in rows], dtype=float)
+        lat = np.array([r.lat for r in rows], dtype=float)
+        stores = np.array([r.store_count for r in rows], dtype=np.int64)
+        clamped = np.radians(np.clip(lat, -85.0511, 85.0511))
+        mx = (lon + 180.0) / 360.0
+        my = (1.0 - np.log(np.tan(clamped) + 1.0 / np.cos(clamped)) / np.pi) / 2.0
+        with self._lock:
+            self._points = (ids, lon, lat, stores, mx, my)
+            self.version += 1
+            self._loaded_at = time.monotonic()
+        return len(ids)
+
+    def ensure_loaded(self, db: Session):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl_seconds:
+            self.reload(db)
+
+    def cache_key(self, zoom: int, x: int, y: int, product_id: Optional[int]):
+        return (self.version, zoom, x, y, product_id)
+
+    def cluster_tile(self, zoom: int, x: int, y: int, product_prices: Optional[Dict[int, Tuple[float, int]]] = None) -> List[dict]:
+        """
+        Clusters for one tile. With `product_prices` ({market_id: (min_price,
+        store_count)}), only markets that stock the product count, and each
+        cluster carries the cheapest price among them.
+        """
+        ids, lon, lat, stores, mx, my = self._points
+        n = 2 ** zoom
+        inside = (np.floor(mx * n) == x) & (np.floor(my * n) == y)
+        idx = np.nonzero(inside)[0]
+        if product_prices is not None:
+            idx = idx[np.isin(ids[idx], np.fromiter(product_prices, dtype=np.int64, count=len(product_prices)))]
+        if len(idx) == 0:
+            return []
+
+        cells_n = n * self.cells_per_tile
+        cell = np.floor(mx[idx] * cells_n).astype(np.int64) * cells_n + np.floor(my[idx] * cells_n).astype(np.int64)
+        cells, which = np.unique(cell, return_inverse=True)
+        count = np.bincount(which, minlength=len(cells))
+        centroid_lon = np.bincount(which, weights=lon[idx], minlength=len(cells)) / count
+        centroid_lat = np.bincount(which, weights=lat[idx], minlength=len(cells)) / count
+
+        min_price = None
+        if product_prices is not None:
+            market_prices = np.array([product_prices[i][0] for i in ids[idx].tolist()])
+            store_counts = np.array([product_prices[i][1] for i in ids[idx].tolist()])
+            min_price = np.full(len(cells), np.inf)
+            np.minimum.at(min_price, which, market_prices)
+        else:
+            store_counts = stores[idx]
+        store_total = np.bincount(which, weights=store_counts, minlength=len(cells))
+
+        # A cluster of one is a plain market pin; give the client its id
+        single_market = np.zeros(len(cells), dtype=np.int64)
+        single_market[which] = ids[idx]
+
+        return [
+            {
+                "lat": round(float(centroid_lat[i]), 6),
+                "lon": round(float(centroid_lon[i]), 6),
+                "market_count": int(count[i]),
+                "store_count": int(store_total[i]),
+                "min_price": float(min_price[i]) if min_price is not None else None,
+                "market_id": int(single_market[i]) if count[i] == 1 else None,
+            }
+            for i in range(len(cells))
+        ]
+
+
+market_map_index = MarketMapIndex(
+    cells_per_tile=settings.map_cells_per_tile,
+    ttl_seconds=settings.map_index_ttl_seconds,
+    cache_size=settings.map_tile_cache_size,
+    cache_ttl_seconds=settings.map_tile_cache_ttl_seconds,
+)
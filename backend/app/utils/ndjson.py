@@ -0,0 +1,58 @@
+from typing import Callable, Iterator
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from .fast_json import dumps
+from ..database import SessionLocal
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Encoded rows are sent in chunks of about this many bytes
+FLUSH_BYTES = 64 * 1024
+
+
+def wants_ndjson(request: Request) -> bool:
+    """True if the client listed application/x-ndjson in its Accept header (and didn't give it q=0)."""
+    for part in request.headers.get("accept", "").split(","):
+        media_type, *params = [p.strip() for p in part.split(";")]
+        if media_type.lower() != NDJSON_MEDIA_TYPE:
+            continue
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def stream_ndjson(rows: Callable[[Session], Iterator[dict]]) -> StreamingResponse:
+    """
+    A response that writes `rows(db)` as newline-delimited JSON while they're
+    being read. The stream gets its own session, held until the last row is
+    sent: request-scoped sessions close before a streaming body runs. Errors
+    can't change the status once rows have gone out, so a failure mid-stream
+    shows up to the client as a truncated body.
+    """
+    def body():
+        db = SessionLocal()
+        try:
+            buffer = []
+            size = 0
+            for row in rows(db):
+                line = dumps(row) + b"\n"
+                buffer.append(line)
+                size += len(line)
+                if size >= FLUSH_BYTES:
+                    yield b"".join(buffer)
+                    buffer, size = [], 0
+            if buffer:
+                yield b"".join(buffer)
+        finally:
+            db.close()
+
+    return StreamingResponse(body(), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,80 @@
+import bisect
+import threading
+import time
+
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+# Upper bounds (ms) of the checkout wait histogram buckets; the last bucket is open-ended
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class CheckoutWaitHistogram:
+    """How long callers waited to get a connection out of a pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self._total = 0
+        self._sum_ms = 0.0
+        self._max_ms = 0.0
+        self._failures = 0
+
+    def observe(self, wait_ms: float, failed: bool = False):
+        with self._lock:
+            self._counts[bisect.bisect_left(WAIT_BUCKETS_MS, wait_ms)] += 1
+            self._total += 1
+            self._sum_ms += wait_ms
+            self._max_ms = max(self._max_ms, wait_ms)
+            if failed:
+                self._failures += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            buckets = {f"le_{bound}ms": count for bound, count in zip(WAIT_BUCKETS_MS, self._counts)}
+            buckets["gt_%dms" % WAIT_BUCKETS_MS[-1]] = self._counts[-1]
+            return {
+                "count": self._total,
+                "failures": self._failures,
+                "mean_ms": round(self._sum_ms / self._total, 3) if self._total else 0.0,
+                "max_ms": round(self._max_ms, 3),
+                "buckets": buckets,
+            }
+
+
+class _TimedCheckoutMixin:
+    # Times every checkout, including failed ones (pool timeout, connect error).
+    # _do_get is where QueuePool blocks waiting for a free connection.
+    wait_histogram = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            self.wait_histogram.observe((time.perf_counter() - started) * 1000, failed=True)
+            raise
+        self.wait_histogram.observe((time.perf_counter() - started) * 1000)
+        return conn
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    wait_histogram = CheckoutWaitHistogram()
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    wait_histogram = CheckoutWaitHistogram()
+
+
+def pool_status(pool) -> dict:
+    """Live numbers for one engine's pool, for the internal metrics endpoint."""
+    status = {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        # QueuePool reports overflow relative to its size; negative means unused base slots
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": pool._max_overflow,
+    }
+    if isinstance(pool, _TimedCheckoutMixin):
+        status["checkout_wait"] = pool.wait_histogram.snapshot()
+    return status
@@ -0,0 +1,58 @@
+import hashlib
+import threading
+from typing import Hashable, Optional, Tuple
+
+from .cache import TTLCache
+from ..config import settings
+
+
+class ReferenceDataCache:
+    """
+    Serialized responses for slow-changing reference data (states, cities,
+    markets), each with a strong ETag derived from its bytes.
+
+    The API itself never writes this data; seed.py does, from another
+    process, so it reaches the cache through DELETE /internal/reference-cache
+    (seed.py --notify-api). invalidate() bumps `version` and drops every
+    entry. A response built while that happened is tagged with the version
+    it started from and quietly not stored, so an old body can't outlive the
+    invalidation. The call reaches one worker; entries also expire after
+    `ttl` seconds, which covers the others.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.version = 0
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Tuple[str, bytes]]:
+        return self._entries.get(key)
+
+    def put(self, key: Hashable, body: bytes, version: int) -> Tuple[str, bytes]:
+        entry = ('"%s"' % hashlib.sha256(body).hexdigest()[:32], body)
+        with self._lock:
+            if version == self.version:
+                self._entries.set(key, entry)
+        return entry
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match uses weak comparison: W/"x" matches "x", and * matches anything
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+location_cache = ReferenceDataCache(
+    maxsize=settings.location_cache_size,
+    ttl=settings.location_cache_ttl_seconds,
+)
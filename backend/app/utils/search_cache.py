@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable, List, Optional
+
+from .fast_json import dumps
+from ..config import settings
+
+
+class SearchResultCache:
+    """
+    Search result pages keyed on the normalised search parameters (for radius
+    searches, the candidate rows of a grid cell), bounded by an approximate
+    byte budget with LRU eviction and a TTL.
+
+    Every entry is tagged with the products and stores of the rows it holds,
+    and remembers its query text. A write to a product's price or ratings
+    drops the entries holding that product or store, plus the entries whose
+    query matches the product: the write could add a row to those or reorder
+    them (the caller works out which queries match, see begin_invalidation()).
+    Entries for the empty query match everything. A page computed while an
+    invalidation ran is not stored, so it can't resurrect stale rows.
+
+    The cache is per process; other workers only see a write once their
+    copy expires after `ttl` seconds.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.bytes = 0
+        self.generation = 0
+        self._entries = OrderedDict()  # key -> (value, size, tags, expires_at)
+        self._by_tag = {}  # ("product", id), ("store", id) or ("query", text) -> set of keys
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[3] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any, query: str, products: Iterable[int], stores: Iterable[int], generation: int):
+        """
+        Stores `value` for the query text `query`, holding rows of `products`
+        at `stores`, unless something was invalidated since `generation`
+        (read it before computing the value).
+        """
+        size = len(dumps(value))
+        if size > self.max_bytes:
+            return
+        tags = frozenset(
+            [("query", query)]
+            + [("product", product_id) for product_id in products]
+            + [("store", store_id) for store_id in stores]
+        )
+        with self._lock:
+            if generation != self.generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, tags, time.monotonic() + self.ttl)
+            self.bytes += size
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def begin_invalidation(self) -> List[str]:
+        """
+        Starts an invalidation: pages computed from here on that were begun
+        before it won't be stored. Returns the non-empty query texts currently
+        cached, to be matched against the written products for invalidate().
+        """
+        with self._lock:
+            self.generation += 1
+            return [tag[1] for tag in self._by_tag if tag[0] == "query" and tag[1]]
+
+    def invalidate(self, products: Iterable[int] = (), stores: Iterable[int] = (), queries: Iterable[str] = ()):
+        """Drops the entries holding any of `products` or `stores`, or cached for any of `queries` or the empty query."""
+        doomed_tags = (
+            [("query", "")]
+            + [("query", query) for query in queries]
+            + [("product", product_id) for product_id in products]
+            + [("store", store_id) for store_id in stores]
+        )
+        with self._lock:
+            self.generation += 1
+            doomed = set()
+            for tag in doomed_tags:
+                doomed |= self._by_tag.get(tag, set())
+            for key in doomed:
+                self._remove(key)
+            self.invalidations += len(doomed)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._by_tag.clear()
+            self.bytes = 0
+
+    def _remove(self, key):
+        # Caller holds the lock
+        value, size, tags, _ = self._entries.pop(key)
+        self.bytes -= size
+        for tag in tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+search_cache = SearchResultCache(
+    max_bytes=settings.search_cache_max_bytes,
+    ttl=settings.search_cache_ttl_seconds,
+)
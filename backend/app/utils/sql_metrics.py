@@ -0,0 +1,195 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from sqlalchemy import event
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Statements we can safely ask the planner about; EXPLAIN without ANALYZE
+# never runs them, so this is fine for writes too
+_EXPLAINABLE = ("select", "insert", "update", "delete", "with")
+_MAX_STATEMENT_CHARS = 4000
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_ms")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+
+
+# The stats of the request being handled. Sync endpoints run in a threadpool
+# and async ones through run_sync, and both carry a copy of this context, so
+# every statement a request executes is counted against it.
+_current = contextvars.ContextVar("sql_request_stats", default=None)
+
+
+class SQLMetrics:
+    """
+    Query counts and database time per endpoint, fed by engine events and
+    SQLMetricsMiddleware, plus a bounded log of slow statements with their
+    EXPLAIN plans. Statements run outside a request (the view flusher,
+    startup) only show up in the totals.
+    """
+
+    def __init__(self, slow_threshold_ms: float, explain: bool, slow_log_size: int):
+        self.slow_threshold_ms = slow_threshold_ms
+        self.explain = explain
+        self.slow_queries = deque(maxlen=slow_log_size)
+        self._endpoints = {}
+        self._totals = {"queries": 0, "db_ms": 0.0, "slow_queries": 0}
+        self._lock = threading.Lock()
+
+    def instrument(self, engine):
+        """Hooks an engine's statement events. For async engines pass engine.sync_engine."""
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # One statement at a time per connection (a failed one is simply overwritten)
+        conn.info["sql_metrics_started"] = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info.pop("sql_metrics_started")) * 1000
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_ms += elapsed_ms
+        slow = elapsed_ms >= self.slow_threshold_ms
+        with self._lock:
+            self._totals["queries"] += 1
+            self._totals["db_ms"] += elapsed_ms
+            if slow:
+                self._totals["slow_queries"] += 1
+        if slow:
+            self._log_slow(conn, statement, parameters, executemany, elapsed_ms)
+
+    def _log_slow(self, conn, statement, parameters, executemany, elapsed_ms):
+        plan = None
+        if self.explain and not executemany and statement.lstrip().lower().startswith(_EXPLAINABLE):
+            plan = _explain(conn, statement, parameters)
+        entry = {
+            "at": time.time(),
+            "duration_ms": round(elapsed_ms, 2),
+            "statement": statement[:_MAX_STATEMENT_CHARS],
+            "plan": plan,
+        }
+        self.slow_queries.append(entry)
+        logger.warning(
+            "Slow query (%.1f ms): %s%s",
+            elapsed_ms, entry["statement"], "\n" + plan if plan else ""
+        )
+
+    def record_request(self, endpoint: str, stats: RequestStats, request_ms: float):
+        with self._lock:
+            e = self._endpoints.get(endpoint)
+            if e is None:
+                e = self._endpoints[endpoint] = {
+                    "requests": 0, "queries": 0, "max_queries": 0,
+                    "db_ms": 0.0, "max_db_ms": 0.0, "request_ms": 0.0,
+                }
+            e["requests"] += 1
+            e["queries"] += stats.queries
+            e["max_queries"] = max(e["max_queries"], stats.queries)
+            e["db_ms"] += stats.db_ms
+            e["max_db_ms"] = max(e["max_db_ms"], stats.db_ms)
+            e["request_ms"] += request_ms
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            endpoints = {}
+            for name, e in sorted(self._endpoints.items()):
+                n = e["requests"]
+                endpoints[name] = {
+                    "requests": n,
+                    "queries_per_request": round(e["queries"] / n, 2),
+                    "max_queries": e["max_queries"],
+                    "db_ms_per_request": round(e["db_ms"] / n, 3),
+                    "max_db_ms": round(e["max_db_ms"], 3),
+                    "request_ms_per_request": round(e["request_ms"] / n, 3),
+                }
+            totals = dict(self._totals, db_ms=round(self._totals["db_ms"], 3))
+        return {
+            "totals": totals,
+            "endpoints": endpoints,
+            "slow_query_threshold_ms": self.slow_threshold_ms,
+            "slow_queries": list(self.slow_queries),
+        }
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._totals = {"queries": 0, "db_ms": 0.0, "slow_queries": 0}
+            self.slow_queries.clear()
+
+
+def _explain(conn, statement, parameters) -> Optional[str]:
+    # Run on the same connection so temp tables and the open transaction are
+    # visible, inside a savepoint so a failed EXPLAIN can't poison the transaction
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("SAVEPOINT sql_metrics_explain")
+        try:
+            cursor.execute("EXPLAIN " + statement, parameters)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+        except Exception:
+            cursor.execute("ROLLBACK TO SAVEPOINT sql_metrics_explain")
+            logger.debug("Could not EXPLAIN slow query", exc_info=True)
+            plan = None
+        cursor.execute("RELEASE SAVEPOINT sql_metrics_explain")
+        return plan
+    except Exception:
+        # No transaction to hold a savepoint (autocommit); skip the plan
+        logger.debug("Could not EXPLAIN slow query", exc_info=True)
+        return None
+    finally:
+        cursor.close()
+
+
+class SQLMetricsMiddleware:
+    """
+    Gives every HTTP request its own RequestStats, records them per endpoint
+    (method plus route template, so /products/1 and /products/2 are one row)
+    and reports them to the client in a Server-Timing header.
+    """
+
+    def __init__(self, app, metrics: SQLMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                header = f'db;dur={stats.db_ms:.1f};desc="{stats.queries} queries"'
+                message["headers"] = [*message.get("headers", []), (b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            endpoint = f'{scope["method"]} {route.path if route is not None else "<unmatched>"}'
+            self.metrics.record_request(endpoint, stats, (time.perf_counter() - started) * 1000)
+
+
+sql_metrics = SQLMetrics(
+    slow_threshold_ms=settings.slow_query_threshold_ms,
+    explain=settings.slow_query_explain,
+    slow_log_size=settings.slow_query_log_size,
+)
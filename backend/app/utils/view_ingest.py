@@ -0,0 +1,108 @@
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import List
+
+from .. import crud, schemas
+from ..config import settings
+from ..database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class ViewIngestBuffer:
+    """
+    Collects product views in memory and writes them in batches.
+
+    /analytics/log-view is the busiest write path in the API, and one INSERT
+    plus commit per impression made it fsync-bound. Views are queued here
+    instead and a background thread writes them as one multi-row INSERT
+    whenever `batch_size` views are waiting or `flush_interval` seconds have
+    passed, whichever comes first.
+
+    The queue is bounded: submit() refuses a batch that doesn't fit rather
+    than growing without limit, and the caller turns that into a 503.
+    stop() drains everything still queued before returning.
+    """
+
+    def __init__(self, max_queue: int, batch_size: int, flush_interval: float):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rejected = 0
+        self.failed = 0
+        self.invalid = 0
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = None
+
+    def submit(self, views: List[schemas.ProductViewLog]) -> bool:
+        """Queues `views` (all or none). Returns False if the queue can't take them."""
+        # Stamp the view time now, not when the batch happens to be written
+        now = datetime.now(timezone.utc)
+        rows = [{"product_id": v.product_id, "store_id": v.store_id, "timestamp": now} for v in views]
+        with self._cond:
+            if len(self._buffer) + len(rows) > self.max_queue:
+                self.rejected += len(rows)
+                return False
+            self._buffer.extend(rows)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="view-ingest", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30.0):
+        """Flushes whatever is still queued, then stops the writer thread."""
+        with self._cond:
+            if self._thread is None:
+                return
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._stopping or len(self._buffer) >= self.batch_size,
+                    timeout=self.flush_interval
+                )
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                done = self._stopping and not self._buffer
+            if batch:
+                self._flush(batch)
+            if done:
+                return
+
+    def _flush(self, batch: List[dict]):
+        db = SessionLocal()
+        try:
+            invalid = crud.log_product_views(db, batch)
+            if invalid:
+                self.invalid += invalid
+                logger.warning("Dropped %d of %d product views for unknown products or stores", invalid, len(batch))
+        except Exception:
+            # Views are best-effort analytics; drop the batch rather than let a bad
+            # one block everything queued behind it.
+            self.failed += len(batch)
+            logger.exception("Dropped a batch of %d product views", len(batch))
+            db.rollback()
+        finally:
+            db.close()
+
+
+view_buffer = ViewIngestBuffer(
+    max_queue=settings.view_queue_max_size,
+    batch_size=settings.view_batch_size,
+    flush_interval=settings.view_flush_interval_seconds,
+)
@@ -0,0 +1,125 @@
+"""
+Concurrent throughput benchmark for the hot read endpoints.
+
+Fires requests at a running API from `--concurrency` workers for `--duration`
+seconds and reports requests/second and latency percentiles per endpoint.
+To compare two versions of the backend (e.g. before and after the async
+database path), start each one against the same seeded database and run:
+
+    python benchmarks/concurrency.py --base-url http://localhost:8000 --label sync --out sync.json
+    python benchmarks/concurrency.py --base-url http://localhost:8000 --label async --out async.json
+    python benchmarks/concurrency.py --compare sync.json async.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import httpx
+
+# (name, path, query params) — the mix each worker picks from at random
+ENDPOINTS = [
+    ("search_text", "/products/search", {"q": "milk"}),
+    ("search_geo", "/products/search", {"q": "rice", "lat": 6.5, "lon": 3.35, "radius_km": 30, "sort_by": "distance_asc"}),
+    ("search_city", "/products/search", {"q": "", "city_id": 1}),
+    ("product_prices", "/products/1/prices", {}),
+    ("states", "/locations/states", {}),
+    ("markets_nearest", "/locations/markets/nearest", {"lat": 6.5, "lon": 3.35}),
+]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def worker(client, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        name, path, params = random.choice(ENDPOINTS)
+        started = time.perf_counter()
+        try:
+            response = await client.get(path, params=params)
+            ok = response.status_code < 500
+        except httpx.HTTPError:
+            ok = False
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if ok:
+            latencies.setdefault(name, []).append(elapsed_ms)
+        else:
+            errors[name] = errors.get(name, 0) + 1
+
+
+async def run(base_url, concurrency, duration, token):
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies, errors = {}, {}
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(worker(client, deadline, latencies, errors) for _ in range(concurrency)))
+
+    report = {"concurrency": concurrency, "duration_s": duration, "endpoints": {}}
+    total = 0
+    for name, values in sorted(latencies.items()):
+        values.sort()
+        total += len(values)
+        report["endpoints"][name] = {
+            "requests": len(values),
+            "errors": errors.get(name, 0),
+            "rps": round(len(values) / duration, 1),
+            "p50_ms": round(percentile(values, 50), 1),
+            "p95_ms": round(percentile(values, 95), 1),
+            "p99_ms": round(percentile(values, 99), 1),
+            "mean_ms": round(statistics.fmean(values), 1),
+        }
+    report["total_rps"] = round(total / duration, 1)
+    return report
+
+
+def print_report(label, report):
+    print(f"\n== {label}: {report['total_rps']} req/s at concurrency {report['concurrency']} ==")
+    print(f"{'endpoint':<18}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>8}")
+    for name, stats in report["endpoints"].items():
+        print(f"{name:<18}{stats['rps']:>8}{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}{stats['errors']:>8}")
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{'endpoint':<18}{'rps before':>12}{'rps after':>12}{'p95 before':>12}{'p95 after':>12}")
+    for name in sorted(set(before["endpoints"]) | set(after["endpoints"])):
+        b, a = before["endpoints"].get(name, {}), after["endpoints"].get(name, {})
+        print(f"{name:<18}{b.get('rps', '-'):>12}{a.get('rps', '-'):>12}{b.get('p95_ms', '-'):>12}{a.get('p95_ms', '-'):>12}")
+    print(f"{'total':<18}{before['total_rps']:>12}{after['total_rps']:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds")
+    parser.add_argument("--token", help="bearer token, for authenticated endpoints")
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--out", help="write the report to this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two saved reports")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = asyncio.run(run(args.base_url, args.concurrency, args.duration, args.token))
+    report["label"] = args.label
+    print_report(args.label, report)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
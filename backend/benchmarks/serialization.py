@@ -0,0 +1,213 @@
+"""
+Response serialization benchmark: the fast path (trusted rows encoded with
+orjson by FastJSONResponse) against the current one (FastAPI validating the
+rows against the response_model and then encoding them).
+
+Both paths serve the same synthetic rows, shaped like what crud builds for
+each endpoint, through the full ASGI stack in this process. No database or
+server is involved, so the numbers are serialization cost only:
+
+    python benchmarks/serialization.py --requests 2000
+    python benchmarks/serialization.py --rows 1000 --out serialization.json
+
+Requests are driven as bare ASGI calls, so CPU per request (process time
+over the loop) is the app's routing, validation and encoding and little else.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import schemas  # noqa: E402
+from app.utils.fast_json import FastJSONResponse  # noqa: E402
+
+
+def _search_rows(n):
+    base = datetime(2025, 1, 1, 8, 30)
+    return [
+        {
+            "product_id": random.randint(1, 5000),
+            "product_name": f"Product {i} 500g",
+            "image_url": f"https://cdn.example.com/products/{i}.jpg",
+            "price": round(random.uniform(100, 25000), 2),
+            "timestamp": base + timedelta(seconds=random.randint(0, 10 ** 7), microseconds=random.randint(0, 999999)),
+            "stock_level": random.randint(0, 3),
+            "store_id": random.randint(1, 2000),
+            "store_name": f"Store {i % 300}",
+            "market_area": f"Market {i % 80}",
+            "city": "Lagos",
+            "state": "Lagos",
+            "lat": round(random.uniform(6.4, 6.7), 6),
+            "lon": round(random.uniform(3.2, 3.6), 6),
+            "avg_rating": round(random.uniform(1, 5), 2) if i % 3 else None,
+            "distance_km": round(random.uniform(0, 30), 2),
+            "is_out_of_state": False,
+        }
+        for i in range(n)
+    ]
+
+
+def _shopping_list(n):
+    items = [
+        {
+            "id": i,
+            "product_id": random.randint(1, 5000),
+            "quantity": random.randint(1, 5),
+            "product_name": f"Product {i} 1kg",
+            "image_url": f"https://cdn.example.com/products/{i}.jpg",
+            "store_name": f"Store {i % 20}",
+            "price_at_addition": round(random.uniform(100, 25000), 2),
+        }
+        for i in range(n)
+    ]
+    return {"id": 1, "items": items, "total_price": sum(i["price_at_addition"] * i["quantity"] for i in items)}
+
+
+def _markets(n):
+    return [
+        {"id": i, "name": f"Market {i}", "city_name": "Port Harcourt", "state_name": "Rivers",
+         "distance_km": round(random.uniform(0, 20), 2)}
+        for i in range(n)
+    ]
+
+
+def _map_clusters(n):
+    return {
+        "zoom": 12,
+        "tiles": 6,
+        "clusters": [
+            {"lat": round(random.uniform(6.4, 6.7), 6), "lon": round(random.uniform(3.2, 3.6), 6),
+             "market_count": random.randint(1, 40), "store_count": random.randint(1, 400),
+             "min_price": round(random.uniform(100, 5000), 2), "market_id": None}
+            for _ in range(n)
+        ],
+    }
+
+
+# name -> (response_model, row builder)
+PAYLOADS = {
+    "search": (List[schemas.PriceSearchResult], _search_rows),
+    "product_prices": (List[schemas.PriceSearchResult], _search_rows),
+    "shopping_list": (schemas.ShoppingList, _shopping_list),
+    "markets_nearest": (List[schemas.MarketArea], _markets),
+    "map": (schemas.MapClusters, _map_clusters),
+}
+
+
+def _add_routes(app, name, model, content):
+    # Current path: the endpoint returns the rows and FastAPI validates and encodes them
+    @app.get(f"/current/{name}", response_model=model)
+    async def current():
+        return content
+
+    @app.get(f"/fast/{name}", response_model=model)
+    async def fast():
+        return FastJSONResponse(content)
+
+
+def build_app(rows):
+    app = FastAPI()
+    for name, (model, _) in PAYLOADS.items():
+        _add_routes(app, name, model, rows[name])
+    return app
+
+
+async def get(app, path) -> bytes:
+    """One GET through the app, with no HTTP client or server in the way."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    status, chunks = None, []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    if status != 200:
+        raise SystemExit(f"GET {path} returned {status}")
+    return b"".join(chunks)
+
+
+async def measure(app, path, requests):
+    total_bytes = 0
+    cpu_started, wall_started = time.process_time(), time.perf_counter()
+    for _ in range(requests):
+        total_bytes += len(await get(app, path))
+    cpu, wall = time.process_time() - cpu_started, time.perf_counter() - wall_started
+    return {
+        "cpu_ms_per_request": round(cpu / requests * 1000, 4),
+        "bytes_per_request": total_bytes // requests,
+        "mb_per_second": round(total_bytes / wall / 1e6, 2),
+        "requests_per_second": round(requests / wall, 1),
+    }
+
+
+async def run(args):
+    random.seed(args.random_seed)
+    rows = {name: build(args.rows) for name, (_, build) in PAYLOADS.items()}
+    app = build_app(rows)
+    report = {"rows": args.rows, "requests": args.requests, "endpoints": {}}
+    for name in PAYLOADS:
+        # Both paths must send the same document
+        current = json.loads(await get(app, f"/current/{name}"))
+        fast = json.loads(await get(app, f"/fast/{name}"))
+        if current != fast:
+            raise SystemExit(f"{name}: the fast path's response differs from the current path's")
+
+        for path in ("current", "fast"):
+            await measure(app, f"/{path}/{name}", args.warmup)
+        report["endpoints"][name] = {
+            "current": await measure(app, f"/current/{name}", args.requests),
+            "fast": await measure(app, f"/fast/{name}", args.requests),
+        }
+    return report
+
+
+def print_report(report):
+    print(f"\n== {report['rows']} rows per response, {report['requests']} requests per path ==")
+    print(f"{'endpoint':<18}{'cpu ms cur':>12}{'cpu ms fast':>12}{'MB/s cur':>10}{'MB/s fast':>11}{'speedup':>9}")
+    for name, e in report["endpoints"].items():
+        cur, fast = e["current"], e["fast"]
+        speedup = cur["cpu_ms_per_request"] / fast["cpu_ms_per_request"] if fast["cpu_ms_per_request"] else float("inf")
+        print(
+            f"{name:<18}{cur['cpu_ms_per_request']:>12}{fast['cpu_ms_per_request']:>12}"
+            f"{cur['mb_per_second']:>10}{fast['mb_per_second']:>11}{speedup:>8.1f}x"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200, help="rows (or list items, or clusters) per response")
+    parser.add_argument("--requests", type=int, default=1000, help="requests measured per path and endpoint")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--random-seed", type=int, default=1)
+    parser.add_argument("--out", help="write the report to this JSON file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,213 @@
+import argparse
+import csv
+import io
 import json
-from app.database import SessionLocal, engine
+import time
+from app.database import script_session, engine
 from app.models import models
-from geoalchemy2.elements import WKTElement
-from shapely.geometry import shape # Ensure shapely is imported
-
-models.Base.metadata.create_all(bind=engine)
-db = SessionLocal()
-
-try:
-    print("Loading GeoJSON data from geoBoundaries-NGA-ADM1.geojson...")
-    # Make sure your file is named geoBoundaries-NGA-ADM1.geojson
-    with open('nga.geojson', 'r') as f:
-        data = json.load(f)
-
-    print("Importing state boundaries...")
-    for feature in data['features']:
-        state_name = feature['properties']['shapeName'] # The key is 'shapeName' in this file
-        geometry = feature['geometry']
-        
-        if not db.query(models.StateBoundary).filter(models.StateBoundary.state_name == state_name).first():
-            geom_shape = shape(geometry)
-            
-            # --- THIS IS THE FIX ---
-            # Simplify the geometry to reduce its complexity and data size.
-            # The '0.01' is the tolerance; a higher number means more simplification.
-            simplified_geom = geom_shape.simplify(0.05, preserve_topology=True)
-            
-            boundary = models.StateBoundary(
-                state_name=state_name,
-                geom=WKTElement(simplified_geom.wkt, srid=4326)
-            )
-            db.add(boundary)
-            print(f"  + Added {state_name}")
-
-    db.commit()
-    print("Boundary import complete! 🗺️")
-
-finally:
-    db.close()
+from app.config import settings
+from app.utils.internal_api import call_internal_api
+from sqlalchemy import text
+
+# Simplification tolerances (degrees) of the display copies of each boundary;
+# `geom` itself is stored at full resolution for containment tests
+DETAIL_LEVELS = {"geom_medium": 0.005, "geom_low": 0.05}
+
+# Features parsed before each COPY into the staging table
+BATCH_SIZE = 200
+READ_SIZE = 1 << 20
+
+STAGING_DDL = """
+    CREATE TEMP TABLE IF NOT EXISTS boundary_import_staging (
+        seq integer NOT NULL,
+        source_id text,
+        name text NOT NULL,
+        geojson text NOT NULL
+    ) ON COMMIT DROP
+"""
+
+
+def iter_features(path, read_size=READ_SIZE):
+    """
+    Yields the features of a GeoJSON FeatureCollection one at a time, reading
+    the file in chunks. Only the feature being decoded is held in memory, so
+    a national LGA file costs about as much memory as its largest polygon.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8-sig") as f:
+        buffer, pos = "", 0
+
+        # Skip the collection header up to the opening bracket of "features"
+        while True:
+            start = buffer.find('"features"')
+            bracket = buffer.find("[", start) if start >= 0 else -1
+            if bracket >= 0:
+                pos = bracket + 1
+                break
+            chunk = f.read(read_size)
+            if not chunk:
+                raise ValueError(f"{path} has no features array")
+            buffer += chunk
+
+        while True:
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                    pos += 1
+                if pos < len(buffer):
+                    break
+                buffer, pos = f.read(read_size), 0
+                if not buffer:
+                    raise ValueError(f"{path} ends inside the features array")
+            if buffer[pos] == "]":
+                return
+
+            want = read_size
+            while True:
+                try:
+                    feature, pos = decoder.raw_decode(buffer, pos)
+                    break
+                except json.JSONDecodeError:
+                    chunk = f.read(want)
+                    if not chunk:
+                        raise
+                    buffer, pos = buffer[pos:] + chunk, 0
+                    # Grow the read with the buffer so a huge feature isn't re-parsed once per chunk
+                    want = max(want, len(buffer))
+            yield feature
+
+            if pos > read_size:
+                buffer, pos = buffer[pos:], 0
+
+
+def detect_level(path):
+    for feature in iter_features(path):
+        shape_type = (feature.get("properties") or {}).get("shapeType") or ""
+        return "adm2" if shape_type.upper() == "ADM2" else "adm1"
+    return "adm1"
+
+
+def copy_into_staging(db, rows):
+    # COPY a batch into the staging table, with whichever psycopg generation the engine is running on
+    cursor = db.connection().connection.driver_connection.cursor()
+    columns = "boundary_import_staging (seq, source_id, name, geojson)"
+    try:
+        if hasattr(cursor, "copy"):
+            with cursor.copy(f"COPY {columns} FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
+        else:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {columns} FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def stage_features(db, path, name_property, id_property):
+    """Streams every feature into the staging table in batches. Returns (staged, skipped)."""
+    db.execute(text(STAGING_DDL))
+    batch, staged, skipped = [], 0, 0
+    for seq, feature in enumerate(iter_features(path)):
+        properties = feature.get("properties") or {}
+        name, geometry = properties.get(name_property), feature.get("geometry")
+        if not name or not geometry:
+            skipped += 1
+            continue
+        source_id = properties.get(id_property)
+        batch.append((seq, str(source_id) if source_id is not None else None, name, json.dumps(geometry)))
+        if len(batch) >= BATCH_SIZE:
+            copy_into_staging(db, batch)
+            staged += len(batch)
+            batch = []
+    if batch:
+        copy_into_staging(db, batch)
+        staged += len(batch)
+    return staged, skipped
+
+
+def _geometry_columns():
+    simplified = ", ".join(f"ST_SimplifyPreserveTopology(g, {tolerance})" for tolerance in DETAIL_LEVELS.values())
+    names = ", ".join(DETAIL_LEVELS)
+    updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in ("geom", *DETAIL_LEVELS))
+    return names, simplified, updates
+
+
+# A feature repeated in the file (same name, or same id for LGAs) keeps its last occurrence
+STAGED_GEOMETRIES = """
+    SELECT DISTINCT ON ({key}) {key} AS key, name,
+        ST_MakeValid(ST_SetSRID(ST_GeomFromGeoJSON(geojson), 4326)) AS g
+    FROM boundary_import_staging
+    ORDER BY {key}, seq DESC
+"""
+
+
+def merge_states(db):
+    names, simplified, updates = _geometry_columns()
+    return db.execute(text(f"""
+        INSERT INTO state_boundaries (state_name, geom, {names})
+        SELECT name, g, {simplified} FROM ({STAGED_GEOMETRIES.format(key="name")}) s
+        ON CONFLICT (state_name) DO UPDATE SET {updates}
+    """)).rowcount
+
+
+def merge_lgas(db):
+    names, simplified, updates = _geometry_columns()
+    merged = db.execute(text(f"""
+        INSERT INTO lga_boundaries (source_id, lga_name, geom, {names})
+        SELECT key, name, g, {simplified}
+        FROM ({STAGED_GEOMETRIES.format(key="COALESCE(source_id, name)")}) s
+        ON CONFLICT (source_id) DO UPDATE SET lga_name = EXCLUDED.lga_name, {updates}
+    """)).rowcount
+    # Each LGA belongs to the state containing a point inside it
+    db.execute(text("""
+        UPDATE lga_boundaries l SET state_name = s.state_name
+        FROM state_boundaries s
+        WHERE l.source_id IN (SELECT COALESCE(source_id, name) FROM boundary_import_staging)
+          AND ST_Contains(s.geom, ST_PointOnSurface(l.geom))
+    """))
+    unmatched = db.execute(text("SELECT count(*) FROM lga_boundaries WHERE state_name IS NULL")).scalar()
+    return merged, unmatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import state (ADM1) or LGA (ADM2) boundaries from a GeoJSON file.")
+    parser.add_argument("path", nargs="?", default="nga.geojson")
+    parser.add_argument("--level", choices=("auto", "adm1", "adm2"), default="auto",
+                        help="boundary level; auto reads shapeType from the first feature")
+    parser.add_argument("--name-property", default="shapeName")
+    parser.add_argument("--id-property", default="shapeID", help="unique feature id, used for LGAs")
+    parser.add_argument("--notify-api", metavar="URL",
+                        help="after a state import, have the API at URL reload its boundary index (needs INTERNAL_API_TOKEN)")
+    args = parser.parse_args()
+
+    level = detect_level(args.path) if args.level == "auto" else args.level
+    models.Base.metadata.create_all(bind=engine)
+    with script_session() as db:
+        started = time.monotonic()
+        print(f"Streaming {level.upper()} boundaries from {args.path}...")
+        staged, skipped = stage_features(db, args.path, args.name_property, args.id_property)
+        if skipped:
+            print(f"  Skipped {skipped} features without a {args.name_property!r} property or geometry")
+
+        print("Merging and building simplified display levels...")
+        if level == "adm1":
+            merged, unmatched = merge_states(db), 0
+        else:
+            merged, unmatched = merge_lgas(db)
+        db.commit()
+        print(f"Boundary import complete! 🗺️  {merged} boundaries from {staged} features in {time.monotonic() - started:.1f}s")
+        if level == "adm1":
+            if args.notify_api:
+                error = call_internal_api(args.notify_api, "POST", "/internal/state-boundaries/reload")
+                if error:
+                    print(f"  Couldn't have {args.notify_api} reload its boundaries ({error}).")
+                else:
+                    print(f"The API at {args.notify_api} has reloaded its boundaries.")
+            print(f"Other API workers pick up the new boundaries within {settings.state_boundaries_ttl_seconds}s (or on restart).")
+        elif unmatched:
+            print(f"  {unmatched} LGAs aren't inside any state boundary; import the states first, then re-run this.")
+
+
+if __name__ == "__main__":
+    main()
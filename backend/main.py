@@ -1,12 +1,31 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine
+from app.database import engine, SessionLocal, async_engine
 from app.models import models
-from app.routes import locations, auth, products, favorites, reviews, users, shopping_list, stores, inventory, analytics
+from app.utils.boundaries import state_index
+from app.utils.view_ingest import view_buffer
+from app.utils.sql_metrics import sql_metrics, SQLMetricsMiddleware
+from app.config import settings
+from app.routes import locations, auth, products, favorites, reviews, users, shopping_list, stores, inventory, analytics, internal
 
 models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Neighbour API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Geo lookups answer from this in-memory copy of the state boundaries and refuse to run before it is loaded
+    db = SessionLocal()
+    try:
+        state_index.reload(db)
+    finally:
+        db.close()
+    view_buffer.start()
+    yield
+    # Write out any product views still queued before the process exits
+    view_buffer.stop()
+    await async_engine.dispose()
+
+app = FastAPI(title="Neighbour API", lifespan=lifespan)
 
 origins = [
     "http://localhost:5173",          # For the web-dashboard
@@ -20,8 +39,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"], # Allows all methods
     allow_headers=["*"], # Allows all headers
+    expose_headers=["X-Next-Cursor"], # Lets browser clients read the search page cursor
 )
 
+if settings.sql_metrics_enabled:
+    # Per-request query counts and DB time, read back from /internal/sql-metrics
+    app.add_middleware(SQLMetricsMiddleware, metrics=sql_metrics)
+
 
 app.include_router(locations.router)
 app.include_router(auth.router)
@@ -33,6 +57,7 @@ app.include_router(shopping_list.router)
 app.include_router(stores.router) 
 app.include_router(inventory.router)
 app.include_router(analytics.router)
+app.include_router(internal.router)
 
 @app.get("/", tags=["Root"])
 def read_root():
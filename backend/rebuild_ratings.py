@@ -0,0 +1,11 @@
+from app.database import script_session, engine
+from app.models import models
+from app import crud
+
+# Ensure all tables are created
+models.Base.metadata.create_all(bind=engine)
+
+with script_session() as db:
+    print("Rebuilding product/store rating aggregates from reviews...")
+    count = crud.rebuild_product_store_ratings(db)
+    print(f"✅ Rebuilt ratings for {count} product/store pairs.")
@@ -0,0 +1,11 @@
+from app.database import script_session, engine
+from app.models import models
+from app import crud
+
+# Ensure all tables are created
+models.Base.metadata.create_all(bind=engine)
+
+with script_session() as db:
+    print("Rebuilding hourly and daily view rollups from product_views...")
+    crud.rebuild_view_rollups(db)
+    print("✅ View rollups rebuilt.")
@@ -1,16 +1,23 @@
-from app.database import SessionLocal, engine
+from app.database import script_session, engine
 from app.models import models
-from app.utils.auth import get_password_hash
-from datetime import datetime
+from app import crud
+from app.config import settings
+from app.utils.internal_api import call_internal_api
+from app.utils.auth import get_password_hash, pwd_context
+from datetime import datetime, timedelta
 from geoalchemy2.elements import WKTElement
+from sqlalchemy import func as sql_func, text
+import argparse
+import io
+import itertools
 import random
+import time
 
-# Ensure all tables are created
-models.Base.metadata.create_all(bind=engine)
+import numpy as np
+import shapely
 
-db = SessionLocal()
 
-try:
+def seed_sample(db):
     # --- 1. DEFINE EXPANDED DATA ---
     print("Defining expanded sample data...")
     
@@ -164,6 +171,8 @@ try:
                 stock = random.randint(1, 3)
                 db.add(models.Price(product_id=product.id, store_id=store.id, price=final_price, stock_level=stock, timestamp=datetime.utcnow()))
     db.commit()
+    # Seeded prices bypass crud, so record them as the first point of each product's price history
+    crud.snapshot_current_prices(db)
     
     print("Seeding reviews...")
     consumer_user = db.query(models.User).filter(models.User.email == "consumer@test.com").first()
@@ -187,8 +196,331 @@ try:
             ))
             db.commit()
 
+    # Reviews above are inserted directly, so bring the rating aggregates in line with them
+    crud.rebuild_product_store_ratings(db)
+
     print("Review seeding complete! ⭐")
     print("\n✅ Seeding complete!")
 
-finally:
-    db.close()
\ No newline at end of file
+
+# --- Generator mode ---------------------------------------------------------
+# `python seed.py --generate` builds a synthetic dataset of any size instead of
+# the hand-written sample above. The same --seed, --now and counts always
+# produce the same rows, ids included. Markets are placed inside the state
+# polygons loaded by import_boundaries.py, clustered around a few city centres
+# per state, and every table is bulk-loaded with COPY.
+
+# bcrypt's base64 alphabet; a salt's last character only carries 2 bits, so it is one of ".Oeu"
+BCRYPT_SALT_CHARS = "./ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+
+BRANDS = ["Golden Penny", "Dangote", "Peak", "Dano", "Honeywell", "Indomie", "Kings", "Power", "Mamador", "Devon",
+          "Cowbell", "Three Crowns", "Milo", "Bournvita", "Lipton", "Nestle", "Gino", "Tasty Tom", "Mr Chef", "Hypo"]
+ITEMS = {
+    "Grains": ["Rice", "Semovita", "Wheat Meal", "Spaghetti", "Macaroni", "Garri", "Oats", "Beans"],
+    "Dairy": ["Evaporated Milk", "Powdered Milk", "Yoghurt", "Butter", "Cheese"],
+    "Beverages": ["Tea", "Cocoa Drink", "Malt Drink", "Table Water", "Cola", "Orange Juice", "Energy Drink"],
+    "Noodles": ["Instant Noodles", "Chicken Noodles", "Pepper Soup Noodles"],
+    "Cooking Oil": ["Vegetable Oil", "Palm Oil", "Groundnut Oil"],
+    "Cleaning": ["Detergent", "Bleach", "Dishwashing Liquid", "Bar Soap"],
+    "Personal Care": ["Toothpaste", "Antiseptic", "Body Lotion", "Bathing Soap"],
+    "Sweeteners": ["Sugar", "Sugar Cubes", "Honey"],
+    "Seasoning": ["Seasoning Cubes", "Tomato Paste", "Curry Powder", "Thyme", "Salt"],
+    "Snacks": ["Biscuits", "Sausage Roll", "Chin Chin", "Plantain Chips"],
+}
+SIZES = ["100g", "250g", "400g", "500g", "900g", "1kg", "2kg", "5kg", "50cl", "75cl", "1L", "5L", "Pack of 12", "Carton"]
+STORE_WORDS = ["Mega", "Fair Price", "Central", "Family", "Discount", "Wholesale", "Corner", "Premier", "Everyday", "Value"]
+STORE_KINDS = ["Store", "Supermart", "Provisions", "Traders", "Mart", "Foods & Groceries", "Mini Mart"]
+MARKET_KINDS = ["Market", "Main Market", "Shopping Plaza", "Mall", "Junction Market", "Estate Market"]
+REVIEW_COMMENTS = ["", "", "", "Good value.", "Fresh stock.", "A bit pricey here.", "Always in stock.", "Fake product, avoid.", "Fast service."]
+
+# Rows per COPY write
+COPY_CHUNK_ROWS = 200_000
+
+
+def _tsv(rows):
+    return "".join("\t".join("\\N" if v is None else str(v) for v in row) + "\n" for row in rows)
+
+
+def _copy(db, table, columns, chunks):
+    # COPY text chunks into `table`, with whichever psycopg generation the engine is running on
+    cursor = db.connection().connection.driver_connection.cursor()
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    try:
+        if hasattr(cursor, "copy"):
+            with cursor.copy(sql) as copy:
+                for chunk in chunks:
+                    copy.write(chunk)
+        else:
+            for chunk in chunks:
+                cursor.copy_expert(sql, io.StringIO(chunk))
+    finally:
+        cursor.close()
+
+
+def _copy_rows(db, table, columns, rows):
+    rows = iter(rows)
+    _copy(db, table, columns, iter(lambda: _tsv(itertools.islice(rows, COPY_CHUNK_ROWS)), ""))
+
+
+def _points_in(geom, rng, n, center=None, spread=None):
+    """n random points inside a shapely geometry, uniform or normally spread around `center`."""
+    shapely.prepare(geom)
+    min_x, min_y, max_x, max_y = geom.bounds
+    xs, ys = np.empty(0), np.empty(0)
+    attempts = 0
+    while len(xs) < n:
+        attempts += 1
+        if center is not None and attempts <= 50:
+            x = rng.normal(center[0], spread, 4 * n)
+            y = rng.normal(center[1], spread, 4 * n)
+        else:
+            x = rng.uniform(min_x, max_x, 4 * n)
+            y = rng.uniform(min_y, max_y, 4 * n)
+        inside = shapely.contains_xy(geom, x, y)
+        xs, ys = np.concatenate([xs, x[inside]]), np.concatenate([ys, y[inside]])
+    return xs[:n], ys[:n]
+
+
+def _sync_sequences(db, tables):
+    for table in tables:
+        db.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE((SELECT max(id) FROM {table}), 0) + 1, false)"
+        ))
+
+
+def generate_dataset(db, options):
+    started = time.monotonic()
+    rng = np.random.default_rng(options.seed)
+    pick = random.Random(options.seed)
+    now = options.now
+
+    def step(message):
+        print(f"[{time.monotonic() - started:7.1f}s] {message}")
+
+
+    has_data = db.query(models.State.id).first() or db.query(models.Price.id).first()
+    if has_data and not options.reset:
+        raise SystemExit("The database already has data; rerun with --reset to replace it with a generated dataset.")
+    if options.reset:
+        step("Clearing existing data...")
+        db.execute(text(
+            "TRUNCATE states, cities, market_areas, stores, products, prices, users, reviews, product_views "
+            "RESTART IDENTITY CASCADE"
+        ))
+
+    # States come from the imported boundaries, so every market is inside a real state polygon
+    boundaries = db.query(models.StateBoundary.state_name, sql_func.ST_AsBinary(models.StateBoundary.geom)).order_by(models.StateBoundary.state_name).all()
+    if not boundaries:
+        raise SystemExit("No state boundaries found; run import_boundaries.py first.")
+    boundaries = boundaries[:options.states] if options.states else boundaries
+    state_shapes = [shapely.from_wkb(bytes(wkb)) for _, wkb in boundaries]
+    step(f"Generating {len(boundaries)} states and {len(boundaries) * options.cities_per_state} cities...")
+    _copy_rows(db, "states", ("id", "name"), ((i + 1, name) for i, (name, _) in enumerate(boundaries)))
+
+    city_rows, city_centres, city_state = [], [], []
+    for state_index, geom in enumerate(state_shapes):
+        xs, ys = _points_in(geom, rng, options.cities_per_state)
+        for x, y in zip(xs, ys):
+            city_id = len(city_rows) + 1
+            city_rows.append((city_id, f"{boundaries[state_index][0]} City {city_id}", state_index + 1))
+            city_centres.append((x, y))
+            city_state.append(state_index)
+    _copy_rows(db, "cities", ("id", "name", "state_id"), city_rows)
+
+    # Markets cluster around city centres; bigger cities (lower ids within a state) get more
+    step(f"Placing {options.markets} markets...")
+    city_weight = 1.0 / (np.arange(len(city_rows)) % options.cities_per_state + 1)
+    market_city = rng.choice(len(city_rows), size=options.markets, p=city_weight / city_weight.sum())
+    market_rows = []
+    for city_index in np.unique(market_city):
+        count = int((market_city == city_index).sum())
+        xs, ys = _points_in(state_shapes[city_state[city_index]], rng, count, center=city_centres[city_index], spread=0.08)
+        for x, y in zip(xs, ys):
+            market_id = len(market_rows) + 1
+            market_rows.append((
+                market_id, f"{city_rows[city_index][1]} {pick.choice(MARKET_KINDS)} {market_id}",
+                f"SRID=4326;POINT({x:.6f} {y:.6f})", int(city_index) + 1
+            ))
+    _copy_rows(db, "market_areas", ("id", "name", "location", "city_id"), market_rows)
+
+    # One bcrypt hash shared by every generated user (all log in with "password"); hashing each would take hours.
+    # Its salt comes from the seed as well, so reruns write the same hash
+    step(f"Generating {options.users} users...")
+    salt_pick = random.Random(options.seed)
+    salt = "".join(salt_pick.choice(BCRYPT_SALT_CHARS) for _ in range(21)) + salt_pick.choice(".Oeu")
+    hashed_password = pwd_context.handler().using(salt=salt).hash("password")
+    n_owners = min(options.users // 2, options.stores // 5)
+    _copy_rows(db, "users", ("id", "name", "email", "hashed_password", "is_active", "role"), (
+        (i, f"User {i}", f"user{i}@example.com", hashed_password, "t", "store_owner" if i <= n_owners else "consumer")
+        for i in range(1, options.users + 1)
+    ))
+
+    step(f"Generating {options.stores} stores...")
+    store_market = rng.integers(1, options.markets + 1, options.stores)
+    _copy_rows(db, "stores", ("id", "name", "owner_id", "market_area_id"), (
+        (i, f"{pick.choice(STORE_WORDS)} {pick.choice(STORE_KINDS)}", i if i <= n_owners else None, int(store_market[i - 1]))
+        for i in range(1, options.stores + 1)
+    ))
+
+    step(f"Generating {options.products} products...")
+    categories = list(ITEMS)
+    product_category = rng.integers(0, len(categories), options.products)
+    _copy_rows(db, "products", ("id", "name", "barcode", "category", "image_url"), (
+        (
+            i,
+            f"{pick.choice(BRANDS)} {pick.choice(ITEMS[categories[product_category[i - 1]]])} ({pick.choice(SIZES)})",
+            str(2000000000000 + i), categories[product_category[i - 1]], None
+        )
+        for i in range(1, options.products + 1)
+    ))
+    db.commit()
+
+    # Prices: each store stocks products drawn from a skewed popularity curve,
+    # so some products are everywhere and the long tail is rare. Base prices are
+    # per product, with a per-store markup and a little noise on top.
+    step(f"Generating ~{options.prices} prices...")
+    popularity = 1.0 / (rng.permutation(options.products) + 10.0) ** 0.9
+    popularity /= popularity.sum()
+    base_price = np.round(rng.lognormal(7.5, 0.9, options.products), -1).clip(50, 500000)
+    store_markup = rng.normal(1.0, 0.05, options.stores)
+    per_store = min(options.products, max(1, round(options.prices / options.stores)))
+    timestamps = [(now - timedelta(hours=h)).isoformat(sep=" ") for h in range(24 * 30)]
+    pair_products, pair_stores = [], []
+    price_id = 0
+    stores_per_block = max(1, 1_000_000 // per_store)
+
+    def price_chunks():
+        nonlocal price_id
+        for first in range(0, options.stores, stores_per_block):
+            block = np.arange(first, min(first + stores_per_block, options.stores))
+            counts = rng.poisson(per_store, len(block)).clip(1, options.products)
+            target = int(counts.sum())
+            # Popular products get drawn more than once for a store; those repeats
+            # are dropped and made up with further draws, then the block is
+            # trimmed back to its target at random
+            keys, draw = np.empty(0, dtype=np.int64), counts
+            for _ in range(5):
+                stores = np.repeat(block, draw)
+                products = rng.choice(options.products, size=len(stores), p=popularity)
+                keys = np.unique(np.concatenate([keys, stores.astype(np.int64) * options.products + products]))
+                if len(keys) >= target:
+                    keys = np.sort(rng.choice(keys, target, replace=False))
+                    break
+                draw = np.ceil(counts * (target - len(keys)) / target).astype(int)
+            stores, products = keys // options.products, keys % options.products
+            remaining = options.prices - price_id
+            if remaining <= 0:
+                break
+            stores, products = stores[:remaining], products[:remaining]
+            prices = np.round(base_price[products] * store_markup[stores] * rng.normal(1.0, 0.03, len(products)), -1).clip(10)
+            stock = rng.choice(4, size=len(products), p=[0.05, 0.2, 0.45, 0.3])
+            when = rng.integers(0, len(timestamps), len(products))
+            pair_products.append(products.astype(np.int32))
+            pair_stores.append(stores.astype(np.int32))
+            ids = range(price_id + 1, price_id + len(products) + 1)
+            price_id += len(products)
+            for offset in range(0, len(products), COPY_CHUNK_ROWS):
+                part = slice(offset, offset + COPY_CHUNK_ROWS)
+                yield "".join(
+                    f"{i}\t{p + 1}\t{s + 1}\t{pr:.0f}\t{st}\t{timestamps[w]}\n"
+                    for i, p, s, pr, st, w in zip(
+                        ids[part], products[part].tolist(), stores[part].tolist(),
+                        prices[part].tolist(), stock[part].tolist(), when[part].tolist()
+                    )
+                )
+
+    _copy(db, "prices", ("id", "product_id", "store_id", "price", "stock_level", "timestamp"), price_chunks())
+    db.commit()
+    pair_products, pair_stores = np.concatenate(pair_products), np.concatenate(pair_stores)
+    step(f"Loaded {price_id} prices")
+
+    consumers = np.arange(n_owners + 1, options.users + 1)
+    if options.reviews and len(consumers):
+        step(f"Generating {options.reviews} reviews...")
+        which = rng.integers(0, len(pair_products), options.reviews)
+        ratings = rng.choice(np.arange(1, 6), size=options.reviews, p=[0.05, 0.08, 0.17, 0.35, 0.35])
+        reviewers = rng.choice(consumers, options.reviews)
+        when = rng.integers(0, 24 * 365, options.reviews)
+        _copy_rows(db, "reviews", ("id", "rating", "comment", "timestamp", "user_id", "product_id", "store_id"), (
+            (
+                i + 1, int(ratings[i]), pick.choice(REVIEW_COMMENTS) or None,
+                f"{(now - timedelta(hours=int(when[i]))).isoformat(sep=' ')}+00",
+                int(reviewers[i]), int(pair_products[which[i]]) + 1, int(pair_stores[which[i]]) + 1
+            )
+            for i in range(options.reviews)
+        ))
+        db.commit()
+
+    if options.views:
+        step(f"Generating {options.views} product views...")
+        which = rng.integers(0, len(pair_products), options.views)
+        seconds = rng.integers(0, 30 * 24 * 3600, options.views)
+        _copy_rows(db, "product_views", ("id", "product_id", "store_id", "timestamp"), (
+            (
+                i + 1, int(pair_products[which[i]]) + 1, int(pair_stores[which[i]]) + 1,
+                f"{(now - timedelta(seconds=int(seconds[i]))).isoformat(sep=' ')}+00"
+            )
+            for i in range(options.views)
+        ))
+        db.commit()
+
+    _sync_sequences(db, ("states", "cities", "market_areas", "users", "stores", "products", "prices", "reviews", "product_views"))
+    db.commit()
+
+    step("Building rating aggregates, view rollups and price history...")
+    crud.rebuild_product_store_ratings(db)
+    crud.rebuild_view_rollups(db)
+    crud.snapshot_current_prices(db)
+
+    step("Analyzing...")
+    db.execute(text("ANALYZE"))
+    db.commit()
+    step("✅ Generated dataset complete!")
+
+
+def notify_api(base_url):
+    # A running API caches the location hierarchy; have it drop that now instead of serving it until the TTL
+    error = call_internal_api(base_url, "DELETE", "/internal/reference-cache")
+    if error:
+        print(f"Couldn't drop the cached location data at {base_url} ({error}); "
+              f"it expires within {settings.location_cache_ttl_seconds}s.")
+    else:
+        print(f"Dropped the cached location data at {base_url}.")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Seed the database with the sample data, or generate a synthetic dataset.")
+    parser.add_argument("--generate", action="store_true", help="generate a synthetic dataset instead of the sample data")
+    parser.add_argument("--reset", action="store_true", help="with --generate, wipe existing data first")
+    parser.add_argument("--seed", type=int, default=42, help="random seed; the same seed, --now and counts give the same data")
+    parser.add_argument("--now", type=datetime.fromisoformat, default=datetime(2026, 1, 1),
+                        help="date everything back from this UTC time (default 2026-01-01, so reruns match; "
+                             "pass today's date for data that looks current)")
+    parser.add_argument("--states", type=int, default=0, help="states to use from the imported boundaries (0 = all)")
+    parser.add_argument("--cities-per-state", type=int, default=6)
+    parser.add_argument("--markets", type=int, default=1000)
+    parser.add_argument("--stores", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--prices", type=int, default=1000000)
+    parser.add_argument("--reviews", type=int, default=100000)
+    parser.add_argument("--views", type=int, default=500000)
+    parser.add_argument("--notify-api", metavar="URL",
+                        help="afterwards, tell the API at URL to drop its cached location data (needs INTERNAL_API_TOKEN)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    options = parse_args()
+
+    # Ensure all tables are created
+    models.Base.metadata.create_all(bind=engine)
+
+    with script_session() as db:
+        if options.generate:
+            generate_dataset(db, options)
+        else:
+            seed_sample(db)
+
+    if options.notify_api:
+        notify_api(options.notify_api)
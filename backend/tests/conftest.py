@@ -0,0 +1,136 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Query, Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import crud  # noqa: E402
+from app.database import get_db, get_async_db  # noqa: E402
+from app.models import models  # noqa: E402
+
+
+class RunSyncSession:
+    """Stands in for AsyncSession: run_sync calls straight through with an unbound Session."""
+
+    def __init__(self):
+        self.session = Session()
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return fn(self.session, *args, **kwargs)
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def all(self):
+        return self.rows
+
+    def scalars(self):
+        return self
+
+
+class FakeSession:
+    """
+    Stands in for a Session where no database is needed. `respond(statement,
+    params)` gives the rows for each execute() or query(), whose statement is
+    kept in `executed`; close() is noted in `closed`.
+    """
+
+    def __init__(self, respond=lambda statement, params: ()):
+        self.respond = respond
+        self.executed = []
+        self.commits = 0
+        self.closed = False
+
+    def execute(self, statement, params=None):
+        self.executed.append(statement)
+        return FakeResult(self.respond(statement, params))
+
+    def query(self, *entities):
+        self.executed.append(entities)
+        return FakeResult(self.respond(entities, None))
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_session():
+    """Builds a FakeSession: `fake_session(respond)`."""
+    return FakeSession
+
+
+@pytest.fixture
+def recorded_queries(monkeypatch):
+    """Compiles every ORM query instead of running it; .all() and .first() come back empty."""
+    statements = []
+
+    def record(query):
+        statements.append(query.statement.compile(dialect=postgresql.dialect()))
+
+    monkeypatch.setattr(Query, "all", lambda self: (record(self), [])[1])
+    monkeypatch.setattr(Query, "first", lambda self: (record(self), None)[1])
+    return statements
+
+
+@pytest.fixture
+def api_client():
+    """Builds a TestClient over just the given routers, with database-free sessions."""
+    def build(*routers):
+        app = FastAPI()
+        for router in routers:
+            app.include_router(router)
+        app.dependency_overrides[get_async_db] = RunSyncSession
+        app.dependency_overrides[get_db] = lambda: Session()
+        return TestClient(app)
+    return build
+
+
+@pytest.fixture(scope="session")
+def pg_engine():
+    # Tests that need a real PostGIS database run against TEST_DATABASE_URL and are skipped without it
+    url = os.environ.get("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    engine = create_engine(url)
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except OperationalError as e:
+        pytest.skip(f"Test database unavailable: {e}")
+    models.Base.metadata.create_all(bind=engine)
+    # Made up front: creating a partition later would wait on the locks each test's open transaction holds
+    with Session(engine) as session:
+        crud._ensure_observation_partition(session, datetime.utcnow())
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def pg_session(pg_engine):
+    # Each test runs in a transaction that is rolled back; commits inside crud only release a savepoint
+    connection = pg_engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection, join_transaction_mode="create_savepoint")
+    yield session
+    session.close()
+    transaction.rollback()
+    connection.close()
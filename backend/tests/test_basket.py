@@ -0,0 +1,87 @@
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+from app.utils import basket
+
+
+def _cost(prices, quantities, distances, penalty, chosen):
+    lines = prices[:, chosen] * quantities[:, None]
+    if np.isnan(lines).all(axis=1).any():
+        return np.inf
+    return np.nanmin(lines, axis=1).sum() + penalty * distances[chosen].sum()
+
+
+def _brute_force(prices, quantities, distances, max_stores, penalty):
+    stores = range(prices.shape[1])
+    return min(
+        _cost(prices, quantities, distances, penalty, list(chosen))
+        for size in range(1, max_stores + 1) for chosen in combinations(stores, size)
+    )
+
+
+def _instance(rng, items, stores, stocked=0.6):
+    prices = np.round(rng.uniform(100, 2000, (items, stores)), -1)
+    prices[rng.random((items, stores)) > stocked] = np.nan
+    # Every item is stocked somewhere, as crud guarantees
+    for item in np.flatnonzero(np.isnan(prices).all(axis=1)):
+        prices[item, rng.integers(stores)] = 500.0
+    return prices, rng.integers(1, 4, items).astype(float), rng.uniform(0.2, 15, stores)
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_exact_search_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    prices, quantities, distances = _instance(rng, items=int(rng.integers(1, 8)), stores=int(rng.integers(1, 9)))
+    max_stores, penalty = int(rng.integers(1, 4)), float(rng.choice([0.0, 20.0, 200.0]))
+
+    chosen = basket.cheapest_basket(prices, quantities, distances, max_stores, penalty)
+
+    assert 1 <= len(chosen) <= max_stores
+    assert _cost(prices, quantities, distances, penalty, chosen) == pytest.approx(
+        _brute_force(prices, quantities, distances, max_stores, penalty)
+    )
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_search_ends_where_no_single_swap_helps(monkeypatch, seed):
+    # Too many combinations to enumerate: greedy, then swaps. That finds a
+    # local optimum (not always the global one), never worse than the best
+    # single store
+    monkeypatch.setattr(basket, "MAX_EXACT_COMBINATIONS", 0)
+    rng = np.random.default_rng(100 + seed)
+    prices, quantities, distances = _instance(rng, items=10, stores=12)
+    cost = lambda stores: _cost(prices, quantities, distances, 30.0, list(stores))
+
+    chosen = basket.cheapest_basket(prices, quantities, distances, 3, 30.0)
+
+    assert len(set(chosen)) == len(chosen) <= 3
+    found = cost(chosen)
+    assert found <= _brute_force(prices, quantities, distances, 1, 30.0) + 1e-6
+    for position in range(len(chosen)):
+        rest = chosen[:position] + chosen[position + 1:]
+        if rest:
+            assert cost(rest) >= found - 1e-6
+        for store in set(range(12)) - set(chosen):
+            assert cost(rest + [store]) >= found - 1e-6
+
+
+def test_covering_every_item_beats_a_cheaper_partial_basket():
+    prices = np.array([
+        [100.0, 5000.0],
+        [np.nan, 9000.0],
+    ])
+    chosen = basket.cheapest_basket(prices, np.ones(2), np.array([0.5, 40.0]), 1, 100.0)
+    assert chosen == [1]
+
+
+def test_far_store_is_skipped_when_its_penalty_outweighs_the_saving():
+    prices = np.array([[1000.0, 900.0]])
+    distances = np.array([1.0, 10.0])
+    assert basket.cheapest_basket(prices, np.ones(1), distances, 2, 50.0) == [0]
+    assert basket.cheapest_basket(prices, np.ones(1), distances, 2, 0.0) == [1]
+
+
+def test_empty_basket_picks_no_stores():
+    assert basket.cheapest_basket(np.empty((0, 3)), np.empty(0), np.ones(3), 2, 10.0) == []
@@ -0,0 +1,91 @@
+import threading
+import time
+
+import pytest
+from geoalchemy2.shape import from_shape
+from shapely.geometry import box
+
+from app.config import settings
+from app.routes import internal
+from app.utils.boundaries import StateBoundaryIndex, state_index
+
+# Two states meeting at lon 3.0021, inside a single 0.005-degree cell
+WEST = ("Westland", box(2.0, 5.0, 3.0021, 7.0))
+EAST = ("Eastland", box(3.0021, 5.0, 4.0, 7.0))
+
+
+@pytest.fixture
+def boundary_db(fake_session):
+    """Answers the boundary query after `delay` seconds; `executed` counts the loads."""
+    def build(states, delay=0.0):
+        rows = [(name, from_shape(shape, srid=4326)) for name, shape in states]
+        db = fake_session(lambda statement, params: time.sleep(db.delay) or rows)
+        db.delay = delay
+        return db
+    return build
+
+
+def _index():
+    return StateBoundaryIndex(cell_degrees=0.005, cache_size=100, ttl_seconds=60)
+
+
+def test_points_in_a_border_cell_get_their_own_state(boundary_db):
+    index, db = _index(), boundary_db([WEST, EAST])
+    index.reload(db)
+
+    assert index.state_for_point(db, 6.0001, 3.0020) == "Westland"
+    assert index.state_for_point(db, 6.0001, 3.0022) == "Eastland"
+    # Asked again, now from the cached cell
+    assert index.state_for_point(db, 6.0001, 3.0020) == "Westland"
+    assert index.state_for_point(db, 6.0001, 3.0022) == "Eastland"
+
+
+def test_interior_and_outside_cells(boundary_db):
+    index, db = _index(), boundary_db([WEST, EAST])
+    index.reload(db)
+
+    assert index.state_for_point(db, 6.5, 2.5) == "Westland"
+    assert index.state_for_point(db, 6.5, 3.5) == "Eastland"
+    assert index.state_for_point(db, 9.5, 3.5) is None
+    assert len(db.executed) == 1
+
+
+def test_expired_index_is_reloaded_once_under_concurrency(boundary_db):
+    index, db = _index(), boundary_db([WEST, EAST])
+    index.reload(db)
+    index._loaded_at -= index.ttl_seconds + 1
+    db.delay = 0.2
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(index.state_for_point(db, 6.5, 2.5)))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(db.executed) == 2
+    assert results == ["Westland"] * 8
+
+
+def test_lookups_before_the_startup_load_fail_fast(boundary_db):
+    index, db = _index(), boundary_db([WEST, EAST])
+
+    with pytest.raises(RuntimeError):
+        index.state_for_point(db, 6.5, 3.5)
+    assert db.executed == []
+
+
+def test_internal_reload_endpoint(api_client, monkeypatch):
+    monkeypatch.setattr(settings, "internal_api_token", "secret")
+    reloads = []
+    monkeypatch.setattr(state_index, "reload", lambda db: reloads.append(db) or 37)
+    client = api_client(internal.router)
+
+    response = client.post("/internal/state-boundaries/reload", headers={"X-Internal-Token": "secret"})
+
+    assert response.status_code == 200
+    assert response.json() == {"boundaries": 37}
+    assert len(reloads) == 1
@@ -0,0 +1,19 @@
+from sqlalchemy import create_engine, text
+
+from app import database
+
+
+def test_script_sessions_lift_the_statement_timeout_across_commits(pg_engine, monkeypatch):
+    # An engine set up like the app's, with the API's statement_timeout on every connection
+    engine = create_engine(pg_engine.url, connect_args={"options": "-c statement_timeout=15000"})
+    monkeypatch.setattr(database, "engine", engine)
+    try:
+        with engine.connect() as conn:
+            assert conn.execute(text("SHOW statement_timeout")).scalar() == "15s"
+
+        with database.script_session() as db:
+            assert db.execute(text("SHOW statement_timeout")).scalar() == "0"
+            db.commit()
+            assert db.execute(text("SHOW statement_timeout")).scalar() == "0"
+    finally:
+        engine.dispose()
@@ -0,0 +1,31 @@
+import time
+
+import pytest
+
+from app.config import settings
+from app.routes import locations
+from app.utils.map_clusters import TooManyTiles, tile_bounds, tiles_for_bbox
+
+
+def test_tiles_cover_the_box():
+    tiles = tiles_for_bbox(6.4, 3.2, 6.7, 3.6, 11, max_tiles=100)
+    assert len(tiles) == len(set(tiles))
+    bounds = [tile_bounds(11, x, y) for x, y in tiles]
+    assert all(west < 3.6 and east > 3.2 and south < 6.7 and north > 6.4 for west, south, east, north in bounds)
+    assert min(b[0] for b in bounds) <= 3.2 and max(b[2] for b in bounds) >= 3.6
+    assert min(b[1] for b in bounds) <= 6.4 and max(b[3] for b in bounds) >= 6.7
+
+
+def test_oversized_box_is_refused_before_listing_tiles():
+    started = time.perf_counter()
+    with pytest.raises(TooManyTiles):
+        tiles_for_bbox(-85, -180, 85, 180, 18, max_tiles=settings.map_max_tiles)
+    assert time.perf_counter() - started < 0.1
+
+
+def test_world_box_at_max_zoom_gets_a_400(api_client):
+    client = api_client(locations.router)
+    response = client.get("/locations/map", params={
+        "min_lat": -85, "min_lon": -180, "max_lat": 85, "max_lon": 180, "zoom": settings.map_max_zoom
+    })
+    assert response.status_code == 400
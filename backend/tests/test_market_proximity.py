@@ -0,0 +1,103 @@
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.routes.locations import _format_markets
+from app.models import models
+
+GEOG_INDEX = "ix_market_areas_geog"
+
+
+def test_proximity_queries_use_the_stored_geography_column(recorded_queries):
+    db = Session()
+    crud.get_markets_near_location(db, lat=6.5, lon=3.35, radius_km=5)
+    crud.get_nearest_markets(db, lat=6.5, lon=3.35, limit=5)
+    crud.get_prices_for_product(db, product_id=1, lat=6.5, lon=3.35, radius_km=5)
+
+    assert len(recorded_queries) == 3
+    for sql in map(str, recorded_queries):
+        assert "market_areas.geog" in sql
+        # A cast of the geometry column would hide the GiST index from the planner
+        assert "CAST(market_areas.location" not in sql
+
+
+def test_market_lists_load_city_and_state_in_the_same_query(recorded_queries):
+    # The routes read market.city.state.name for every market
+    db = Session()
+    crud.get_markets_near_location(db, lat=6.5, lon=3.35, radius_km=5)
+    crud.get_nearest_markets(db, lat=6.5, lon=3.35, limit=5)
+
+    for sql in map(str, recorded_queries):
+        assert "JOIN cities" in sql and "JOIN states" in sql
+
+
+@pytest.fixture
+def markets(pg_session):
+    pg_session.add_all(
+        models.MarketArea(name=f"Proximity test market {i}", location=f"SRID=4326;POINT({3.3 + i * 0.01} {6.5 + i * 0.01})")
+        for i in range(20)
+    )
+    pg_session.flush()
+    pg_session.execute(text("ANALYZE market_areas"))
+
+
+def _plans(pg_session, run):
+    """EXPLAIN of every statement `run` executes, with sequential scans discouraged so a usable index shows up."""
+    conn = pg_session.connection()
+    executed = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        executed.append((statement, parameters))
+
+    event.listen(conn, "before_cursor_execute", capture)
+    try:
+        run()
+    finally:
+        event.remove(conn, "before_cursor_execute", capture)
+
+    conn.execute(text("SET LOCAL enable_seqscan = off"))
+    plans = []
+    for statement, parameters in executed:
+        rows = conn.exec_driver_sql("EXPLAIN " + statement, parameters).fetchall()
+        plans.append("\n".join(row[0] for row in rows))
+    return plans
+
+
+def test_radius_query_uses_the_geography_index(pg_session, markets):
+    plans = _plans(pg_session, lambda: crud.get_markets_near_location(pg_session, lat=6.55, lon=3.35, radius_km=5))
+    assert any(GEOG_INDEX in plan for plan in plans), plans
+
+
+def test_nearest_query_walks_the_geography_index(pg_session, markets):
+    plans = _plans(pg_session, lambda: crud.get_nearest_markets(pg_session, lat=6.55, lon=3.35, limit=3))
+    assert any(GEOG_INDEX in plan for plan in plans), plans
+
+
+def test_nearby_markets_are_formatted_without_further_queries(pg_session):
+    state = models.State(name="Proximity test state")
+    city = models.City(name="Proximity test city", state=state)
+    pg_session.add_all(
+        models.MarketArea(name=f"Proximity test market {i}", city=city, location=f"SRID=4326;POINT({3.3 + i * 0.01} 6.5)")
+        for i in range(5)
+    )
+    pg_session.flush()
+    pg_session.expunge_all()
+
+    conn = pg_session.connection()
+    executed = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(conn, "before_cursor_execute", capture)
+    try:
+        markets = _format_markets(
+            (market, None) for market in crud.get_markets_near_location(pg_session, lat=6.5, lon=3.32, radius_km=5)
+        )
+    finally:
+        event.remove(conn, "before_cursor_execute", capture)
+
+    assert len(executed) == 1
+    assert {(m["city_name"], m["state_name"]) for m in markets} == {("Proximity test city", "Proximity test state")}
+    assert len(markets) == 5
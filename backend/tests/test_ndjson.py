@@ -0,0 +1,115 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import pytest
+from starlette.requests import Request
+
+from app import crud
+from app.routes import products
+from app.utils import ndjson
+from app.utils.auth import get_current_user
+
+
+def _request(accept):
+    headers = [(b"accept", accept.encode())] if accept is not None else []
+    return Request({"type": "http", "headers": headers})
+
+
+@pytest.mark.parametrize("accept, wanted", [
+    ("application/x-ndjson", True),
+    ("application/json, application/x-ndjson;q=0.5", True),
+    ("Application/X-NDJSON; charset=utf-8", True),
+    ("application/x-ndjson;q=0", False),
+    ("application/x-ndjson;q=zero", False),
+    ("application/json", False),
+    ("*/*", False),
+    (None, False),
+])
+def test_wants_ndjson(accept, wanted):
+    assert ndjson.wants_ndjson(_request(accept)) is wanted
+
+
+@pytest.fixture
+def stream_session(monkeypatch, fake_session):
+    session = fake_session()
+    monkeypatch.setattr(ndjson, "SessionLocal", lambda: session)
+    return session
+
+
+def _chunks(response):
+    async def drain():
+        return [chunk async for chunk in response.body_iterator]
+    return asyncio.run(drain())
+
+
+def test_rows_are_written_one_per_line_in_flushed_chunks(stream_session):
+    rows = [{"id": i, "name": "x" * 100, "seen": datetime(2025, 1, 1, tzinfo=timezone.utc)} for i in range(2000)]
+
+    def read(db):
+        assert db is stream_session
+        yield from rows
+
+    response = ndjson.stream_ndjson(read)
+    chunks = _chunks(response)
+
+    assert response.media_type == ndjson.NDJSON_MEDIA_TYPE
+    assert len(chunks) > 1
+    assert all(len(chunk) < ndjson.FLUSH_BYTES + 200 for chunk in chunks)
+    lines = b"".join(chunks).decode().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == list(range(2000))
+    assert json.loads(lines[0])["seen"] == "2025-01-01T00:00:00Z"
+    assert stream_session.closed
+
+
+def test_session_is_closed_when_the_rows_fail(stream_session):
+    def read(db):
+        yield {"id": 1}
+        raise RuntimeError("connection lost")
+
+    with pytest.raises(RuntimeError):
+        _chunks(ndjson.stream_ndjson(read))
+    assert stream_session.closed
+
+
+def test_session_is_not_opened_before_the_body_runs(monkeypatch):
+    monkeypatch.setattr(ndjson, "SessionLocal", lambda: pytest.fail("opened too early"))
+    ndjson.stream_ndjson(lambda db: iter(()))
+
+
+@pytest.fixture
+def products_client(api_client, stream_session):
+    client = api_client(products.router)
+    client.app.dependency_overrides[get_current_user] = lambda: None
+    return client
+
+
+def test_catalogue_streams_with_the_ndjson_accept_header(monkeypatch, products_client):
+    monkeypatch.setattr(crud, "iter_all_products", lambda db: iter([{"id": 1, "name": "Rice"}, {"id": 2, "name": "Beans"}]))
+
+    response = products_client.get("/products/all", headers={"Accept": "application/x-ndjson"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == ndjson.NDJSON_MEDIA_TYPE
+    assert response.text == '{"id":1,"name":"Rice"}\n{"id":2,"name":"Beans"}\n'
+
+
+def test_catalogue_is_plain_json_without_the_header(monkeypatch, products_client):
+    monkeypatch.setattr(crud, "get_all_products", lambda db: [])
+    monkeypatch.setattr(crud, "iter_all_products", lambda db: pytest.fail("streamed without being asked"))
+
+    response = products_client.get("/products/all")
+
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == []
+
+
+def test_bad_search_cursor_is_rejected_before_streaming(monkeypatch, products_client):
+    monkeypatch.setattr(crud, "iter_search_results", lambda *a, **kw: pytest.fail("streamed a bad cursor"))
+
+    response = products_client.get(
+        "/products/search", params={"q": "rice", "cursor": "not-a-cursor"},
+        headers={"Accept": "application/x-ndjson"}
+    )
+
+    assert response.status_code == 400
@@ -0,0 +1,90 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.config import settings
+from app.database import get_db
+from app.models import models
+from app.routes import auth as auth_routes
+from app.utils import auth
+
+
+def test_hash_jobs_past_the_pending_limit_are_rejected(monkeypatch):
+    monkeypatch.setattr(settings, "password_hash_max_pending", 2)
+    release = threading.Event()
+
+    async def flood():
+        jobs = [asyncio.ensure_future(auth._run_hash_job(release.wait, 5)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(auth.HashPoolBusy) as busy:
+            await auth._run_hash_job(release.wait, 5)
+        release.set()
+        await asyncio.gather(*jobs)
+        # Slots are given back once the running jobs finish
+        assert await auth._run_hash_job(lambda: "done") == "done"
+        return busy.value
+
+    busy = asyncio.run(flood())
+    assert busy.status_code == 503
+    assert busy.headers["Retry-After"] == "1"
+    assert auth._pending_hashes == 0
+
+
+def test_failed_job_releases_its_slot(monkeypatch):
+    monkeypatch.setattr(settings, "password_hash_max_pending", 1)
+
+    def boom():
+        raise ValueError("bad hash")
+
+    async def run():
+        with pytest.raises(ValueError):
+            await auth._run_hash_job(boom)
+        return await auth._run_hash_job(lambda: "ok")
+
+    assert asyncio.run(run()) == "ok"
+
+
+@pytest.fixture
+def auth_client(pg_session):
+    """The auth routes on the test database, noting which thread runs each SQL statement and which runs the loop."""
+    threads = {"loop": None, "sql": []}
+    app = FastAPI()
+    app.include_router(auth_routes.router)
+    app.dependency_overrides[get_db] = lambda: pg_session
+
+    @app.middleware("http")
+    async def note_loop_thread(request, call_next):
+        threads["loop"] = threading.get_ident()
+        return await call_next(request)
+
+    def note_sql_thread(conn, cursor, statement, parameters, context, executemany):
+        threads["sql"].append(threading.get_ident())
+
+    event.listen(pg_session.connection(), "before_cursor_execute", note_sql_thread)
+    yield TestClient(app), threads
+    event.remove(pg_session.connection(), "before_cursor_execute", note_sql_thread)
+
+
+def test_register_and_login_keep_sql_off_the_event_loop(auth_client, pg_session):
+    client, threads = auth_client
+    response = client.post("/register", json={
+        "email": "loop-test@example.com", "name": "Loop Test", "password": "s3cret-pass", "role": "shopper"
+    })
+    assert response.status_code == 200, response.text
+    assert response.json()["store"] is None
+    assert threads["sql"] and threads["loop"] not in threads["sql"]
+
+    # An outdated hash is upgraded (and committed) during the login
+    user = pg_session.query(models.User).filter(models.User.email == "loop-test@example.com").one()
+    user.hashed_password = auth.pwd_context.hash("s3cret-pass", rounds=4)
+    pg_session.commit()
+    threads["sql"].clear()
+
+    response = client.post("/token", data={"username": "loop-test@example.com", "password": "s3cret-pass"})
+    assert response.status_code == 200, response.text
+    assert threads["sql"] and threads["loop"] not in threads["sql"]
+    assert not auth.needs_rehash(pg_session.get(models.User, user.id).hashed_password)
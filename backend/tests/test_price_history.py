@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from app.routes import products
+
+
+def test_timezone_aware_bounds_are_sent_as_naive_utc(api_client, recorded_queries):
+    client = api_client(products.router)
+    response = client.get("/products/1/price-history", params={
+        "from": "2025-03-01T23:30:00.000Z",
+        "to": "2025-03-08T01:00:00+01:00",
+    })
+
+    assert response.status_code == 200
+    assert response.json() == []
+    bounds = [v for v in recorded_queries[0].params.values() if isinstance(v, datetime)]
+    assert bounds == [datetime(2025, 3, 1, 23, 30), datetime(2025, 3, 8, 0, 0)]
+
+
+def test_naive_bounds_pass_through(api_client, recorded_queries):
+    client = api_client(products.router)
+    client.get("/products/1/price-history", params={"from": "2025-03-01T12:00:00"})
+
+    bounds = [v for v in recorded_queries[0].params.values() if isinstance(v, datetime)]
+    assert bounds == [datetime(2025, 3, 1, 12, 0)]
@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from app import crud, schemas
+from app.models import models
+
+
+def test_prices_are_unique_per_product_and_store():
+    unique = [
+        [column.name for column in index.columns]
+        for index in models.Price.__table__.indexes if index.unique
+    ]
+    assert ["product_id", "store_id"] in unique
+
+
+@pytest.fixture
+def priced_store(pg_session):
+    products = [models.Product(name=f"Upsert test product {i}") for i in range(2)]
+    store = models.Store(name="Upsert test store")
+    pg_session.add_all([*products, store])
+    pg_session.flush()
+    return store, products
+
+
+def _prices_for(session, store):
+    return session.execute(
+        select(models.Price.product_id, func.count(), func.max(models.Price.price))
+        .where(models.Price.store_id == store.id)
+        .group_by(models.Price.product_id)
+        .order_by(models.Price.product_id)
+    ).all()
+
+
+def test_import_updates_existing_prices_in_place(pg_session, priced_store):
+    store, (old, new) = priced_store
+    crud.create_price_for_store(pg_session, store.id, schemas.PriceCreate(product_id=old.id, price=500.0, stock_level=2))
+
+    result = crud.import_price_chunk(pg_session, store.id, [
+        (1, old.id, None, 650.0, 2),
+        (2, new.id, None, 900.0, 3),
+    ])
+
+    assert (result["inserted"], result["updated"], result["errors"]) == (1, 1, [])
+    assert _prices_for(pg_session, store) == [(old.id, 1, 650.0), (new.id, 1, 900.0)]
+
+
+def test_adding_a_price_twice_keeps_one_row(pg_session, priced_store):
+    store, (product, _) = priced_store
+    first = crud.create_price_for_store(pg_session, store.id, schemas.PriceCreate(product_id=product.id, price=500.0, stock_level=2))
+    second = crud.create_price_for_store(pg_session, store.id, schemas.PriceCreate(product_id=product.id, price=550.0, stock_level=2))
+
+    assert first.id == second.id
+    assert _prices_for(pg_session, store) == [(product.id, 1, 550.0)]
+
+
+def test_duplicate_price_rows_are_rejected(pg_session, priced_store):
+    store, (product, _) = priced_store
+    crud.create_price_for_store(pg_session, store.id, schemas.PriceCreate(product_id=product.id, price=500.0, stock_level=2))
+
+    with pytest.raises(IntegrityError), pg_session.begin_nested():
+        pg_session.execute(models.Price.__table__.insert().values(
+            product_id=product.id, store_id=store.id, price=1.0, stock_level=1, timestamp=func.now()
+        ))
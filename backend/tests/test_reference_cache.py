@@ -0,0 +1,34 @@
+from app.config import settings
+from app.routes import internal
+from app.utils.reference_cache import ReferenceDataCache, location_cache
+
+
+def test_invalidate_drops_entries_and_refuses_stale_puts():
+    cache = ReferenceDataCache(maxsize=10, ttl=60)
+    cache.put(("states",), b"[1]", cache.version)
+    started_at = cache.version
+
+    cache.invalidate()
+    assert cache.get(("states",)) is None
+
+    # Built from data read before the invalidation: returned, but not cached
+    etag, body = cache.put(("states",), b"[1]", started_at)
+    assert body == b"[1]"
+    assert cache.get(("states",)) is None
+
+    cache.put(("states",), b"[1, 2]", cache.version)
+    assert cache.get(("states",))[1] == b"[1, 2]"
+
+
+def test_internal_endpoint_invalidates_the_location_cache(api_client, monkeypatch):
+    monkeypatch.setattr(settings, "internal_api_token", "secret")
+    client = api_client(internal.router)
+    location_cache.put(("states",), b"[]", location_cache.version)
+    version = location_cache.version
+
+    assert client.delete("/internal/reference-cache").status_code == 403
+    response = client.delete("/internal/reference-cache", headers={"X-Internal-Token": "secret"})
+
+    assert response.status_code == 204
+    assert location_cache.version == version + 1
+    assert location_cache.get(("states",)) is None
@@ -0,0 +1,229 @@
+import math
+import random
+from collections import namedtuple
+from datetime import datetime
+
+import pytest
+
+from app import crud
+from app.models import models
+from app.utils.geodesy import spheroid_distance
+from app.utils.search_cache import SearchResultCache, normalize_query
+
+
+def _page(*pairs):
+    return [{"product_id": p, "store_id": s, "price": 100.0} for p, s in pairs], None
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = SearchResultCache(max_bytes=1 << 20, ttl=60)
+    monkeypatch.setattr(crud, "search_cache", cache)
+    return cache
+
+
+def _put(cache, key, query, page):
+    rows = page[0]
+    cache.put(key, page, query, {r["product_id"] for r in rows}, {r["store_id"] for r in rows}, cache.generation)
+
+
+def test_invalidation_by_product_store_and_query(cache):
+    _put(cache, "rice", "rice", _page((1, 10)))
+    _put(cache, "milk", "milk", _page((2, 20)))
+    _put(cache, "oil", "oil", _page((3, 30)))
+    _put(cache, "all", "", _page((4, 40)))
+
+    cache.invalidate(products=[1], stores=[30], queries=[])
+
+    assert cache.get("rice") is None
+    assert cache.get("oil") is None
+    assert cache.get("all") is None  # the empty query matches every product
+    assert cache.get("milk") is not None
+
+    cache.invalidate(queries=["milk"])
+    assert cache.get("milk") is None
+
+
+def test_page_computed_across_an_invalidation_is_not_stored(cache):
+    generation = cache.generation
+    cache.begin_invalidation()
+    cache.put("rice", _page((1, 10)), "rice", [1], [10], generation)
+    assert cache.get("rice") is None
+
+
+def test_byte_budget_evicts_least_recently_used():
+    cache = SearchResultCache(max_bytes=150, ttl=60)
+    _put(cache, "a", "a", _page((1, 1)))
+    _put(cache, "b", "b", _page((2, 2)))
+    assert cache.get("a") is not None
+    _put(cache, "c", "c", _page((3, 3)))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_searches_without_a_radius_bypass_the_cache(cache, monkeypatch):
+    calls = []
+    monkeypatch.setattr(crud, "unified_search", lambda db, *args, **kwargs: calls.append(args) or _page((1, 10)))
+
+    for _ in range(2):
+        crud.cached_unified_search(None, "Rice", "distance_asc", 6.50123, 3.35011, None, None)
+    assert len(calls) == 2
+    assert calls[0][2:4] == (6.50123, 3.35011)
+
+    for q in ("Rice", "  rice "):
+        crud.cached_unified_search(None, q, "price_asc", None, None, None, 3)
+    assert len(calls) == 3
+    assert cache.stats()["hits"] == 1
+
+
+CANDIDATE_FIELDS = (
+    "product_id product_name image_url price timestamp stock_level store_id store_name market_area city state "
+    "lat lon avg_rating price_id relevance distance_meters"
+)
+
+
+class CandidateRow(namedtuple("CandidateRow", CANDIDATE_FIELDS)):
+    @property
+    def _mapping(self):
+        return self._asdict()
+
+
+class CandidateQuery:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def limit(self, n):
+        return CandidateQuery(self.rows[:n])
+
+    def all(self):
+        return self.rows
+
+
+@pytest.fixture
+def candidates(cache, monkeypatch):
+    """Markets scattered around (6.5, 3.35); records every candidate query instead of running it."""
+    rng = random.Random(7)
+    rows = [
+        CandidateRow(
+            product_id=i % 7, product_name=f"Rice {i}", image_url=None, price=float(rng.choice([500, 650, 800, 950])),
+            timestamp=datetime(2025, 1, 1), stock_level=2, store_id=100 + i, store_name=f"Store {i}",
+            market_area=f"Market {i}", city="Lagos", state="Lagos" if i % 3 else "Ogun",
+            lat=6.5 + rng.uniform(-0.08, 0.08), lon=3.35 + rng.uniform(-0.08, 0.08),
+            avg_rating=rng.choice([None, 3.5, 4.0, 4.5]), price_id=1000 + i,
+            relevance=rng.choice([0.4, 0.7, 1.0]), distance_meters=0.0,
+        )
+        for i in range(120)
+    ]
+    queries = []
+
+    def build(db, query, sort_by, lat, lon, radius_km, city_id, cursor):
+        queries.append((lat, lon, radius_km))
+        return CandidateQuery(rows), "Lagos"
+
+    monkeypatch.setattr(crud, "_build_search_query", build)
+    monkeypatch.setattr(crud.state_index, "state_for_point", lambda db, lat, lon: "Lagos")
+    monkeypatch.setattr(crud.settings, "search_cache_cell_degrees", 0.01)
+    return rows, queries
+
+
+def _expected(rows, lat, lon, radius_km, sort_by):
+    # What the database query returns for this exact point
+    distances = spheroid_distance(lat, lon, [r.lat for r in rows], [r.lon for r in rows])
+    inside = [(r, d) for r, d in zip(rows, distances) if d <= radius_km * 1000]
+    keys = {
+        "price_asc": lambda r, d: (r.price, r.price_id),
+        "price_desc": lambda r, d: (-r.price, -r.price_id),
+        "relevance": lambda r, d: (-r.relevance, -r.price_id),
+        "rating_desc": lambda r, d: (-(r.avg_rating if r.avg_rating is not None else -1.0), -r.price_id),
+        "distance_asc": lambda r, d: (d, r.price_id),
+    }
+    inside.sort(key=lambda pair: keys[sort_by](*pair))
+    return [(r.store_id, round(d / 1000, 2)) for r, d in inside]
+
+
+@pytest.mark.parametrize("sort_by", crud.SEARCH_SORT_MODES)
+def test_radius_searches_in_a_cell_share_candidates_but_keep_their_own_point(candidates, sort_by):
+    rows, queries = candidates
+    # Two points in the same 0.01 degree cell, near opposite corners
+    for lat, lon in ((6.50012, 3.35003), (6.50991, 3.35987)):
+        results, cursor, pages = [], None, 0
+        while True:
+            page, cursor = crud.cached_unified_search(None, " RICE ", sort_by, lat, lon, 5, None, limit=7, cursor=cursor)
+            results += [(r["store_id"], r["distance_km"]) for r in page]
+            pages += 1
+            if cursor is None:
+                break
+        assert results == _expected(rows, lat, lon, 5, sort_by)
+        assert pages > 1
+
+    # One candidate query for the cell, around its centre and widened by half its diagonal
+    [(lat, lon, radius_km)] = queries
+    assert (lat, lon) == pytest.approx((6.505, 3.355))
+    assert radius_km == pytest.approx(5 + 0.005 * math.sqrt(2) * 111.7)
+
+
+def test_cell_margin_covers_every_point_in_the_cell():
+    rng = random.Random(3)
+    centre_lat, centre_lon, half = 6.505, 3.355, 0.005
+    margin_m = half * math.sqrt(2) * 111.7 * 1000
+    for _ in range(200):
+        lat, lon = centre_lat + rng.uniform(-half, half), centre_lon + rng.uniform(-half, half)
+        assert spheroid_distance(centre_lat, centre_lon, [lat], [lon])[0] <= margin_m
+
+
+def test_radius_search_with_too_many_candidates_goes_to_the_database(candidates, monkeypatch):
+    rows, queries = candidates
+    monkeypatch.setattr(crud.settings, "search_cache_max_candidates", 50)
+    calls = []
+    monkeypatch.setattr(crud, "unified_search", lambda db, *args, **kwargs: calls.append(args) or _page((1, 10)))
+
+    for lat in (6.5001, 6.5002):
+        crud.cached_unified_search(None, "rice", "price_asc", lat, 3.3501, 5, None)
+
+    assert len(queries) == 1
+    assert [args[2:4] for args in calls] == [(6.5001, 3.3501), (6.5002, 3.3501)]
+
+
+def test_spheroid_distance_matches_the_reference_geodesic():
+    dms = lambda d, m, s: d + m / 60 + s / 3600
+    # Vincenty's own test line, Flinders Peak to Buninyong: 54972.271 m
+    distance = spheroid_distance(-dms(37, 57, 3.72030), dms(144, 25, 29.52440), [-dms(37, 39, 10.15610)], [dms(143, 55, 35.38390)])
+    assert distance[0] == pytest.approx(54972.271, abs=1e-3)
+    assert spheroid_distance(0, 0, [0, 0], [0, 1]).tolist() == pytest.approx([0.0, 111319.491], abs=1e-3)
+
+
+def test_write_drops_entries_whose_query_matches_the_product(cache, fake_session):
+    _put(cache, "rice", "rice", _page((1, 10)))
+    _put(cache, "milk", "milk", _page((2, 20)))
+    asked = []
+    # The database says only "rice" matches
+    db = fake_session(lambda statement, params: asked.extend(params["queries"]) or ["rice"])
+
+    # Product 9 isn't in any cached page, but its name matches "rice": a new price could enter that page
+    crud._invalidate_search_cache(db, [9], [99])
+
+    assert sorted(asked) == ["milk", "rice"]
+    assert cache.get("rice") is None
+    assert cache.get("milk") is not None
+
+
+def test_large_writes_clear_the_cache(cache):
+    _put(cache, "milk", "milk", _page((2, 20)))
+    crud._invalidate_search_cache(None, range(crud.SEARCH_CACHE_MATCH_LIMIT + 1), [1])
+    assert cache.get("milk") is None
+
+
+def test_query_matching_against_the_database(pg_session, cache):
+    product = models.Product(name="Golden Harvest Rice 5kg")
+    pg_session.add(product)
+    pg_session.flush()
+    for query in ("rice", "golden harvest", "peak milk"):
+        _put(cache, query, normalize_query(query), _page((product.id + 1, 1)))
+
+    crud._invalidate_search_cache(pg_session, [product.id], [])
+
+    assert cache.get("rice") is None
+    assert cache.get("golden harvest") is None
+    assert cache.get("peak milk") is not None
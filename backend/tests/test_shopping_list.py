@@ -0,0 +1,105 @@
+import pytest
+from sqlalchemy import event
+
+from app import crud, schemas
+from app.models import models
+
+
+def _batch(*operations):
+    return schemas.ListBatch(operations=list(operations)).operations
+
+
+@pytest.fixture
+def shopper(pg_session):
+    # Plain ids: the commits inside crud expire the ORM objects
+    user = models.User(email="list-test@example.com", hashed_password="x", role="shopper")
+    store = models.Store(name="List test store")
+    products = [models.Product(name=f"List test product {i}") for i in range(4)]
+    pg_session.add_all([user, store, *products])
+    pg_session.flush()
+    shopping_list = crud.get_or_create_shopping_list(pg_session, user_id=user.id)
+    return user.id, shopping_list.id, store.id, [p.id for p in products]
+
+
+def _count_statements(pg_session, run):
+    conn = pg_session.connection()
+    executed = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not statement.startswith(("SAVEPOINT", "RELEASE")):
+            executed.append(statement.split()[0])
+
+    event.listen(conn, "before_cursor_execute", capture)
+    try:
+        result = run()
+    finally:
+        event.remove(conn, "before_cursor_execute", capture)
+    return result, executed
+
+
+def test_list_reads_and_batches_against_the_database(pg_session, shopper):
+    user_id, list_id, store_id, products = shopper
+    crud.apply_list_operations(pg_session, list_id=list_id, operations=_batch(*[
+        {"op": "add", "product_id": product_id, "store_id": store_id, "price": 100.0 * (i + 1), "quantity": i + 1}
+        for i, product_id in enumerate(products[:3])
+    ]))
+
+    view, statements = _count_statements(pg_session, lambda: crud.get_shopping_list_view(pg_session, user_id=user_id))
+    assert statements == ["SELECT"]
+    assert len(view["items"]) == 3
+    assert view["total_price"] == 100.0 + 400.0 + 900.0
+    assert view["id"] == list_id and "list_id" not in view["items"][0]
+
+    first, second, third = view["items"]
+    crud.apply_list_operations(pg_session, list_id=list_id, operations=_batch(
+        {"op": "remove", "item_id": first["id"]},
+        {"op": "update", "item_id": second["id"], "quantity": 5},
+        {"op": "add", "product_id": third["product_id"], "store_id": store_id, "price": 300.0},
+    ))
+
+    view = crud.get_shopping_list_view(pg_session, user_id=user_id)
+    assert [(item["id"], item["quantity"]) for item in view["items"]] == [(second["id"], 5), (third["id"], 4)]
+    assert view["total_price"] == 200.0 * 5 + 300.0 * 4
+
+
+def test_batch_folds_operations_into_one_write_each(pg_session, shopper):
+    user_id, list_id, store_id, (kept, dropped, zeroed, fresh) = shopper
+    other_user = models.User(email="other-list-test@example.com", hashed_password="x", role="shopper")
+    pg_session.add(other_user)
+    pg_session.flush()
+    other_user_id = other_user.id
+    other_list_id = crud.get_or_create_shopping_list(pg_session, user_id=other_user_id).id
+    crud.apply_list_operations(pg_session, list_id=other_list_id, operations=_batch(
+        {"op": "add", "product_id": kept, "store_id": store_id, "price": 10.0},
+    ))
+    [foreign] = crud.get_shopping_list_view(pg_session, user_id=other_user_id)["items"]
+    crud.apply_list_operations(pg_session, list_id=list_id, operations=_batch(*[
+        {"op": "add", "product_id": product_id, "store_id": store_id, "price": 100.0}
+        for product_id in (kept, dropped, zeroed)
+    ]))
+    first, second, third = crud.get_shopping_list_view(pg_session, user_id=user_id)["items"]
+
+    _, statements = _count_statements(pg_session, lambda: crud.apply_list_operations(
+        pg_session, list_id=list_id, operations=_batch(
+            {"op": "update", "item_id": first["id"], "quantity": 4},
+            {"op": "update", "item_id": first["id"], "quantity": 5},
+            {"op": "update", "item_id": second["id"], "quantity": 3},
+            {"op": "remove", "item_id": second["id"]},
+            {"op": "update", "item_id": third["id"], "quantity": 0},
+            {"op": "update", "item_id": foreign["id"], "quantity": 9},
+            {"op": "remove", "item_id": foreign["id"]},
+            {"op": "add", "product_id": fresh, "store_id": store_id, "price": 50.0},
+            {"op": "add", "product_id": fresh, "store_id": store_id, "price": 55.0, "quantity": 2},
+            {"op": "add", "product_id": kept, "store_id": store_id, "price": 120.0, "quantity": 2},
+        )
+    ))
+
+    # One statement per kind of write, plus the lookup for lines the adds merge into
+    assert statements == ["DELETE", "UPDATE", "SELECT", "UPDATE", "INSERT"]
+    view = crud.get_shopping_list_view(pg_session, user_id=user_id)
+    # The add merges into the line after its update: 5 + 2
+    assert [(item["product_id"], item["quantity"], item["price_at_addition"]) for item in view["items"]] == [
+        (kept, 7, 100.0), (fresh, 3, 55.0)
+    ]
+    # Another list's item can't be touched through this one
+    assert crud.get_shopping_list_view(pg_session, user_id=other_user_id)["items"] == [foreign]
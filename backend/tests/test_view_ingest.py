@@ -0,0 +1,69 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select
+
+from app.models import models
+from app import crud
+from app.utils import view_ingest
+from app.utils.view_ingest import ViewIngestBuffer
+
+NOW = datetime(2025, 5, 1, 10, 15, tzinfo=timezone.utc)
+
+
+def _views(*pairs):
+    return [{"product_id": p, "store_id": s, "timestamp": NOW} for p, s in pairs]
+
+
+def test_bad_id_in_a_batch_against_the_database(pg_session):
+    product = models.Product(name="View test product")
+    store = models.Store(name="View test store")
+    pg_session.add_all([product, store])
+    pg_session.flush()
+    missing = pg_session.execute(select(func.coalesce(func.max(models.Product.id), 0) + 1)).scalar()
+
+    dropped = crud.log_product_views(pg_session, _views(
+        (product.id, store.id), (missing, store.id), (product.id, store.id)
+    ))
+
+    assert dropped == 1
+    logged = pg_session.execute(
+        select(func.count()).select_from(models.ProductView).where(models.ProductView.product_id == product.id)
+    ).scalar()
+    assert logged == 2
+    hourly = crud.VIEW_ROLLUPS["hour"]
+    counted = pg_session.execute(
+        select(hourly.view_count).where(hourly.product_id == product.id, hourly.store_id == store.id)
+    ).scalar()
+    assert counted == 2
+
+
+def test_buffer_flush_drops_unknown_ids_without_losing_the_batch(monkeypatch, pg_session):
+    product = models.Product(name="View buffer test product")
+    store = models.Store(name="View buffer test store")
+    pg_session.add_all([product, store])
+    pg_session.flush()
+    # _flush closes the session, detaching these
+    product_id, store_id = product.id, store.id
+    missing = pg_session.execute(select(func.coalesce(func.max(models.Product.id), 0) + 1)).scalar()
+    monkeypatch.setattr(view_ingest, "SessionLocal", lambda: pg_session)
+    buffer = ViewIngestBuffer(max_queue=100, batch_size=10, flush_interval=1.0)
+
+    buffer._flush(_views((product_id, store_id), (missing, store_id), (product_id, missing), (product_id, store_id)))
+
+    assert (buffer.invalid, buffer.failed) == (2, 0)
+    logged = pg_session.execute(
+        select(func.count()).select_from(models.ProductView).where(models.ProductView.store_id == store_id)
+    ).scalar()
+    assert logged == 2
+
+
+def test_buffer_flush_of_only_unknown_ids_writes_nothing(monkeypatch, pg_session):
+    missing = pg_session.execute(select(func.coalesce(func.max(models.Product.id), 0) + 1)).scalar()
+    before = pg_session.execute(select(func.count()).select_from(models.ProductView)).scalar()
+    monkeypatch.setattr(view_ingest, "SessionLocal", lambda: pg_session)
+    buffer = ViewIngestBuffer(max_queue=100, batch_size=10, flush_interval=1.0)
+
+    buffer._flush(_views((missing, missing)))
+
+    assert (buffer.invalid, buffer.failed) == (1, 0)
+    assert pg_session.execute(select(func.count()).select_from(models.ProductView)).scalar() == before